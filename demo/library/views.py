@@ -71,10 +71,9 @@ class BookForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super(BookForm, self).__init__(*args, **kwargs)
         author = self.fields['author']
-        author.widget = RelatedFieldPopupFormWidget(
-            widget=Select2Widget(choices=author.choices) if _select2 else \
-                    forms.Select(choices=author.choices),
-            new_url=reverse_lazy("library:new-author"))
+        author.widget = RelatedFieldPopupFormWidget.for_field(
+            author, new_url=reverse_lazy("library:new-author"),
+            widget_class=Select2Widget if _select2 else forms.Select)
 
 
 class BookCrudViewset(PopupCrudViewSet):
@@ -124,9 +123,8 @@ class AuthorRatingForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super(AuthorRatingForm, self).__init__(*args, **kwargs)
         author = self.fields['author']
-        author.widget = RelatedFieldPopupFormWidget(
-            widget=forms.Select(choices=author.choices),
-            new_url=reverse_lazy("library:new-author"))
+        author.widget = RelatedFieldPopupFormWidget.for_field(
+            author, new_url=reverse_lazy("library:new-author"))
 
 
 class AuthorRatingView(generic.FormView):
@@ -163,14 +161,12 @@ class MultipleRelatedObjectForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super(MultipleRelatedObjectForm, self).__init__(*args, **kwargs)
         author = self.fields['author']
-        author.widget = RelatedFieldPopupFormWidget(
-            widget=Select2Widget(choices=author.choices) if _select2 else \
-                    forms.Select(choices=author.choices),
-            new_url=reverse_lazy("library:new-author"))
+        author.widget = RelatedFieldPopupFormWidget.for_field(
+            author, new_url=reverse_lazy("library:new-author"),
+            widget_class=Select2Widget if _select2 else forms.Select)
         book = self.fields['book']
-        book.widget = RelatedFieldPopupFormWidget(
-            widget=forms.Select(choices=book.choices),
-            new_url=reverse_lazy("library:books:create"))
+        book.widget = RelatedFieldPopupFormWidget.for_field(
+            book, new_url=reverse_lazy("library:books:create"))
 
 
 class MultipleRelatedObjectDemoView(generic.FormView):
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0212
+""" Popupcrud caching helpers """
+
+from collections import OrderedDict
+from functools import partial
+import hashlib
+import threading
+
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+KEY_PREFIX = 'popupcrud'
+
+
+def _version_key(model):
+    return '%s:version:%s' % (KEY_PREFIX, model._meta.label_lower)
+
+
+def model_version(cache, model):
+    """
+    Returns the current version of the given model's data. Cache keys for
+    values derived from the model's data, such as row counts, include this
+    version so that bumping it invalidates all of them at once.
+    """
+    version = cache.get(_version_key(model))
+    if version is None:
+        version = 1
+        cache.add(_version_key(model), version, None)
+    return version
+
+
+def bump_model_version(cache, model):
+    """
+    Bumps the version of the given model's data, invalidating all the cached
+    values derived from it.
+    """
+    try:
+        cache.incr(_version_key(model))
+    except ValueError:
+        # key does not exist (or has been evicted)
+        cache.set(_version_key(model), 2, None)
+
+
+def _model_changed(alias, sender, **kwargs):    # pylint: disable=W0613
+    cache = caches[alias]
+    bump_model_version(cache, sender)
+    # and again once committed, in case the old data is cached in between
+    transaction.on_commit(partial(bump_model_version, cache, sender),
+                          using=kwargs.get('using'))
+
+
+def track_model_changes(model, alias):
+    """
+    Connects handlers to the model's ``post_save`` & ``post_delete`` signals
+    that bump the model's data version in the cache ``alias``, so that
+    changes made outside popupcrud views also invalidate the cached values.
+    Changes made with ``QuerySet.update()`` and ``bulk_create()``, which do
+    not send the signals, are not tracked.
+    """
+    uid = '%s:track:%s' % (KEY_PREFIX, alias)
+    handler = partial(_model_changed, alias)
+    post_save.connect(handler, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(handler, sender=model, weak=False, dispatch_uid=uid)
+
+
+def queryset_key(cache, name, queryset):
+    """
+    Returns a cache key for a value derived from the given queryset. Key is
+    built from the queryset's SQL and its model's data version. Returns None
+    if the queryset cannot be compiled into SQL, such as an empty queryset.
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    digest = hashlib.md5((sql + repr(params)).encode('utf-8')).hexdigest()
+    return '%s:%s:%s:%s:%s' % (
+        KEY_PREFIX, name, queryset.model._meta.label_lower,
+        model_version(cache, queryset.model), digest)
+
+
+class LRUCache(object):
+    """
+    An in-process cache of up to ``maxsize`` values, which evicts the least
+    recently used value to make room for a new one. Used for values that
+    are costly to build and are shared by requests, but whose number is not
+    bounded, such as the list headers for each query string. Thread safe.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._values.pop(key)
+            except KeyError:
+                return default
+            self._values[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._values.pop(key, None)
+            self._values[key] = value
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+        return value
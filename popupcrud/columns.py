@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0212
+""" Precompiled list_display column plans """
+
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models.constants import LOOKUP_SEP
+from django.forms.utils import pretty_name
+from django.contrib.admin.utils import (
+    FieldIsAForeignKeyColumnName, get_fields_from_path,
+    label_for_field as lff)
+
+
+# Field types that are deferred by column projection, unless needed
+LARGE_FIELD_TYPES = ('TextField', 'BinaryField', 'JSONField')
+
+
+class ListColumn(object):
+    """
+    A single ``list_display`` entry resolved into an accessor. Resolution
+    follows the same rules as ``django.contrib.admin.utils.lookup_field()``,
+    in the same order, so that a column displays the same value it always has.
+
+    Column kinds are:
+
+        - ``field``: a model field, value is read straight off the object.
+        - ``related``: a ``__`` separated path that spans relations, such as
+          ``author__name``.
+        - ``callable``: a callable in ``list_display`` that is called with
+          the object as its sole argument.
+        - ``viewset``: a ViewSet method that is called with the object.
+        - ``model``: a model attribute or method.
+        - ``expression``: an ORM expression, such as ``F()``, ``Case()``,
+          ``Subquery()`` or an aggregate like ``Count()``, annotated to the
+          list queryset under the column's name. Value is read off the
+          annotated attribute.
+    """
+    FIELD = 'field'
+    RELATED = 'related'
+    CALLABLE = 'callable'
+    VIEWSET = 'viewset'
+    MODEL = 'model'
+    EXPRESSION = 'expression'
+
+    def __init__(self, index, name, kind, text, attr=None, field=None,
+                 order_field=None, sortable=False, expression=None):
+        # pylint: disable=R0913
+        self.index = index
+        self.name = name
+        self.kind = kind
+        self.text = text
+        self.attr = attr
+        self.field = field
+        self.expression = expression
+        self.order_field = order_field
+        self.sortable = sortable
+        self.path = name.split(LOOKUP_SEP) if kind == self.RELATED else None
+        # map of value to its display value for fields with 'choices='
+        self.choices = dict(field.flatchoices) \
+            if field is not None and field.choices else None
+        self._accessor = getattr(self, '_%s_value' % kind)
+
+    @property
+    def requires(self):
+        """
+        Field paths this column reads from the object, such as
+        ``('author__age',)``. For fields this is the field itself. For
+        callables, this is the value of their ``requires`` attribute, if one
+        is declared, along with their ``order_field``.
+        """
+        if self.kind in (self.FIELD, self.RELATED):
+            return (self.field.name if self.kind == self.FIELD else self.name,)
+        if self.kind == self.EXPRESSION:
+            return ()   # computed by the database
+        paths = list(getattr(self.attr, 'requires', ()))
+        if self.order_field:
+            paths.append(self.order_field.lstrip('-'))
+        return tuple(paths)
+
+    @property
+    def is_plain(self):
+        """
+        True for columns of field values that can be read with
+        ``QuerySet.values()``, that is fields and related paths that are not
+        relations themselves, and expressions.
+        """
+        if self.kind == self.EXPRESSION:
+            return True
+        return self.kind in (self.FIELD, self.RELATED) and \
+            not self.field.is_relation
+
+    @property
+    def css_name(self):
+        """
+        Name of the column as used in the header css class. Callables are
+        named after their __name__.
+        """
+        if callable(self.name):
+            if self.name.__name__ == '<lambda>':
+                return 'lambda' + str(self.index)
+            return self.name.__name__
+        return self.name
+
+    def value(self, viewset, obj):
+        """
+        Returns the value of this column for the given object. Values of
+        fields with ``choices`` are converted into their display values.
+        """
+        value = self._accessor(viewset, obj)
+        if self.choices is not None and value in self.choices:
+            value = self.choices[value]
+        return value
+
+    def _field_value(self, viewset, obj):
+        return getattr(obj, self.name)
+
+    def _related_value(self, viewset, obj):
+        value = obj
+        for part in self.path:
+            value = getattr(value, part)
+            if value is None:
+                break
+        return value
+
+    def _callable_value(self, viewset, obj):
+        return self.name(obj)
+
+    def _viewset_value(self, viewset, obj):
+        return getattr(viewset, self.name)(obj)
+
+    def _model_value(self, viewset, obj):
+        value = getattr(obj, self.name)
+        return value() if callable(value) else value
+
+    def _expression_value(self, viewset, obj):
+        return getattr(obj, self.name)
+
+
+def _get_field(opts, name):
+    """
+    Same as ``django.contrib.admin.utils._get_non_gfk_field()``. Returns the
+    model field for the given name, raising FieldDoesNotExist for generic
+    foreign keys & reverse relations.
+    """
+    field = opts.get_field(name)
+    if (field.is_relation and
+            ((field.many_to_one and not field.related_model) or field.one_to_many)):
+        raise FieldDoesNotExist()
+    if (field.is_relation and not field.many_to_many and
+            hasattr(field, 'attname') and field.attname == name):
+        raise FieldIsAForeignKeyColumnName()
+    return field
+
+
+def _related_path_column(viewset_class, index, name):
+    """
+    Returns a ``related`` ListColumn for a name such as ``author__name`` or
+    None if the name does not represent a valid path of model fields.
+    """
+    if not isinstance(name, str) or LOOKUP_SEP not in name:
+        return None
+    try:
+        fields = get_fields_from_path(viewset_class.model, name)
+    except (FieldDoesNotExist, AttributeError):
+        return None
+    if any(f.is_relation and (f.many_to_many or f.one_to_many) for f in fields):
+        return None     # multi-valued relations can't be displayed in a cell
+    field = fields[-1]
+    text = field.related_model._meta.verbose_name if field.is_relation \
+            else getattr(field, 'verbose_name', pretty_name(fields[-1].name))
+    return ListColumn(index, name, ListColumn.RELATED, text, field=field,
+                      order_field=name, sortable=True)
+
+
+def is_expression(value):
+    """ Returns True if value is an ORM expression, such as ``F()`` """
+    return not isinstance(value, type) and hasattr(value, 'resolve_expression')
+
+
+def _expression_column(viewset_class, index, name):
+    """
+    Returns an ``expression`` ListColumn for a ``list_display`` entry that is
+    either an expression or a 2-tuple of (name, expression). Unnamed
+    expressions are named after their position in ``list_display``.
+    """
+    if isinstance(name, (list, tuple)):
+        name, expression = name
+        text = pretty_name(name)
+    else:
+        expression = name
+        name = 'popupcrud_expr_%d' % index
+        if hasattr(expression, 'name'):     # F()
+            try:
+                text = lff(expression.name, viewset_class.model, viewset_class)
+            except AttributeError:
+                text = pretty_name(expression.name)
+        else:
+            try:
+                # aggregates of a single field, such as 'book__count'
+                text = pretty_name(expression.default_alias.replace(LOOKUP_SEP, '_'))
+            except (AttributeError, TypeError):
+                text = pretty_name(name)
+    return ListColumn(index, name, ListColumn.EXPRESSION, text,
+                      order_field=name, sortable=True, expression=expression)
+
+
+def build_column(viewset_class, index, name):
+    """
+    Resolves the ``list_display`` entry ``name`` at position ``index`` into
+    a ListColumn.
+    """
+    if is_expression(name) or (isinstance(name, (list, tuple)) and
+                               len(name) == 2 and is_expression(name[1])):
+        return _expression_column(viewset_class, index, name)
+
+    model = viewset_class.model
+    try:
+        field = _get_field(model._meta, name)
+    except FieldIsAForeignKeyColumnName:
+        return ListColumn(index, name, ListColumn.MODEL, pretty_name(name))
+    except (FieldDoesNotExist, TypeError):
+        column = _related_path_column(viewset_class, index, name)
+        if column:
+            return column
+    else:
+        text = lff(name, model, viewset_class)
+        return ListColumn(index, name, ListColumn.FIELD, text, field=field,
+                          order_field=field.name, sortable=True)
+
+    # a callable, a ViewSet method or a model attribute
+    text, attr = lff(name, model, viewset_class, return_attr=True)
+    if callable(name):
+        kind = ListColumn.CALLABLE
+    elif hasattr(viewset_class, name) and name != '__str__':
+        kind = ListColumn.VIEWSET
+    else:
+        kind = ListColumn.MODEL
+    order_field = getattr(attr, 'order_field', None)
+    return ListColumn(index, name, kind, text, attr=attr,
+                      order_field=order_field, sortable=bool(order_field))
+
+
+def _relation_lookups(model, path):
+    """
+    Splits the relations spanned by the field path into the lookups to be
+    passed to ``select_related()`` and ``prefetch_related()``. Returns a
+    2-tuple of (select_related lookup, prefetch_related lookup), either of
+    which may be None. Paths that cannot be resolved return (None, None).
+    """
+    try:
+        fields = get_fields_from_path(model, path)
+    except (FieldDoesNotExist, AttributeError):
+        return None, None
+
+    parts = []
+    multi_valued = False
+    for field in fields:
+        if not field.is_relation:
+            break
+        # reverse relations are looked up by their accessor name
+        parts.append(field.get_accessor_name() \
+            if hasattr(field, 'get_accessor_name') else field.name)
+        if field.many_to_many or field.one_to_many:
+            multi_valued = True
+
+    if not parts:
+        return None, None
+    lookup = LOOKUP_SEP.join(parts)
+    return (None, lookup) if multi_valued else (lookup, None)
+
+
+def _loaded_paths(model, path):
+    """
+    Returns the field paths to be passed to ``only()`` for the given field
+    path to be loaded. That is the path itself, along with the relations it
+    spans, as they would be traversed using ``select_related()``. Paths that
+    span multi-valued relations are prefetched and only need the primary
+    key, which is always loaded.
+    """
+    try:
+        fields = get_fields_from_path(model, path)
+    except (FieldDoesNotExist, AttributeError):
+        return []
+
+    paths = []
+    parts = []
+    for field in fields:
+        if field.is_relation and (field.many_to_many or field.one_to_many):
+            break
+        if field.is_relation and not field.concrete:
+            break   # reverse one-to-one, nothing to load from this model
+        parts.append(field.name)
+        paths.append(LOOKUP_SEP.join(parts))
+    return paths
+
+
+class ColumnPlan(object):
+    """
+    The compiled form of a ViewSet's ``list_display``. Every column is
+    resolved once per ViewSet class, into a ListColumn, with its label, order
+    field and choices map precomputed. This way rendering a list only calls
+    the column accessors instead of redoing the reflection for every request
+    and every cell.
+    """
+    def __init__(self, viewset_class):
+        self.viewset_class = viewset_class
+        self.list_display = viewset_class.list_display
+        self.columns = [build_column(viewset_class, index, name)
+                        for index, name in enumerate(self.list_display)]
+        self.select_related, self.prefetch_related = \
+            self._infer_related_lookups()
+        # column name to expression, of the expression columns
+        self.annotations = OrderedDict(
+            (column.name, column.expression) for column in self.columns
+            if column.kind == ListColumn.EXPRESSION)
+        self._projection = None
+        # misconfigured list_aggregates are reported along with list_display
+        if getattr(viewset_class, 'list_aggregates', None):
+            self.get_aggregates(viewset_class.list_aggregates)
+
+    def _infer_related_lookups(self):
+        """
+        Works out the related objects that the columns would access, so that
+        they can be fetched along with the list rows instead of one query per
+        row. Returns two OrderedDicts, for ``select_related()`` and
+        ``prefetch_related()`` lookups, that map each lookup to the names
+        of the columns that require it.
+        """
+        select_related = OrderedDict()
+        prefetch_related = OrderedDict()
+        model = self.viewset_class.model
+        for column in self.columns:
+            for path in column.requires:
+                select, prefetch = _relation_lookups(model, path)
+                if select:
+                    select_related.setdefault(select, []).append(column.css_name)
+                if prefetch:
+                    prefetch_related.setdefault(prefetch, []).append(column.css_name)
+
+        # a lookup that is a prefix of a longer one is implied by the latter
+        for lookups in (select_related, prefetch_related):
+            for lookup in list(lookups):
+                for other in lookups:
+                    if other.startswith(lookup + LOOKUP_SEP):
+                        lookups[other].extend(lookups.pop(lookup))
+                        break
+        return select_related, prefetch_related
+
+    def related_lookups_report(self):
+        """
+        Returns a human readable report of the ``select_related()`` and
+        ``prefetch_related()`` lookups inferred for the list along with the
+        columns that caused them. Intended for debugging.
+        """
+        lines = []
+        for method, lookups in (('select_related', self.select_related),
+                                ('prefetch_related', self.prefetch_related)):
+            for lookup, columns in lookups.items():
+                lines.append("%s('%s'): %s" % (method, lookup, ', '.join(columns)))
+        return '\n'.join(lines)
+
+    def get_projection(self, row_methods=()):
+        """
+        Works out the columns to be fetched for the list rows. Returns a
+        2-tuple of (only, defer) field paths.
+
+        If every column and every ViewSet method in ``row_methods``, which
+        are called for each row, declares what it reads (fields are implicit,
+        callables through their ``requires`` attribute), ``only`` lists
+        exactly what is needed. Otherwise ``only`` is None.
+
+        ``defer`` lists the large text, binary & JSON fields that are not
+        known to be needed. This is the fallback for when a callable reads
+        undeclared attributes, as deferred fields are still loaded, albeit
+        with an extra query, if they are accessed.
+        """
+        if self._projection is None:
+            model = self.viewset_class.model
+            needed = set()
+            declared = True
+            callables = [column.attr for column in self.columns
+                         if column.kind not in (ListColumn.FIELD, ListColumn.RELATED,
+                                                ListColumn.EXPRESSION)]
+            callables.extend(getattr(self.viewset_class, name) for name in row_methods)
+            for attr in callables:
+                if getattr(attr, 'requires', None) is None:
+                    declared = False
+            for column in self.columns:
+                for path in column.requires:
+                    needed.update(_loaded_paths(model, path))
+            for lookup in self.select_related:
+                needed.update(_loaded_paths(model, lookup))
+            for name in row_methods:
+                for path in getattr(getattr(self.viewset_class, name), 'requires', ()):
+                    needed.update(_loaded_paths(model, path))
+
+            local = set(path.split(LOOKUP_SEP)[0] for path in needed)
+            defer = tuple(f.name for f in model._meta.concrete_fields
+                          if f.get_internal_type() in LARGE_FIELD_TYPES and \
+                              f.name not in local)
+            self._projection = (
+                tuple(sorted(needed)) if declared else None, defer)
+        return self._projection
+
+    def get_aggregates(self, list_aggregates):
+        """
+        Returns the ``list_aggregates`` as an OrderedDict of column name to
+        aggregate expression. Aggregate functions are applied to the
+        column's field or expression, and so can only be set for field,
+        related field & expression columns. Raises ImproperlyConfigured for
+        the other columns and for names that are not ``list_display``
+        columns.
+        """
+        columns = dict((column.name, column) for column in self.columns)
+        aggregates = OrderedDict()
+        for name, aggregate in list_aggregates.items():
+            column = columns.get(name)
+            if column is None:
+                raise ImproperlyConfigured(
+                    "%s.list_aggregates refers to '%s', which is not a "
+                    "list_display column." % (self.viewset_class.__name__, name))
+            if is_expression(aggregate):
+                aggregates[name] = aggregate
+            elif column.kind in (ListColumn.FIELD, ListColumn.RELATED,
+                                 ListColumn.EXPRESSION):
+                aggregates[name] = aggregate(name)
+            else:
+                raise ImproperlyConfigured(
+                    "%s.list_aggregates sets an aggregate function for '%s', "
+                    "which is a %s column. Aggregate functions apply to field "
+                    "and expression columns only, use an aggregate expression "
+                    "instead." % (self.viewset_class.__name__, name, column.kind))
+        return aggregates
+
+    @property
+    def values_fields(self):
+        """
+        The field paths of the columns, for ``QuerySet.values()``, if every
+        column is a plain field. None otherwise.
+        """
+        if all(column.is_plain for column in self.columns):
+            return tuple(column.name for column in self.columns)
+        return None
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getitem__(self, index):
+        return self.columns[index]
+
+    @classmethod
+    def for_viewset(cls, viewset_class):
+        """
+        Returns the column plan for the given ViewSet class. The plan is
+        cached in the class and is rebuilt only if the class' list_display
+        is reassigned.
+        """
+        plan = viewset_class.__dict__.get('_column_plan')
+        if plan is None or plan.list_display is not viewset_class.list_display:
+            plan = cls(viewset_class)
+            viewset_class._column_plan = plan
+        return plan
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+""" Popupcrud ViewSet configuration, compiled once per ViewSet class """
+
+from types import MappingProxyType
+
+from django.conf import settings
+from django.forms.models import modelform_factory
+
+from .cache import LRUCache
+
+# ViewSet attributes the configuration is compiled from. The configuration is
+# rebuilt if any of these is reassigned.
+SOURCE_ATTRIBUTES = (
+    'model', 'fields', 'form_class', 'legacy_crud', 'modal_sizes',
+    'list_template', 'form_template', 'detail_template',
+)
+
+DEFAULT_MODAL_SIZES = {
+    'create_update': 'normal',
+    'delete': 'normal',
+    'detail': 'normal',
+}
+
+# Number of list header variants, one for each ordering, that are cached per
+# ViewSet class
+HEADER_CACHE_SIZE = 128
+
+# Number of media variants, one for each form & formset class, that are
+# cached per ViewSet class
+MEDIA_CACHE_SIZE = 16
+
+
+class ViewSetConfig(object):
+    """
+    The parts of a ViewSet that are derived from its class attributes alone,
+    such as the normalized ``legacy_crud`` setting, the modal sizes and the
+    model form class. These are worked out once per ViewSet class and shared,
+    read-only, by the ViewSet instances that are created for every request.
+    """
+    def __init__(self, viewset_class):
+        self.viewset_class = viewset_class
+        self.fingerprint = self.get_fingerprint(viewset_class)
+        self.popups = MappingProxyType(self._build_popups(viewset_class.legacy_crud))
+        modal_sizes = dict(DEFAULT_MODAL_SIZES)
+        modal_sizes.update(viewset_class.modal_sizes)
+        self.modal_sizes = MappingProxyType(modal_sizes)
+        self._form_class = None
+        self._values = {}
+        # list view column headers, see list_content template tag
+        self.headers = LRUCache(HEADER_CACHE_SIZE)
+        # the views' media, see AttributeThunk.media
+        self.media = LRUCache(MEDIA_CACHE_SIZE)
+
+    @staticmethod
+    def get_fingerprint(viewset_class):
+        return tuple(getattr(viewset_class, name, None) for name in SOURCE_ATTRIBUTES)
+
+    @staticmethod
+    def _build_popups(legacy_crud):
+        popups = {'detail': True, 'create': True, 'update': True, 'delete': True}
+        if isinstance(legacy_crud, dict):
+            for k, v in legacy_crud.items():
+                popups[k] = not v
+        elif legacy_crud:
+            popups = dict((k, False) for k in popups)
+        return popups
+
+    def get_form_class(self):
+        """
+        Returns the model form class for the create & update views of a
+        ViewSet without a ``form_class``, built from its ``fields``.
+        """
+        if self._form_class is None:
+            self._form_class = modelform_factory(
+                self.viewset_class.model, fields=self.viewset_class.fields)
+        return self._form_class
+
+    def cached(self, key, func):
+        """
+        Returns the value cached under key, computing it by calling func if
+        it's not. Used for values that the views work out the same way for
+        every request, such as the template names. Nothing is
+        cached in DEBUG mode, so that changes to them show up right away.
+        """
+        if settings.DEBUG:
+            return func()
+        try:
+            return self._values[key]
+        except KeyError:
+            value = self._values[key] = func()
+            return value
+
+    @classmethod
+    def for_viewset(cls, viewset_class):
+        """
+        Returns the configuration for the given ViewSet class. The
+        configuration is cached in the class and is rebuilt only if one of
+        its ``SOURCE_ATTRIBUTES`` is reassigned.
+        """
+        config = viewset_class.__dict__.get('_config')
+        if config is None or any(
+                a is not b for a, b in zip(config.fingerprint,
+                                           cls.get_fingerprint(viewset_class))):
+            config = cls(viewset_class)
+            viewset_class._config = config
+        return config
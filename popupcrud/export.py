@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+""" Popupcrud list export writers """
+
+from collections import OrderedDict
+import csv
+import datetime
+import decimal
+import json
+import tempfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.encoding import force_str
+from django.utils.html import strip_tags
+from django.utils.safestring import SafeData
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+try:
+    from django.utils import six
+except ImportError:
+    import six
+
+# export format -> (content type, file extension)
+EXPORT_FORMATS = OrderedDict((
+    ('csv', ('text/csv', 'csv')),
+    ('json', ('application/json', 'json')),
+    ('xlsx', ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx')),
+))
+
+
+def format_available(fmt):
+    """ Returns True if the export format is known and its writer available """
+    if fmt == 'xlsx':
+        return openpyxl is not None
+    return fmt in EXPORT_FORMATS
+
+
+def export_value(value):
+    """
+    Converts a column value into a value that can be exported. HTML, that
+    a method column may return, is reduced to its text and model objects are
+    exported as their string representation.
+    """
+    if value is None or isinstance(value, (bool, six.integer_types, float,
+                                           decimal.Decimal, datetime.date,
+                                           datetime.time)):
+        return value
+    if isinstance(value, SafeData):
+        return strip_tags(value)
+    if isinstance(value, models.Model):
+        return six.text_type(value)
+    return force_str(value)
+
+
+class Echo(object):
+    """ A file-like object whose write() returns the value written """
+    def write(self, value):     # pylint: disable=R0201
+        return value
+
+
+def csv_stream(headers, names, rows):   # pylint: disable=W0613
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def json_stream(headers, names, rows):  # pylint: disable=W0613
+    yield '['
+    separator = ''
+    for row in rows:
+        yield separator + json.dumps(OrderedDict(zip(names, row)),
+                                     cls=DjangoJSONEncoder)
+        separator = ','
+    yield ']'
+
+
+def _xlsx_value(value):
+    # Excel does not support timezones
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+def xlsx_file(headers, names, rows):    # pylint: disable=W0613
+    """
+    Writes the rows into a temporary file, using the openpyxl write-only
+    mode which does not hold the rows in memory, and returns the file.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(headers)
+    for row in rows:
+        sheet.append([_xlsx_value(value) for value in row])
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def export_response(fmt, filename, headers, names, rows):
+    """
+    Returns the response that streams the rows in the given format.
+
+    :param fmt: One of the ``EXPORT_FORMATS``.
+    :param filename: The download filename, without the extension.
+    :param headers: The column labels.
+    :param names: The column names, used as keys of the JSON rows.
+    :param rows: An iterable of rows, each a list of exported values.
+    """
+    content_type, extension = EXPORT_FORMATS[fmt]
+    if fmt == 'xlsx':
+        response = FileResponse(xlsx_file(headers, names, rows),
+                                content_type=content_type)
+    else:
+        writer = csv_stream if fmt == 'csv' else json_stream
+        response = StreamingHttpResponse(writer(headers, names, rows),
+                                         content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (
+        filename, extension)
+    return response
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0212
+""" Popupcrud list view filters """
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Count, F
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.contrib.admin.utils import get_fields_from_path
+from django.utils.dates import MONTHS
+from django.utils.encoding import force_str
+from django.utils.text import capfirst
+from django.utils.translation import ugettext_lazy as _
+
+try:
+    from django.utils import six
+except ImportError:
+    import six
+
+
+class FieldListFilter(object):
+    """
+    Base class for the ``list_filter`` filters. A filter narrows down the
+    list rows to those with the field value selected by the user, passed as
+    the query string parameter named after the field path. ``field__isnull``
+    selects the rows without a value.
+
+    Besides filtering, a filter works out its options along with the number
+    of rows for each (the facet counts), from a single aggregated
+    ``GROUP BY`` query.
+    """
+    #: Label of the option that clears the filter
+    all_label = _('All')
+
+    #: Label of the option that selects the rows without a value
+    null_label = _('None')
+
+    def __init__(self, field, field_path, params):
+        self.field = field
+        self.field_path = field_path
+        self.title = getattr(field, 'verbose_name', field_path)
+        # the query string parameters of this filter in the request
+        self.params = dict((k, params[k]) for k in self.expected_parameters()
+                           if k in params)
+
+    @property
+    def null_parameter(self):
+        return '%s__isnull' % self.field_path
+
+    def expected_parameters(self):
+        """ Returns the names of the query string parameters of the filter """
+        return [self.field_path, self.null_parameter]
+
+    def get_lookups(self):
+        """
+        Returns the dict of lookups, passed to ``filter()``, for the values
+        selected by the user. Invalid values are ignored.
+        """
+        if self.params.get(self.null_parameter) == '1':
+            return {self.null_parameter: True}
+        if self.field_path in self.params:
+            try:
+                return {self.field_path: self.field.to_python(self.params[self.field_path])}
+            except ValidationError:
+                pass
+        return {}
+
+    def queryset(self, queryset):
+        """ Returns the queryset filtered by the values selected by the user """
+        lookups = self.get_lookups()
+        return queryset.filter(**lookups) if lookups else queryset
+
+    def facet_expression(self):
+        """ Returns the expression whose values the rows are grouped by """
+        return F(self.field_path)
+
+    def facet_queryset(self, queryset):
+        """
+        Returns the ``values()`` queryset that counts the rows for each of
+        the values of the filter field. ``queryset`` is the list queryset with
+        the search and every filter but this one applied.
+        """
+        return queryset.order_by().values(
+            popupcrud_facet=self.facet_expression()).annotate(
+                popupcrud_count=Count('pk', distinct=True))
+
+    def value_to_param(self, value):
+        """ Returns the query string parameter value for a field value """
+        return force_str(value)
+
+    def choices(self, counts):
+        """
+        Returns the list of (value, label) of the filter options, in their
+        display order. ``counts`` maps the field values present in the list
+        to the number of rows with that value.
+        """
+        return sorted((value, force_str(value)) for value in counts
+                      if value is not None)
+
+    def get_options(self, facet_queryset):
+        """
+        Returns the filter options as a list of dicts with the keys
+        ``label``, ``count`` & ``params``, the query string parameters that
+        select the option. Facet counts are computed from facet_queryset.
+        """
+        counts = dict((row['popupcrud_facet'], row['popupcrud_count'])
+                      for row in facet_queryset)
+        options = [{
+            'label': force_str(self.all_label),
+            'count': None,
+            'params': {self.field_path: None, self.null_parameter: None},
+        }]
+        for value, label in self.choices(counts):
+            options.append({
+                'label': force_str(label),
+                'count': counts.get(value, 0),
+                'params': {self.field_path: self.value_to_param(value),
+                           self.null_parameter: None},
+            })
+        if None in counts:
+            options.append({
+                'label': force_str(self.null_label),
+                'count': counts[None],
+                'params': {self.field_path: None, self.null_parameter: '1'},
+            })
+        return options
+
+    def is_selected(self, option):
+        """ Returns True if the option matches the values selected by the user """
+        return all(self.params.get(k) == v for k, v in option['params'].items())
+
+    @staticmethod
+    def test(field):    # pylint: disable=W0613
+        """ Returns True if the filter class applies to the given field """
+        return True
+
+
+class ChoicesFieldListFilter(FieldListFilter):
+    """ Filter for fields with ``choices``, all the choices are listed """
+
+    def choices(self, counts):
+        return [(value, label) for value, label in self.field.flatchoices
+                if value not in ('', None)]
+
+    @staticmethod
+    def test(field):
+        return bool(field.choices)
+
+
+class BooleanFieldListFilter(FieldListFilter):
+    """ Filter for boolean fields """
+    null_label = _('Unknown')
+
+    def value_to_param(self, value):
+        return '1' if value else '0'
+
+    def choices(self, counts):
+        return [(True, _('Yes')), (False, _('No'))]
+
+    @staticmethod
+    def test(field):
+        return isinstance(field, (models.BooleanField, getattr(models, 'NullBooleanField', ())))
+
+
+class RelatedFieldListFilter(FieldListFilter):
+    """
+    Filter for foreign keys and one-to-one fields. Only the related objects
+    referenced by the list rows are listed, labelled by their string
+    representation, which costs one more query to fetch them.
+    """
+    def __init__(self, field, field_path, params):
+        super(RelatedFieldListFilter, self).__init__(field, field_path, params)
+        self.title = field.related_model._meta.verbose_name
+
+    def choices(self, counts):
+        objects = self.field.related_model._default_manager.filter(
+            pk__in=[value for value in counts if value is not None])
+        return sorted(((obj.pk, six.text_type(obj)) for obj in objects),
+                      key=lambda choice: choice[1])
+
+    @staticmethod
+    def test(field):
+        return field.is_relation and (field.many_to_one or field.one_to_one) \
+            and field.concrete
+
+
+class DateFieldListFilter(FieldListFilter):
+    """
+    Date hierarchy filter for date & datetime fields. Rows are first
+    filtered by year and then, once a year is selected, by month.
+    """
+    all_label = _('Any date')
+
+    @property
+    def year_parameter(self):
+        return '%s__year' % self.field_path
+
+    @property
+    def month_parameter(self):
+        return '%s__month' % self.field_path
+
+    def expected_parameters(self):
+        return [self.year_parameter, self.month_parameter, self.null_parameter]
+
+    def _get_int(self, name):
+        try:
+            return int(self.params[name])
+        except (KeyError, ValueError):
+            return None
+
+    def get_lookups(self):
+        if self.params.get(self.null_parameter) == '1':
+            return {self.null_parameter: True}
+        lookups = {}
+        year = self._get_int(self.year_parameter)
+        if year is not None:
+            lookups[self.year_parameter] = year
+            month = self._get_int(self.month_parameter)
+            if month is not None:
+                lookups[self.month_parameter] = month
+        return lookups
+
+    def facet_expression(self):
+        if self._get_int(self.year_parameter) is not None:
+            return ExtractMonth(self.field_path)
+        return ExtractYear(self.field_path)
+
+    def facet_queryset(self, queryset):
+        # months are counted within the selected year
+        year = self._get_int(self.year_parameter)
+        if year is not None:
+            queryset = queryset.filter(**{self.year_parameter: year})
+        return super(DateFieldListFilter, self).facet_queryset(queryset)
+
+    def get_options(self, facet_queryset):
+        counts = dict((row['popupcrud_facet'], row['popupcrud_count'])
+                      for row in facet_queryset)
+        options = [{
+            'label': force_str(self.all_label),
+            'count': None,
+            'params': dict((k, None) for k in self.expected_parameters()),
+        }]
+        year = self._get_int(self.year_parameter)
+        if year is None:
+            for value in sorted(v for v in counts if v is not None):
+                options.append({
+                    'label': force_str(value),
+                    'count': counts[value],
+                    'params': {self.year_parameter: force_str(value),
+                               self.month_parameter: None,
+                               self.null_parameter: None},
+                })
+            if None in counts:
+                options.append({
+                    'label': force_str(self.null_label),
+                    'count': counts[None],
+                    'params': {self.year_parameter: None,
+                               self.month_parameter: None,
+                               self.null_parameter: '1'},
+                })
+        else:
+            options.append({
+                'label': force_str(year),
+                'count': None,
+                'params': {self.year_parameter: force_str(year),
+                           self.month_parameter: None,
+                           self.null_parameter: None},
+            })
+            for value in sorted(v for v in counts if v is not None):
+                options.append({
+                    'label': '%s %d' % (capfirst(force_str(MONTHS[value])), year),
+                    'count': counts[value],
+                    'params': {self.year_parameter: force_str(year),
+                               self.month_parameter: force_str(value),
+                               self.null_parameter: None},
+                })
+        return options
+
+    @staticmethod
+    def test(field):
+        return isinstance(field, models.DateField)
+
+
+# filter classes in the order they are matched against the list_filter fields
+FILTER_CLASSES = (
+    ChoicesFieldListFilter,
+    BooleanFieldListFilter,
+    RelatedFieldListFilter,
+    DateFieldListFilter,
+    FieldListFilter,
+)
+
+
+def build_list_filter(model, spec, params):
+    """
+    Returns the filter for a ``list_filter`` entry, which is either a field
+    path or a 2-tuple of (field path, filter class).
+    """
+    if isinstance(spec, (list, tuple)):
+        field_path, filter_class = spec
+    else:
+        field_path, filter_class = spec, None
+    field = get_fields_from_path(model, field_path)[-1]
+    if filter_class is None:
+        filter_class = next(cls for cls in FILTER_CLASSES if cls.test(field))
+    return filter_class(field, field_path, params)
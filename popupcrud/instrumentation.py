@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+""" Popupcrud view instrumentation, the time & queries spent by the views """
+
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+import logging
+import threading
+import time
+
+from django.db import connections
+from django.dispatch import Signal
+from django.template.response import TemplateResponse
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('popupcrud')
+
+# Sent when an instrumented view has finished, after its response has been
+# rendered. The sender is the ViewSet class, with the keyword arguments
+# ``view``, ``request``, ``response`` & ``timings``, a ViewTimings.
+view_timed = Signal()
+
+# Name of the phase that covers the whole view, rendering included
+TOTAL = 'total'
+
+
+class Phase(object):
+    """ Time, in milliseconds, and number of queries spent in a view phase """
+    def __init__(self, name):
+        self.name = name
+        self.duration = 0.0
+        self.queries = 0
+
+
+class ViewTimings(object):
+    """
+    Records the time and the number of database queries spent by a view in
+    each of its phases, such as counting the rows, building the form or
+    rendering the template. The ``total`` phase covers the whole view.
+
+    Queries are counted through a ``connection.execute_wrapper()``, in
+    effect while the view is dispatched and while its response is rendered.
+    """
+    def __init__(self, viewset_class, view_code):
+        self.viewset_class = viewset_class
+        self.view_code = view_code
+        self.phases = OrderedDict()
+        self._active = []
+
+    def __call__(self, execute, sql, params, many, context):
+        for phase in self._active:
+            phase.queries += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def measure(self, name):
+        """ Context manager that adds the time & queries within to the phase """
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(name)
+        elif phase in self._active:
+            # nested in itself, already being measured
+            yield
+            return
+        self._active.append(phase)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phase.duration += (time.perf_counter() - start) * 1000
+            self._active.remove(phase)
+
+    @contextmanager
+    def count_queries(self):
+        """ Context manager that counts the queries within, on all databases """
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield
+
+    def server_timing(self):
+        """ Returns the phases as the value of a ``Server-Timing`` header """
+        return ', '.join(
+            '%s;dur=%.1f;desc="%d quer%s"' % (
+                phase.name, phase.duration, phase.queries,
+                'y' if phase.queries == 1 else 'ies')
+            for phase in self.phases.values())
+
+
+class InstrumentedTemplateResponse(TemplateResponse):
+    """ TemplateResponse that records the template rendering to its timings """
+    timings = None
+
+    @property
+    def rendered_content(self):
+        if self.timings is None:
+            return super(InstrumentedTemplateResponse, self).rendered_content
+        with self.timings.measure(TOTAL), self.timings.measure('render'), \
+                self.timings.count_queries():
+            return super(InstrumentedTemplateResponse, self).rendered_content
+
+
+@contextmanager
+def _unmeasured():
+    yield
+
+
+def measure(timings, name):
+    """
+    Returns the context manager that measures a phase into timings, which
+    does nothing if timings is None, as it is when instrumentation is off.
+    """
+    if timings is None:
+        return _unmeasured()
+    return timings.measure(name)
+
+
+class BaseSink(object):
+    """
+    Sinks receive the timings of every instrumented view. Derive from this
+    class and implement ``record()`` to send them to a metrics system, and set
+    its dotted path as ``POPUPCRUD['instrumentation_sink']``.
+    """
+    def record(self, timings, request, response):
+        """ Records the ViewTimings of the view that answered request """
+        raise NotImplementedError
+
+
+class LoggingSink(BaseSink):
+    """ Logs the timings to the ``popupcrud`` logger, at DEBUG level """
+
+    def record(self, timings, request, response):
+        logger.debug("%s.%s %s %s", timings.viewset_class.__name__,
+                     timings.view_code, request.get_full_path(),
+                     timings.server_timing())
+
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def get_sink(path):
+    """ Returns the sink instance for the dotted path to its class """
+    with _sinks_lock:
+        if path not in _sinks:
+            _sinks[path] = import_string(path)()
+        return _sinks[path]
+
+
+def finish(timings, view, request, response, sink_path=None):
+    """
+    Publishes the timings of a view, once its response is complete, as the
+    ``Server-Timing`` header of the response, the ``view_timed`` signal
+    and to the sink, if one is set.
+    """
+    response['Server-Timing'] = timings.server_timing()
+    view_timed.send(sender=timings.viewset_class, view=view, request=request,
+                    response=response, timings=timings)
+    if sink_path:
+        try:
+            get_sink(sink_path).record(timings, request, response)
+        except Exception:   # pylint: disable=W0703
+            # metrics are not worth failing the request for
+            logger.exception("Instrumentation sink %s failed", sink_path)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+""" Popupcrud background jobs, used to run long-running item actions """
+
+from concurrent import futures
+import logging
+import threading
+import uuid
+
+from django.db import connections
+from django.utils.module_loading import import_string
+from django.utils.translation import ugettext
+
+logger = logging.getLogger('popupcrud')
+
+KEY_PREFIX = 'popupcrud:job'
+
+# Number of seconds job status is kept for
+JOB_STATUS_TIMEOUT = 3600
+
+# Job states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _job_key(job_id):
+    return '%s:%s' % (KEY_PREFIX, job_id)
+
+
+def _owner_key(job_id):
+    return '%s:%s:owner' % (KEY_PREFIX, job_id)
+
+
+def get_job_status(cache, job_id):
+    """
+    Returns the status of the job, a dict with the keys ``state``,
+    ``result`` & ``message``, or None if the job is not known.
+    """
+    return cache.get(_job_key(job_id))
+
+
+def get_job_owner(cache, job_id):
+    """ Returns the pk of the user who submitted the job """
+    return cache.get(_owner_key(job_id))
+
+
+def set_job_status(cache, job_id, state, result=None, message=''):
+    cache.set(_job_key(job_id), {
+        'state': state,
+        'result': result,
+        'message': message,
+    }, JOB_STATUS_TIMEOUT)
+
+
+def run_job(cache, job_id, func, *args, **kwargs):
+    """
+    Runs the action handler, recording its progress and result as the job
+    status. Handlers return a 2-tuple of (bool, message), like the item
+    action handlers do.
+    """
+    set_job_status(cache, job_id, RUNNING)
+    try:
+        result, message = func(*args, **kwargs)
+        set_job_status(cache, job_id, DONE, result, message)
+    except Exception:   # pylint: disable=W0703
+        logger.exception("Background job %s failed", job_id)
+        set_job_status(cache, job_id, FAILED, False, ugettext("Action failed"))
+
+
+class BaseExecutor(object):
+    """
+    Executors run the background jobs. Derive from this class and implement
+    ``submit()`` to run them elsewhere, such as on an external task queue, and
+    set its dotted path as ``POPUPCRUD['action_executor']``.
+    """
+    def submit(self, cache, job_id, func, *args, **kwargs):
+        """
+        Schedules ``run_job(cache, job_id, func, *args, **kwargs)`` to be run.
+        """
+        raise NotImplementedError
+
+
+class ImmediateExecutor(BaseExecutor):
+    """ Runs the jobs right away, within the request. Useful for testing. """
+
+    def submit(self, cache, job_id, func, *args, **kwargs):
+        run_job(cache, job_id, func, *args, **kwargs)
+
+
+class ThreadPoolExecutor(BaseExecutor):
+    """
+    The default executor, runs the jobs on a pool of threads in the web
+    server process. Note that jobs in flight are lost if the process exits.
+    """
+    #: Number of threads in the pool
+    max_workers = 4
+
+    def __init__(self):
+        self._pool = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def submit(self, cache, job_id, func, *args, **kwargs):
+        self._pool.submit(self._run, cache, job_id, func, *args, **kwargs)
+
+    @staticmethod
+    def _run(cache, job_id, func, *args, **kwargs):
+        try:
+            run_job(cache, job_id, func, *args, **kwargs)
+        finally:
+            # pool threads outlive the job, don't leave connections behind
+            connections.close_all()
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(path):
+    """ Returns the executor instance for the dotted path to its class """
+    with _executors_lock:
+        if path not in _executors:
+            _executors[path] = import_string(path)()
+        return _executors[path]
+
+
+def submit_job(executor_path, cache, owner, func, *args, **kwargs):
+    """
+    Submits the action handler to be run by the executor as a background job
+    on behalf of the user whose pk is owner. Returns the job id.
+    """
+    job_id = uuid.uuid4().hex
+    cache.set(_owner_key(job_id), owner, JOB_STATUS_TIMEOUT)
+    set_job_status(cache, job_id, PENDING)
+    get_executor(executor_path).submit(cache, job_id, func, *args, **kwargs)
+    return job_id
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0212
+""" Popupcrud list view paginators """
+
+import base64
+import binascii
+import collections.abc
+import json
+
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, DatabaseError
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.contrib.admin.utils import get_fields_from_path
+
+from pure_pagination import Paginator
+from pure_pagination.paginator import EmptyPage
+
+# pure_pagination looks up collections.Iterable, which is only available as
+# collections.abc.Iterable from Python 3.10, when building the page links
+if not hasattr(collections, 'Iterable'):
+    collections.Iterable = collections.abc.Iterable
+
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+
+
+def planner_row_estimate(queryset):
+    """
+    Returns the query planner's estimate of the number of rows that the
+    queryset would return. Only PostgreSQL is supported, returns None for the
+    other databases or if the estimate could not be obtained.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    except (DatabaseError, EmptyResultSet, ValueError, LookupError, TypeError):
+        return None
+
+
+class CountStrategyPaginator(Paginator):
+    """
+    A pure_pagination Paginator whose row count is provided by the function
+    ``count_func``, which is called with the object list and returns a 2-tuple
+    of (count, exact). The count may be inexact, for instance an estimate
+    from the query planner, in which case ``count_is_exact`` is False and
+    pages beyond the estimated number of pages are not rejected.
+    """
+    def __init__(self, object_list, per_page, count_func=None, **kwargs):
+        super(CountStrategyPaginator, self).__init__(object_list, per_page, **kwargs)
+        self.count_func = count_func
+        self.count_is_exact = True
+
+    def _get_count(self):
+        if self._count is None and self.count_func:
+            self._count, self.count_is_exact = self.count_func(self.object_list)
+        return super(CountStrategyPaginator, self)._get_count()
+    count = property(_get_count)
+
+    def validate_number(self, number):
+        try:
+            return super(CountStrategyPaginator, self).validate_number(number)
+        except EmptyPage:
+            if self.count_is_exact or int(number) < 1:
+                raise
+            return int(number)
+
+
+class KeysetPage(object):
+    """
+    A page of results fetched using keyset pagination. Unlike offset based
+    pages, a keyset page does not know its number or the total number of
+    pages. It only knows if there are pages before and after it and carries
+    the query strings to go to them.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.previous_querystring = ''
+        self.next_querystring = ''
+
+    def __repr__(self):
+        return '<KeysetPage of %d objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+
+class KeysetPaginator(object):
+    """
+    Paginates a queryset using the values of its ordering fields (the
+    'keyset') from the last row of the previous page, instead of an OFFSET.
+    This way the database can seek straight to the start of the page using
+    an index, making every page as cheap as the first one. No ``COUNT(*)``
+    is issued either.
+
+    Requires a deterministic ordering, which ``ListView`` guarantees by
+    adding the primary key to the ordering. Ordering on relation fields
+    (which would order by the related model's ordering) or on expressions is
+    not supported, ``supported`` is False for such querysets.
+
+    The keyset of a row is encoded into an opaque cursor string.
+    """
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = self._get_keys(queryset)
+        self.supported = self.keys is not None
+
+    @staticmethod
+    def _get_keys(queryset):
+        """
+        Returns a list of (path, field, descending) tuples for the queryset
+        ordering or None if the ordering can't be used as a keyset.
+        """
+        model = queryset.model
+        keys = []
+        for item in queryset.query.order_by:
+            if not isinstance(item, str) or item == '?':
+                return None
+            descending = item.startswith('-')
+            path = item.lstrip('-')
+            if path == 'pk':
+                field = model._meta.pk
+            elif path in queryset.query.annotations:
+                field = None
+            else:
+                try:
+                    field = get_fields_from_path(model, path)[-1]
+                except (FieldDoesNotExist, AttributeError):
+                    return None
+                if field.is_relation:
+                    return None
+            keys.append((path, field, descending))
+        return keys or None
+
+    def _key_attr(self, index):
+        """ Object attribute that holds the value of key at index """
+        path, field, _ = self.keys[index]
+        if LOOKUP_SEP in path:
+            return 'popupcrud_key_%d' % index     # annotated, see page()
+        return field.attname if field is not None else path
+
+    def _key_values(self, obj):
+        # rows of values() querysets are dicts
+        if isinstance(obj, dict):
+            return [obj[self._key_attr(index)] for index in range(len(self.keys))]
+        return [getattr(obj, self._key_attr(index))
+                for index in range(len(self.keys))]
+
+    def values_fields(self):
+        """
+        Returns the fields that a ``values()`` queryset has to include for the
+        cursors to be encoded from its rows. Keys that span relations are
+        annotated by ``page()`` and need not be included.
+        """
+        return [self._key_attr(index) for index, (path, _, _) in enumerate(self.keys)
+                if LOOKUP_SEP not in path]
+
+    def encode_cursor(self, obj, direction):
+        """ Returns the cursor for the given row object and direction """
+        data = json.dumps({'k': self._key_values(obj), 'd': direction},
+                          cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        Returns a 2-tuple of (key values, direction) decoded from the cursor
+        string. Raises ValueError if the cursor is invalid.
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+            values, direction = list(data['k']), data['d']
+        except (TypeError, KeyError, binascii.Error, UnicodeError) as e:
+            raise ValueError(str(e))
+        if len(values) != len(self.keys) or \
+            direction not in (CURSOR_NEXT, CURSOR_PREVIOUS):
+            raise ValueError("Cursor does not match the ordering")
+        try:
+            values = [field.to_python(value) if field is not None and value is not None \
+                        else value for value, (_, field, _) in zip(values, self.keys)]
+        except Exception as e: # pylint: disable=W0703
+            raise ValueError(str(e))
+        return values, direction
+
+    def _seek_filter(self, values, reverse):
+        """
+        Returns the Q object that selects the rows after the row with the
+        given key values, in the queryset's ordering or in the reverse of it.
+        Rows with NULL values are placed as the database would order them.
+        """
+        nulls_largest = connections[self.queryset.db].features.nulls_order_largest
+        result = None
+        equal = Q()
+        for (path, _, descending), value in zip(self.keys, values):
+            if reverse:
+                descending = not descending
+            # do NULLs come after all the other values in this direction?
+            nulls_after = nulls_largest != descending
+            if value is None:
+                after = None if nulls_after else Q(**{path + '__isnull': False})
+            else:
+                after = Q(**{path + ('__lt' if descending else '__gt'): value})
+                if nulls_after:
+                    after |= Q(**{path + '__isnull': True})
+            if after is not None:
+                term = equal & after
+                result = term if result is None else result | term
+            equal &= Q(**{path + '__isnull': True}) if value is None \
+                    else Q(**{path: value})
+        return result
+
+    def page(self, cursor=None):
+        """
+        Returns the KeysetPage for the given cursor. An empty or invalid
+        cursor returns the first page.
+        """
+        queryset = self.queryset.annotate(**dict(
+            ('popupcrud_key_%d' % index, F(path))
+            for index, (path, _, _) in enumerate(self.keys) if LOOKUP_SEP in path))
+
+        values, direction = None, CURSOR_NEXT
+        if cursor:
+            try:
+                values, direction = self.decode_cursor(cursor)
+            except ValueError:
+                pass
+
+        reverse = direction == CURSOR_PREVIOUS
+        if reverse:
+            queryset = queryset.reverse()
+        if values is not None:
+            seek = self._seek_filter(values, reverse)
+            queryset = queryset.filter(seek) if seek is not None else queryset.none()
+
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if reverse:
+            objects.reverse()
+            return KeysetPage(objects, self, has_more, True)
+        return KeysetPage(objects, self, values is not None, has_more)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=W0212
+""" Popupcrud list view search backends """
+
+from functools import reduce
+import operator
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.models import Q
+from django.utils.text import smart_split, unescape_string_literal
+
+try:
+    from django.contrib.admin.utils import lookup_spawns_duplicates
+except ImportError:     # Django < 4.0
+    from django.contrib.admin.utils import \
+        lookup_needs_distinct as lookup_spawns_duplicates
+
+# search_fields prefixes and the lookups they stand for
+PREFIX_LOOKUPS = {
+    '^': 'istartswith',
+    '=': 'iexact',
+    '@': 'search',
+}
+
+
+def parse_search_field(search_field):
+    """
+    Splits a ``search_fields`` entry, such as ``^name``, into a 2-tuple of
+    (field path, prefix). Prefix is '' for entries without one.
+    """
+    if search_field[:1] in PREFIX_LOOKUPS:
+        return search_field[1:], search_field[0]
+    return search_field, ''
+
+
+def search_terms(search_term):
+    """
+    Splits the search string into its terms. Like Django admin, quoted
+    strings are treated as a single term.
+    """
+    terms = []
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        if bit:
+            terms.append(bit)
+    return terms
+
+
+class SimpleSearchBackend(object):
+    """
+    The default search backend, which works the same way as Django admin's
+    search. The search string is split into terms and each term has to
+    match at least one of the search fields, using ``icontains`` (or
+    ``istartswith`` and ``iexact`` for fields prefixed with ``^`` and ``=``).
+
+    This works on every database, but ``icontains`` translates into
+    ``LIKE '%term%'``, which cannot use a regular index. Fields prefixed with
+    ``@``, which stand for full-text search, are treated as unprefixed fields.
+    """
+
+    def get_lookup(self, path, prefix):
+        """ Returns the lookup used to match the given search field """
+        if prefix in ('^', '='):
+            return '%s__%s' % (path, PREFIX_LOOKUPS[prefix])
+        return '%s__icontains' % path
+
+    def term_filter(self, fields, term):
+        """
+        Returns the Q object that matches a single search term against any
+        of the (field path, prefix) tuples in fields.
+        """
+        return reduce(operator.or_, (Q(**{self.get_lookup(path, prefix): term})
+                                     for path, prefix in fields))
+
+    def search(self, queryset, search_fields, search_term):
+        """
+        Filters the queryset by the search string. Returns a 2-tuple of
+        (queryset, may_have_duplicates) where ``may_have_duplicates`` is True
+        if a search field spans a multi-valued relation.
+        """
+        fields = [parse_search_field(field) for field in search_fields]
+        terms = search_terms(search_term)
+        if not fields or not terms:
+            return queryset, False
+        for term in terms:
+            queryset = queryset.filter(self.term_filter(fields, term))
+        return queryset, self.may_have_duplicates(queryset, fields)
+
+    @staticmethod
+    def may_have_duplicates(queryset, fields):
+        """ Returns True if any of the search fields would duplicate rows """
+        opts = queryset.model._meta
+        return any(lookup_spawns_duplicates(opts, path) for path, _ in fields)
+
+
+class PostgresSearchBackend(SimpleSearchBackend):
+    """
+    PostgreSQL full-text search. Fields prefixed with ``@``, or all the
+    unprefixed fields if there are none, are combined into a
+    ``SearchVector`` that is matched against the search string as a whole.
+    Fields prefixed with ``^`` and ``=`` are matched as in the simple backend
+    and ORed with the full-text match. If every field is prefixed with ``^``
+    or ``=``, there is no full-text match.
+
+    To avoid computing the vector for every row, create an index on the same
+    expression, with the same ``config``, in the model's ``Meta``::
+
+        indexes = [GinIndex(SearchVector('title', 'summary', config='english'),
+                            name='book_search_idx')]
+
+    Or, set ``vector_field`` to the name of a ``SearchVectorField`` that is
+    kept up to date by the application (or by a trigger) and index it.
+
+    Customize the backend by subclassing and overriding its attributes. On
+    databases other than PostgreSQL this falls back to the simple backend.
+    """
+    #: The text search configuration, such as ``'english'``. None uses the
+    #: database's ``default_text_search_config``.
+    config = None
+
+    #: ``search_type`` of the ``SearchQuery``, one of ``'plain'``,
+    #: ``'phrase'``, ``'raw'`` or ``'websearch'``.
+    search_type = 'plain'
+
+    #: Name of a ``SearchVectorField`` on the model to search instead of
+    #: computing the vector from the search fields.
+    vector_field = None
+
+    def search(self, queryset, search_fields, search_term):
+        if connections[queryset.db].vendor != 'postgresql':
+            return super(PostgresSearchBackend, self).search(
+                queryset, search_fields, search_term)
+
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+
+        fields = [parse_search_field(field) for field in search_fields]
+        terms = search_terms(search_term)
+        if not fields or not terms:
+            return queryset, False
+
+        fulltext = [path for path, prefix in fields if prefix == '@'] or \
+                   [path for path, prefix in fields if not prefix]
+        others = [(path, prefix) for path, prefix in fields
+                  if prefix and prefix != '@']
+
+        matches = []
+        query = SearchQuery(search_term, config=self.config,
+                            search_type=self.search_type)
+        if self.vector_field:
+            matches.append(Q(**{self.vector_field: query}))
+        elif fulltext:
+            # alias() keeps the vector out of the SELECT, where available
+            alias = getattr(queryset, 'alias', queryset.annotate)
+            queryset = alias(popupcrud_search=SearchVector(*fulltext, config=self.config))
+            matches.append(Q(popupcrud_search=query))
+        if others:
+            matches.append(reduce(operator.and_,
+                                  (self.term_filter(others, term) for term in terms)))
+        return queryset.filter(reduce(operator.or_, matches)), \
+            self.may_have_duplicates(queryset, fields)
+
+
+class TrigramSearchBackend(SimpleSearchBackend):
+    """
+    PostgreSQL trigram search, requires the ``pg_trgm`` extension and
+    ``django.contrib.postgres`` in ``INSTALLED_APPS``. Unprefixed fields
+    match terms that are contained in, or are similar to a word in, the
+    field's value, which also makes the search tolerant of typos.
+
+    With a trigram index on the search fields, both ``icontains`` and the
+    similarity match are served from the index instead of a sequential
+    scan::
+
+        indexes = [GinIndex(fields=['title'], name='book_title_trgm_idx',
+                            opclasses=['gin_trgm_ops'])]
+
+    Requires Django 3.0 or later, for the ``trigram_word_similar`` lookup. On
+    databases other than PostgreSQL this falls back to the simple backend.
+    """
+
+    def term_filter(self, fields, term):
+        result = super(TrigramSearchBackend, self).term_filter(fields, term)
+        similar = [Q(**{'%s__trigram_word_similar' % path: term})
+                   for path, prefix in fields if prefix in ('', '@')]
+        return reduce(operator.or_, similar, result)
+
+    def search(self, queryset, search_fields, search_term):
+        if connections[queryset.db].vendor != 'postgresql':
+            return SimpleSearchBackend().search(
+                queryset, search_fields, search_term)
+        if django.VERSION < (3, 0):
+            raise ImproperlyConfigured(
+                "TrigramSearchBackend requires Django 3.0 or later")
+        return super(TrigramSearchBackend, self).search(
+            queryset, search_fields, search_term)
@@ -28,14 +28,16 @@ const CRUDFORM_READY = "crudform.ready";
         modal: jQuery selector to the modal dialog to be dismissed post successful
                form submission
         complete: A function to be called upon successful form submission.
+        headers: Optional object of additional request headers.
      */
-    submitModalForm = function(form, modal, complete) {
+    submitModalForm = function(form, modal, complete, headers) {
         $(form).submit(function(e) {
             e.preventDefault();
             $.ajax({
                 type: $(this).attr('method'),
                 url: $(this).attr('action'),
                 data: $(this).serialize(),
+                headers: headers || {},
                 success: function (xhr, ajaxOptions, thrownError) {
                     if ( $(xhr).find('.has-error').length > 0 ||
                          $(xhr).find('.alert').length > 0) {
@@ -43,8 +45,9 @@ const CRUDFORM_READY = "crudform.ready";
                         bindAddAnother($(modal));
                         initFormset(modal)
                         bindSelect2(modal, modal);
+                        bindAutocomplete(modal, modal);
                         triggerCrudFormReady(modal);
-                        submitModalForm(form, modal, complete);
+                        submitModalForm(form, modal, complete, headers);
                     } else {
                         $(modal).modal('hide');
                         if (typeof complete == "function") {
@@ -99,6 +102,57 @@ const CRUDFORM_READY = "crudform.ready";
         });
       }
     },
+    /*
+     * Binds the select boxes under 'parent' in the autocomplete mode of
+     * RelatedFieldPopupFormWidget, with css class .popupcrud-autocomplete,
+     * to their data-autocomplete-url. select2 is used, if it's loaded.
+     * Otherwise a text input is added before the select box and the options
+     * matching its text are loaded into the select box as the user types.
+     */
+    bindAutocomplete = function(selectParent, dropdownParent) {
+      $(selectParent).find('select.popupcrud-autocomplete').each(function(index, select) {
+        var url = $(select).data('autocomplete-url');
+        if ($(select).data('autocomplete-bound')) {
+          return;
+        }
+        $(select).data('autocomplete-bound', true);
+        if ($.fn.select2) {
+          $(select).select2({
+            dropdownParent: $(dropdownParent),
+            ajax: {
+              url: url,
+              dataType: 'json',
+              delay: 250,
+              data: function(params) {
+                return {term: params.term || '', page: params.page || 1};
+              }
+            }
+          });
+          return;
+        }
+        var timer = null;
+        var input = $('<input type="text" class="form-control popupcrud-autocomplete-search">')
+          .attr('placeholder', $(select).find('option[value=""]').text());
+        $(select).before(input);
+        input.on('input', function() {
+          var term = $(this).val();
+          clearTimeout(timer);
+          timer = setTimeout(function() {
+            $.getJSON(url, {term: term, page: 1}, function(data) {
+              // keep the empty & the selected options, replace the rest
+              $(select).find('option').not('[value=""]').not(':selected').remove();
+              $.each(data.results, function(i, result) {
+                if ($(select).find('option').filter(function() {
+                      return String($(this).val()) == String(result.id);
+                    }).length == 0) {
+                  $(select).append($('<option></option>').attr('value', result.id).text(result.text));
+                }
+              });
+            });
+          }, 250);
+        });
+      });
+    },
     /*
      * Binds all '.add-another' hyperlinks under the given 'elem' with their own
      * modals, each of which will hold the form for the .add-another's data-url
@@ -181,9 +235,32 @@ const CRUDFORM_READY = "crudform.ready";
         $('#create-edit-modal').modal('show');
         submitModalForm('#create-edit-form',
           '#create-edit-modal', function(xhr) {
-            location.reload();
-          });
+            updateListRow(xhr);
+          }, {'X-PopupCrud-Row': '1'});
+      });
+    },
+    /*
+     * Updates the list with the row of the object that was just created or
+     * updated, as returned by the create/update view. The object's row is
+     * replaced if it's in the list, otherwise it's added to the top of the
+     * list. Falls back to reloading the page if the list or the row is not
+     * available, such as for an empty list.
+     */
+    updateListRow = function(xhr) {
+      var tbody = $('table.popupcrud-list > tbody').first();
+      if (!xhr || !xhr.row || tbody.length == 0) {
+        location.reload();
+        return;
+      }
+      var row = $($.parseHTML($.trim(xhr.row)));
+      var existing = tbody.children('tr').filter(function() {
+        return String($(this).data('pk')) == String(xhr.pk);
       });
+      if (existing.length > 0) {
+        existing.first().replaceWith(row);
+      } else {
+        tbody.prepend(row);
+      }
     },
     // handler for object detail view
     handleObjectDetail = function(evtObj) {
@@ -199,7 +276,7 @@ const CRUDFORM_READY = "crudform.ready";
     handleDeleteObject = function(evtObj) {
       evtObj.preventDefault();
       $('#delete-modal #id_object_name').text(
-        $(evtObj.target).parents('tr').children(':nth-child(1)').children('div').data('name'));
+        $(evtObj.target).parents('tr').find('div[data-name]').first().data('name'));
       $('#delete-modal .modal-body form').attr(
         'action', $(evtObj.target).parent('a').data('url'));
       $('#delete-modal').modal('show');
@@ -222,6 +299,62 @@ const CRUDFORM_READY = "crudform.ready";
           action: action,
           item: $(this).data('obj')
         },
+        success: function (xhr, ajaxOptions, thrownError) {
+          if (xhr.job) {  // running in the background
+            pollJobStatus(xhr.status_url, title);
+          } else {
+            showActionResult(xhr.result, title, xhr.message);
+          }
+        }
+      });
+    },
+    /*
+     * Polls the status of a background action job until it completes and
+     * then shows its result.
+     */
+    pollJobStatus = function(url, title) {
+      $.ajax({
+        type: 'GET',
+        url: url,
+        success: function (status, ajaxOptions, thrownError) {
+          if (status.state == 'done' || status.state == 'failed') {
+            showActionResult(status.result, title, status.message);
+          } else {
+            setTimeout(function() { pollJobStatus(url, title); }, 1000);
+          }
+        },
+        error: function (xhr, ajaxOptions, thrownError) {
+          showActionResult(false, title, thrownError);
+        }
+      });
+    },
+    // bulk action handler, runs the action over the selected rows
+    handleBulkAction = function(evtObj) {
+      evtObj.preventDefault();
+      var action = $(this).data('action');
+      var title = $(this).attr('title');
+      var selectAll = $("input[name='select_all']").is(':checked');
+      var items = $("table.popupcrud-list input[name='items']:checked").map(function() {
+        return $(this).val();
+      }).get();
+      if (!selectAll && items.length == 0) {
+        return;
+      }
+      if (!window.confirm(title + '?')) {
+        return;
+      }
+      $.ajax({
+        type: 'POST',
+        // posted to the list url, with its query string, so that selecting
+        // all the rows acts upon the rows as currently searched & filtered
+        url: window.location.href,
+        traditional: true,
+        data: {
+          csrfmiddlewaretoken: getCookie('csrftoken'),
+          bulk_action: action,
+          select_all: selectAll ? '1' : '',
+          items: items
+        },
         success: function (xhr, ajaxOptions, thrownError) {
           showActionResult(xhr.result, title, xhr.message);
         }
@@ -248,6 +381,39 @@ const CRUDFORM_READY = "crudform.ready";
         });
       $('#action-result-modal').modal('show');
     },
+    /*
+     * Loads the list content, the table and the pagination, from the given
+     * list url and swaps it in place of the current content. The list view
+     * renders just the content for AJAX requests.
+     *
+       Parameters:
+        url: list url, with the sorting & paging query string
+        push: if true, url is pushed to the browser history
+     */
+    loadListContent = function(url, push) {
+      $.ajax({
+        type: 'GET',
+        url: url,
+        success: function (html) {
+          $('#popupcrud-list-content').html(html);
+          if (push && window.history && window.history.pushState) {
+            window.history.pushState({popupcrud: true}, '', url);
+          }
+        },
+        error: function (xhr, ajaxOptions, thrownError) {
+          window.location.href = url;
+        }
+      });
+    },
+    // handler for the list header sort links and the paginator links
+    handleListNavigation = function(evtObj) {
+      var href = $(this).attr('href');
+      if (!href || href.indexOf('javascript:') == 0) {
+        return;
+      }
+      evtObj.preventDefault();
+      loadListContent(this.href, true);
+    },
     // reads the formset form template and stores in _formsetTemplate variable.
     cacheFormsetTemplate = function() {
       popupCrudFormsetFormTempl = $("#id_formset table>tbody>tr:last").clone(true).removeAttr('id');
@@ -279,6 +445,7 @@ const CRUDFORM_READY = "crudform.ready";
               dropDownParent = formsetDiv.parents('.modal');
             }
             bindSelect2(row, dropDownParent);
+            bindAutocomplete(row, dropDownParent);
           }
         });
       }
@@ -312,14 +479,30 @@ const CRUDFORM_READY = "crudform.ready";
        */
       initFormset(this);
       bindSelect2(this, this);
+      bindAutocomplete(this, this);
       triggerCrudFormReady(this);
     });
 
-    // Connect the action buttons to their relevant handlers.
-    $("[name=create_edit_object]").click(handleCreateEdit);
-    $("[name=object_detail]").click(handleObjectDetail);
-    $("a[name='delete_object']").click(handleDeleteObject);
-    $("a[name='custom_action']").click(handleCustomAction);
+    // Connect the action buttons to their relevant handlers. Handlers are
+    // delegated so that rows added or replaced in the list are handled too.
+    $(document).on('click', "[name=create_edit_object]", handleCreateEdit);
+    $(document).on('click', "[name=object_detail]", handleObjectDetail);
+    $(document).on('click', "a[name='delete_object']", handleDeleteObject);
+    $(document).on('click', "a[name='custom_action']", handleCustomAction);
+    $(document).on('click', "a[name='bulk_action']", handleBulkAction);
+    $(document).on('change', "input[name='select_rows']", function(evtObj) {
+      $("table.popupcrud-list input[name='items']").prop('checked', $(this).is(':checked'));
+    });
+
+    // Sort & page the list in place
+    $(document).on('click',
+      "#popupcrud-list-content thead a, #popupcrud-list-content .pagination a",
+      handleListNavigation);
+    $(window).on('popstate', function(evtObj) {
+      if ($('#popupcrud-list-content').length > 0) {
+        loadListContent(window.location.href, false);
+      }
+    });
 
 
     /**
@@ -332,6 +515,7 @@ const CRUDFORM_READY = "crudform.ready";
     if (form) {
       initFormset(form);
       bindSelect2(form, form);
+      bindAutocomplete(form, document.body);
       bindAddAnother($(form));
       triggerCrudFormReady(document);
     }
@@ -2,15 +2,17 @@
 # pylint: disable=W0212, R0914
 """ PopupCRUD list view template tags """
 
+from django.contrib.admin.utils import display_for_value
 from django.core.exceptions import FieldDoesNotExist
 from django.db.models.fields.related import RelatedField
 from django.forms.utils import pretty_name
 from django.template import Library
+from django.template.base import render_value_in_context
 from django.utils.safestring import mark_safe
-from django.utils.translation import ugettext
+from django.utils.translation import get_language, ugettext
 from django.utils.html import format_html
+from django.utils.http import urlencode
 from django.utils.text import capfirst
-from django.contrib.admin.utils import lookup_field, label_for_field as lff
 
 import six
 
@@ -18,7 +20,9 @@ from bootstrap3.renderers import FormRenderer, FormsetRenderer
 from bootstrap3.bootstrap import get_bootstrap_setting
 from bootstrap3.forms import render_field
 
-from popupcrud.views import ORDER_VAR
+from popupcrud.export import EXPORT_FORMATS, format_available
+from popupcrud.views import (
+    FORMAT_VAR, ORDER_VAR, PAGE_VAR, SEARCH_VAR, PopupCrudViewSet, get_cache)
 
 register = Library()
 
@@ -65,42 +69,33 @@ def label_for_field(view, queryset, field_name):
     }
 
 
-def _coerce_field_name(field_name, field_index):
-    """
-    Coerce a field_name (which may be a callable) to a string.
-    """
-    if callable(field_name):
-        if field_name.__name__ == '<lambda>':
-            return 'lambda' + str(field_index)
-        return field_name.__name__
-    return field_name
-
-
 def list_display_headers(view, queryset):
     """
     Returns the column headers for the fields specified in list_display
     """
     ordering_field_columns = view.get_ordering_field_columns()
 
-    for i, field_name in enumerate(view._viewset.list_display):
-        text, attr = lff(field_name, view.model, view._viewset, return_attr=True)
-        text = mark_safe(text)  # takes care of embedded tags in header labels
-        if attr:
-            field_name = _coerce_field_name(field_name, i)
-            # Potentially not sortable
-
-            order_field = getattr(attr, "order_field", None)
-            if not order_field:
-                # Not sortable
-                yield {
-                    "text": text,
-                    "class_attrib": format_html(' class="text-uppercase column-{}"', field_name),
-                    "sortable": False,
-                }
-                continue
+    # Selection column for bulk actions
+    if view._viewset.get_bulk_actions():
+        yield {
+            'text': mark_safe('<input type="checkbox" name="select_rows" title="%s">' % ugettext("Select all")),
+            'sortable': False,
+            'class_attrib': 'class=col-select'
+        }
+
+    for column in view._viewset.column_plan:
+        i = column.index
+        text = mark_safe(column.text)  # takes care of embedded tags in header labels
+        if not column.sortable:
+            yield {
+                "text": text,
+                "class_attrib": format_html(' class="text-uppercase column-{}"', column.css_name),
+                "sortable": False,
+            }
+            continue
 
         # OK, it is sortable if we got this far
-        th_classes = ['sortable', 'column-{}'.format(field_name)]
+        th_classes = ['sortable', 'column-{}'.format(column.css_name)]
         order_type = ''
         new_order_type = 'asc'
         sort_priority = 0
@@ -144,25 +139,16 @@ def list_display_headers(view, queryset):
             "sorted": sorted_field,
             "ascending": order_type == "asc",
             "sort_priority": sort_priority,
-            "url_primary": view.get_query_string({ORDER_VAR: '.'.join(o_list_primary)}),
-            "url_remove": view.get_query_string({ORDER_VAR: '.'.join(o_list_remove)}),
-            "url_toggle": view.get_query_string({ORDER_VAR: '.'.join(o_list_toggle)}),
+            # ORDER_VAR values of the sort links, made into the links' URLs
+            # by get_list_headers()
+            "order_primary": '.'.join(o_list_primary),
+            "order_remove": '.'.join(o_list_remove),
+            "order_toggle": '.'.join(o_list_toggle),
             "class_attrib": format_html(' class="text-uppercase {}"', ' '.join(th_classes)) if th_classes else '',
         }
 
-        # yield {
-        #     'text': text,
-        #     'sortable': False,
-        #     'class_attrib': 'class=col-{}'.format(field_name)
-        # }
-        #yield label_for_field(view, queryset, field_name)
-
     # Action column
-    dummy_obj = queryset.model()
-    dummy_obj.pk = 1
-    if view._viewset.get_edit_url(dummy_obj) or \
-        view._viewset.get_delete_url(dummy_obj) or \
-        view._viewset.item_actions:
+    if has_action_column(view, queryset):
         yield {
             'text': ugettext("Action"),
             'sortable': False,
@@ -170,29 +156,98 @@ def list_display_headers(view, queryset):
         }
 
 
-def list_field_value(view, obj, field, context, index):
-    value = ''
-    try:
-        # Use django.admin's function to render the list_display column value
-        # lookup_field expects a ModelAdmin instance as the third argument,
-        # but all it does is dyanamic lookup of the field as a method of this
-        # object and if found, evaluates it to return the value. So it's safe
-        # to pass it a ViewSet instance. Of course, if the lookup_field
-        # implementation changes, we'll to change this code accordingly.
-        f, _, value = lookup_field(field, obj, view._viewset)
-
-        # for fields that have 'choices=' set conver the value into its
-        # more descriptive string.
-        if getattr(f, 'choices', None):
-            choices = dict(f.choices)
-            if value in choices:
-                value = dict(choices)[value]
+def has_action_column(view, queryset):
+    """
+    Returns True if the list has the item actions column. Worked out once per
+    request, for the objects of the list page in queryset.
+    """
+    if getattr(view, '_has_action_column', None) is None:
+        view._has_action_column = _probe_action_column(view, queryset)
+    return view._has_action_column
+
+
+def _probe_action_column(view, queryset):
+    viewset = view._viewset
+    if viewset.item_actions:
+        return True
+    # the default URL getters never return None, no need to probe them
+    viewset_class = viewset.__class__
+    if viewset_class.get_edit_url is PopupCrudViewSet.get_edit_url or \
+        viewset_class.get_delete_url is PopupCrudViewSet.get_delete_url:
+        return True
+    # probe the page's first object, rather than creating a dummy one. The
+    # page's objects are fetched once, for the rows as well.
+    obj = next(iter(queryset), None)
+    if obj is None:
+        return False
+    return bool(viewset.get_edit_url(obj) or viewset.get_delete_url(obj))
+
+
+def _sort_url_builder(view):
+    """
+    Returns a function that makes the URL of a sort link from its ORDER_VAR
+    value. It's the URL view.get_query_string() returns for the value, with
+    the rest of the query string encoded once for all the sort links.
+    """
+    params = sorted((k, v) for k, v in view.params.items() if k != ORDER_VAR)
+    head = urlencode([(k, v) for k, v in params if k < ORDER_VAR])
+    tail = urlencode([(k, v) for k, v in params if k > ORDER_VAR])
+
+    def sort_url(order):
+        return '?%s' % '&'.join(
+            part for part in (head, urlencode([(ORDER_VAR, order)]), tail) if part)
+    return sort_url
 
+
+def get_list_headers(view, queryset):
+    """
+    Returns the list of column headers, as built by list_display_headers(),
+    with the URLs of their sort links. Headers are cached in the ViewSet's
+    configuration, in a cache of bounded size, as they depend on nothing but
+    the columns, the language, the ordering and whether the list has the row
+    selection and the item actions columns. The sort link URLs, which carry
+    the rest of the query string, are added for each request.
+    """
+    viewset = view._viewset
+    key = (viewset.column_plan, get_language(), view.params.get(ORDER_VAR),
+           tuple(view._get_default_ordering()), bool(viewset.get_bulk_actions()),
+           has_action_column(view, queryset))
+    headers = viewset.config.headers.get(key)
+    if headers is None:
+        headers = viewset.config.headers.set(
+            key, list(list_display_headers(view, queryset)))
+    sort_url = _sort_url_builder(view)
+    return [dict(header,
+                 url_primary=sort_url(header['order_primary']),
+                 url_remove=sort_url(header['order_remove']),
+                 url_toggle=sort_url(header['order_toggle']))
+            if header['sortable'] else header for header in headers]
+
+
+class PageRows(object):
+    """
+    The URLs, names & item actions of the rows of a list page, fetched from
+    the ViewSet's page at once methods, which are called once for the page.
+    """
+    def __init__(self, viewset, objects):
+        self.urls = viewset.get_row_urls(objects)
+        self.names = viewset.get_obj_names(objects)
+        self.actions = viewset.get_item_actions_for_page(objects)
+
+
+def list_field_value(view, obj, column, context, index, page_rows=None):
+    try:
+        # The column accessor has been resolved once for the ViewSet by its
+        # column plan. It also takes care of converting values of fields that
+        # have 'choices=' set into their more descriptive strings.
+        value = column.value(view._viewset, obj)
     except AttributeError:
-        f, _, value = (None, None, '')
+        value = ''
 
     if index == 0:
-        detail_url = view._viewset.get_detail_url(obj)
+        if page_rows is None:
+            page_rows = PageRows(view._viewset, [obj])
+        detail_url = page_rows.urls[obj.pk].detail
         if detail_url:
             title = ugettext("{0} Detail").format(
                 view._viewset.model._meta.verbose_name)
@@ -204,12 +259,12 @@ def list_field_value(view, obj, field, context, index):
                     detail_url, value, title)
 
         return mark_safe(six.text_type("{0}<div data-name='{1}'></div>").format(
-            value, view._viewset.get_obj_name(obj)))
+            value, page_rows.names[obj.pk]))
 
     return value
 
 
-def render_item_actions(context, obj):
+def render_item_actions(context, obj, page_rows=None):
     popup_edit_template = six.text_type('<a name="create_edit_object" data-url="{0}" data-title="{1}" href="javascript:void(0);"><span class="glyphicon glyphicon-pencil" title="{1}"></span></a>')
     popup_delete_template = six.text_type('<a name="delete_object" data-url="{0}" data-title="{1}" href="javascript:void(0);"><span class="glyphicon glyphicon-trash" title="{1}"></span></a>')
 
@@ -217,8 +272,10 @@ def render_item_actions(context, obj):
     legacy_delete_template = six.text_type('<a href="{0}"><span class="glyphicon glyphicon-trash" title="{1}"></span></a>')
 
     view = context['view']
-    edit_url = view._viewset.get_edit_url(obj)
-    delete_url = view._viewset.get_delete_url(obj)
+    if page_rows is None:
+        page_rows = PageRows(view._viewset, [obj])
+    edit_url = page_rows.urls[obj.pk].edit
+    delete_url = page_rows.urls[obj.pk].delete
     edit_title = ugettext("Edit {0}").format(
         view._viewset.model._meta.verbose_name)
     delete_title = ugettext("Delete {0}").format(
@@ -233,7 +290,7 @@ def render_item_actions(context, obj):
     edit_action = edit_template.format(edit_url, edit_title) if edit_url else ''
     delete_action = delete_template.format(delete_url, delete_title) if delete_url else ''
     custom_actions = []
-    for index, action in enumerate(view._viewset.get_item_actions(obj)):
+    for index, action in enumerate(page_rows.actions[obj.pk]):
         custom_actions.append(
             "<a name='custom_action' href='javascript:void(0);' title='{0}' data-action='{1}' data-obj='{2}'><span class='{3}'></span></a>".format(
                 action[0], index, obj.pk, action[1]))
@@ -244,23 +301,109 @@ def render_item_actions(context, obj):
     return mark_safe(item_actions)
 
 
-def render_list_display(view, obj, context):
-    for i, name in enumerate(view._viewset.list_display):
-        yield list_field_value(view, obj, name, context, i)
+def render_list_display(view, obj, context, page_rows=None):
+    if page_rows is None:
+        page_rows = PageRows(view._viewset, [obj])
 
-    yield render_item_actions(context, obj)
+    if view._viewset.get_bulk_actions():
+        yield format_html('<input type="checkbox" name="items" value="{0}">', obj.pk)
+
+    for column in view._viewset.column_plan:
+        yield list_field_value(view, obj, column, context, column.index, page_rows)
+
+    yield render_item_actions(context, obj, page_rows)
+
+
+class ListRow(list):
+    """
+    The cells of a list row, which renders itself as the row's ``<tr>``
+    element, tagged with the object's pk. Cells are rendered the same way
+    as template variables are.
+    """
+    def __init__(self, pk, cells, context):
+        super(ListRow, self).__init__(cells)
+        self.pk = pk
+        self.context = context
+
+    def render_cells(self):
+        """ Returns the cells rendered into HTML strings """
+        return [six.text_type(render_value_in_context(cell, self.context))
+                for cell in self]
+
+    def __str__(self):
+        return format_html('<tr data-pk="{0}">{1}</tr>', self.pk, mark_safe(''.join(
+            format_html('<td>{0}</td>', cell) for cell in self.render_cells())))
+    __html__ = __str__
+
+
+def render_list_row(view, obj, context, page_rows=None):
+    """
+    Returns the ListRow for the object. Rows of the list view and the rows
+    returned by the create/update views to update the list in place, both
+    come from here. ``page_rows`` is the PageRows of the objects rendered
+    along with obj, which is worked out for obj alone if not given.
+    """
+    return ListRow(obj.pk, render_list_display(view, obj, context, page_rows), context)
 
 
 def list_display_results(view, queryset, context):
-    for obj in queryset:
-        yield render_list_display(view, obj, context)
+    objects = list(queryset)
+    prefix = view.get_row_cache_prefix()
+    if prefix is None:
+        page_rows = PageRows(view._viewset, objects)
+        for obj in objects:
+            yield render_list_row(view, obj, context, page_rows)
+        return
+
+    # fetch the page's rows from the cache in one go, render the rest. Rows
+    # are cached as their rendered cells, which are still iterated over by
+    # the template.
+    keys = [view.get_row_cache_key(prefix, obj) for obj in objects]
+    cache = get_cache()
+    cached = cache.get_many(keys)
+    page_rows = PageRows(view._viewset, [
+        obj for key, obj in zip(keys, objects) if key not in cached])
+    missing = {}
+    for key, obj in zip(keys, objects):
+        cells = cached.get(key)
+        if cells is None:
+            cells = missing[key] = render_list_row(
+                view, obj, context, page_rows).render_cells()
+        yield ListRow(obj.pk, [mark_safe(cell) for cell in cells], context)
+    if missing:
+        cache.set_many(missing, view._viewset.row_cache_timeout)
+
+
+def list_display_footer(view, queryset):
+    """
+    Returns the cells of the list footer, the ViewSet's ``list_aggregates``
+    under their columns, or None if there are no aggregates. queryset holds
+    the objects of the list page.
+    """
+    aggregates = view.get_aggregates()
+    if not aggregates:
+        return None
+    cells = []
+    if view._viewset.get_bulk_actions():
+        cells.append('')
+    for column in view._viewset.column_plan:
+        # formatted & localized as admin formats the values of its cells
+        cells.append(display_for_value(aggregates[column.name], '')
+                     if column.name in aggregates else '')
+    if has_action_column(view, queryset):
+        cells.append('')
+    return cells
 
 
 @register.inclusion_tag("popupcrud/list_content.html", takes_context=True)
 def list_content(context):
     view = context['view']
     queryset = context['object_list'] #view.get_queryset()
-    headers = list(list_display_headers(view, queryset))
+    with view.measure('headers'):
+        headers = get_list_headers(view, queryset)
+
+    with view.measure('rows'):
+        results = list(list_display_results(view, queryset, context))
 
     num_sorted_fields = 0
     for h in headers:
@@ -269,18 +412,97 @@ def list_content(context):
 
     return {
         'headers': headers,
-        'results': list_display_results(view, queryset, context),
+        'results': results,
+        'footer': list_display_footer(view, queryset),
         'num_sorted_fields': num_sorted_fields,
     }
 
 
+@register.inclusion_tag("popupcrud/_search_form.html", takes_context=True)
+def search_form(context):
+    view = context['view']
+    return {
+        'search_enabled': bool(view._viewset.get_search_fields()),
+        'search_var': SEARCH_VAR,
+        'query': view.query,
+        # retain the rest of the list state, such as ordering, across
+        # searches, but start the results at the first page
+        'params': sorted((k, v) for k, v in view.params.items()
+                         if k not in (SEARCH_VAR, PAGE_VAR, view.page_kwarg)),
+    }
+
+
+@register.inclusion_tag("popupcrud/_list_filters.html", takes_context=True)
+def list_filters(context):
+    view = context['view']
+    filters = []
+    for list_filter, options in view.get_list_filter_options():
+        choices = []
+        selected = None
+        for option in options:
+            params = dict(option['params'])
+            # a filtered list starts at its first page
+            params[PAGE_VAR] = params[view.page_kwarg] = None
+            is_selected = list_filter.is_selected(option)
+            choices.append({
+                'label': option['label'],
+                'count': option['count'],
+                'url': view.get_query_string(params),
+                'selected': is_selected,
+            })
+            if is_selected:
+                selected = option['label']
+        filters.append({
+            'title': list_filter.title,
+            'options': choices,
+            # the first option clears the filter
+            'selected': selected if not choices[0]['selected'] else None,
+        })
+    return {'filters': filters}
+
+
+@register.inclusion_tag("popupcrud/_export_menu.html", takes_context=True)
+def export_menu(context):
+    view = context['view']
+    export_url = view._viewset.get_export_url()
+    formats = []
+    if export_url:
+        for fmt in view._viewset.get_export_formats():
+            if fmt in EXPORT_FORMATS and format_available(fmt):
+                # export the list as currently searched, filtered & sorted
+                formats.append((fmt.upper(), '%s%s' % (export_url, view.get_query_string(
+                    {PAGE_VAR: None, view.page_kwarg: None, FORMAT_VAR: fmt}))))
+    return {'formats': formats}
+
+
+@register.inclusion_tag("popupcrud/_bulk_actions.html", takes_context=True)
+def bulk_actions_menu(context):
+    view = context['view']
+    actions = view._viewset.get_bulk_actions()
+    page_obj = context.get('page_obj')
+    # offer selecting all the rows only if there are more than a page
+    paginated = bool(page_obj and page_obj.has_other_pages())
+    return {
+        'actions': [(index, action[0], action[1]) for index, action in enumerate(actions)],
+        'paginated': paginated,
+        'count': page_obj.paginator.count if paginated and \
+            not getattr(page_obj, 'is_keyset', False) else None,
+    }
+
+
 @register.inclusion_tag("popupcrud/empty_list.html", takes_context=True)
 def empty_list(context):
-    viewset = context['view']._viewset
+    view = context['view']
+    viewset = view._viewset
+    if getattr(view, 'query', None):
+        message = ugettext("No {0} match your search.").format(
+            viewset.model._meta.verbose_name_plural)
+    else:
+        message = viewset.get_empty_list_message()
     return {
         'viewset': viewset,
         'icon': viewset.get_empty_list_icon(),
-        'message': viewset.get_empty_list_message(),
+        'message': message,
         'new_button_text': ugettext("New {0}").format(
             viewset.model._meta.verbose_name),
     }
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+""" Popupcrud helpers for testing the ViewSets """
+
+
+class PopupCrudTestMixin(object):
+    """
+    Mixin for ``django.test.TestCase`` with assertions for the ViewSet views.
+    """
+    def assertPopupNumQueries(self, num, url, using='default', **extra):  # pylint: disable=C0103
+        """
+        Asserts that loading the create/edit popup at url, as the popup does
+        with an AJAX GET request, runs num database queries. Returns the
+        response.
+
+        Queries run by the middleware, such as loading the session of a
+        logged in user, are counted as well.
+        """
+        extra.setdefault('HTTP_X_REQUESTED_WITH', 'XMLHttpRequest')
+        with self.assertNumQueries(num, using=using):
+            response = self.client.get(url, **extra)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
@@ -2,27 +2,48 @@
 # pylint: disable=too-many-lines
 """ Popupcrud views """
 
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+import calendar
 import copy
+import hashlib
+import itertools
+import logging
+import re
+import uuid
 
 from django import forms
 from django.db import transaction
 from django.conf import settings
 from django.conf.urls import include, url
+from django.core.cache import caches
 from django.core.exceptions import (
-    FieldDoesNotExist, ObjectDoesNotExist)
+    FieldDoesNotExist, ObjectDoesNotExist, ValidationError)
 from django.shortcuts import render
 from django.views import generic
-from django.http import JsonResponse
-from django.template import loader
+from django.http import Http404, JsonResponse
+from django.template import Context, loader
+from django.template.response import TemplateResponse
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.contrib import messages
 from django.utils.decorators import classonlymethod
-from django.utils.translation import ugettext_lazy as _, ugettext, override
-from django.utils.http import urlencode
+from django.utils.translation import (
+    ugettext_lazy as _, ugettext, override, get_language)
+from django.db.models import Max, prefetch_related_objects
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers)
+from django.utils.html import strip_tags
+from django.utils.http import http_date, quote_etag, urlencode
+from django.utils.encoding import iri_to_uri
 from django.utils.safestring import mark_safe
+from django.utils.timezone import get_current_timezone_name
+from django.utils.text import slugify
 from django.utils.functional import cached_property
 
+try:
+    from django.urls import get_script_prefix, reverse
+except ImportError:
+    from django.core.urlresolvers import get_script_prefix, reverse
+
 try:
     from django.utils import six
 except ImportError:
@@ -32,7 +53,17 @@ except ImportError:
 
 from pure_pagination import PaginationMixin
 
-from .widgets import RelatedFieldPopupFormWidget
+from . import export, instrumentation, jobs
+from .columns import ColumnPlan
+from .config import ViewSetConfig
+from .filters import build_list_filter
+from .cache import (
+    bump_model_version, model_version, queryset_key, track_model_changes)
+from .pagination import (
+    CountStrategyPaginator, KeysetPage, KeysetPaginator, planner_row_estimate,
+    CURSOR_NEXT, CURSOR_PREVIOUS)
+from .search import SimpleSearchBackend
+from .widgets import TO_FIELD_VAR, RelatedFieldPopupFormWidget
 
 
 POPUPCRUD_DEFAULTS = {
@@ -41,6 +72,14 @@ POPUPCRUD_DEFAULTS = {
     'page_title_context_variable': 'page_title',
 
     'paginate_by': 10,
+
+    'cache': 'default',
+
+    'action_executor': 'popupcrud.jobs.ThreadPoolExecutor',
+
+    'instrumentation': False,
+
+    'instrumentation_sink': None,
 }
 """django-popupcrud global settings are specified as the dict variable
 ``POPUPCRUD`` in settings.py.
@@ -64,6 +103,37 @@ default values:
       This is the same as ListView.paginate_by.
 
       Defaults to 10.
+
+    - ``cache``: Alias of the cache, from the ``CACHES`` setting, used for
+      the values cached by popupcrud, such as list row counts.
+
+      Defaults to ``default``.
+
+    - ``action_executor``: Dotted path to the class that runs the background
+      item actions. ``popupcrud.jobs.ThreadPoolExecutor`` runs them on a pool
+      of threads in the web server process. Derive from
+      ``popupcrud.jobs.BaseExecutor`` to run them on an external task queue.
+
+      Job status is kept in the ``cache``, which should be shared across
+      processes, such as memcached or redis, in multi-process deployments.
+
+      Defaults to ``popupcrud.jobs.ThreadPoolExecutor``.
+
+    - ``instrumentation``: Set to True to record the time and the number of
+      database queries spent by the views in each of their phases, such as
+      counting & fetching the list rows, building the list headers &
+      rows, building the form & formset and rendering the template. The
+      timings are sent as the ``Server-Timing`` response header and with the
+      ``popupcrud.instrumentation.view_timed`` signal.
+
+      Defaults to False.
+
+    - ``instrumentation_sink``: Dotted path to a class, derived from
+      ``popupcrud.instrumentation.BaseSink``, that receives the timings of
+      every view, to send them to a metrics system.
+      ``popupcrud.instrumentation.LoggingSink`` logs them.
+
+      Defaults to None.
 """
 
 # build effective settings by merging any user settings with defaults
@@ -76,15 +146,40 @@ ORDER_TYPE_VAR = 'ot'
 PAGE_VAR = 'p'
 SEARCH_VAR = 'q'
 ERROR_FLAG = 'e'
+FRAGMENT_VAR = '_fragment'
+FORMAT_VAR = '_format'
 
 IGNORED_PARAMS = (
-    ALL_VAR, ORDER_VAR, ORDER_TYPE_VAR, SEARCH_VAR)
+    ALL_VAR, ORDER_VAR, ORDER_TYPE_VAR, PAGE_VAR, SEARCH_VAR, FRAGMENT_VAR,
+    FORMAT_VAR)
+
+logger = logging.getLogger('popupcrud')
+
+# Request header sent by the list view asking for the object's list row in
+# the create/update views' AJAX response
+ROW_HEADER = 'HTTP_X_POPUPCRUD_ROW'
+
+# ViewSet methods that are called for every row, or every page, in the list
+# view
+ROW_METHODS = ('get_obj_name', 'get_detail_url', 'get_edit_url',
+               'get_delete_url', 'get_item_actions', 'get_obj_names',
+               'get_row_urls', 'get_item_actions_for_page')
+
+# The detail, edit & delete URLs of a list row, as returned by
+# PopupCrudViewSet.get_row_urls()
+RowUrls = namedtuple('RowUrls', ('detail', 'edit', 'delete'))
+
+# Object identifier placeholder, reversed into the object URL templates
+URL_PLACEHOLDER = 'popupcrudobjectid'
+
+# The object identifiers matched by the object URL patterns of urls()
+OBJECT_ID_PATTERN = r'\w+'
+OBJECT_ID_RE = re.compile(r'^%s$' % OBJECT_ID_PATTERN)
+
+def get_cache():
+    """ Returns the cache used by popupcrud, set by ``POPUPCRUD['cache']`` """
+    return caches[POPUPCRUD['cache']]
 
-DEFAULT_MODAL_SIZES = {
-    'create_update': 'normal',
-    'delete': 'normal',
-    'detail': 'normal',
-}
 
 class AjaxObjectFormMixin(object):
     """
@@ -103,38 +198,65 @@ class AjaxObjectFormMixin(object):
     """
     def get_context_data(self, **kwargs):
         if 'formset' not in kwargs:
-            formset = self._viewset.get_formset()
+            with self.measure('formset'):
+                formset = self._viewset.get_formset()
             if formset:
                 kwargs['formset'] = formset
         return super(AjaxObjectFormMixin, self).get_context_data(**kwargs)
 
     def get_ajax_response(self):
-        return JsonResponse({
+        data = {
             'name': str(self.object), # object representation
             'pk': self.object.pk          # object id
-        })
+        }
+        # the list view asks for the object's row so that it can update
+        # itself without reloading the page
+        if self.request.META.get(ROW_HEADER):
+            data['row'] = self.render_list_row()
+        return JsonResponse(data)
+
+    def render_list_row(self):
+        """
+        Returns the object's row in the list view, its ``<tr>`` element, as
+        HTML.
+        """
+        # imported here as the template tags library imports this module
+        from .templatetags.popupcrud_list import render_list_row
+        annotations = self._viewset.column_plan.annotations
+        if annotations:
+            # the expression columns of the saved object
+            values = self.model._default_manager.filter(pk=self.object.pk).annotate(
+                **annotations).values(*annotations).first() or {}
+            for name, value in values.items():
+                setattr(self.object, name, value)
+        return six.text_type(
+            render_list_row(self, self.object, Context({'view': self})))
 
     # following two methods are applicable only to Create/Edit views
     def get_form_class(self):
         if getattr(self._viewset, 'form_class', None):
             return self._viewset.form_class
+        if self._viewset.fields is not None:
+            return self._viewset.config.get_form_class()
         return super(AjaxObjectFormMixin, self).get_form_class()
 
     def get_form(self, form_class=None):
-        form = super(AjaxObjectFormMixin, self).get_form(form_class)
-        if not getattr(self._viewset, 'form_class', None):
-            self._init_related_fields(form)
+        with self.measure('form'):
+            form = super(AjaxObjectFormMixin, self).get_form(form_class)
+            if not getattr(self._viewset, 'form_class', None):
+                self._init_related_fields(form)
         return form
 
     def _init_related_fields(self, form):
         related_popups = getattr(self._viewset, 'related_object_popups', {})
-        for fname in related_popups:
+        related_autocomplete = getattr(self._viewset, 'related_object_autocomplete', {})
+        for fname in set(related_popups) | set(related_autocomplete):
             if fname in form.fields:
-                _ = form.fields[fname]
                 if isinstance(form.fields[fname], forms.ModelChoiceField):
-                    form.fields[fname].widget = RelatedFieldPopupFormWidget(
-                        widget=forms.Select(choices=form.fields[fname].choices),
-                        new_url=related_popups[fname])
+                    form.fields[fname].widget = RelatedFieldPopupFormWidget.for_field(
+                        form.fields[fname],
+                        new_url=related_popups.get(fname),
+                        autocomplete_url=related_autocomplete.get(fname))
 
     @transaction.atomic
     def form_valid(self, form): # pylint: disable=missing-docstring
@@ -142,15 +264,17 @@ class AjaxObjectFormMixin(object):
         formset_class = self._viewset.formset_class
         formset = None
         if formset_class:
-            formset = formset_class(
-                self.request.POST,
-                instance=self.object)
+            with self.measure('formset'):
+                formset = formset_class(
+                    self.request.POST,
+                    instance=self.object)
 
         if not formset or formset.is_valid():
             self.object.save()
             form.save_m2m()
             if formset:
                 formset.save()
+            bump_model_version(get_cache(), self.model)
 
             if self.request.is_ajax():
                 return self.get_ajax_response()
@@ -174,12 +298,47 @@ class AttributeThunk(object):
     properties of the parent viewset class instance. This allows us to
     normalize all CRUD view attributes as ViewSet properties and/or methods.
     """
+    # The ViewTimings of the request, if instrumentation is enabled
+    timings = None
+
     def __init__(self, viewset, *args, **kwargs):
         self._viewset = viewset()   # Sat 9/9, changed to store Viewset object
                                     # instead of viewset class
         self._viewset.view = self   # allow viewset methods to access view
         super(AttributeThunk, self).__init__(*args, **kwargs)
 
+    def dispatch(self, request, *args, **kwargs):
+        if not POPUPCRUD['instrumentation']:
+            return super(AttributeThunk, self).dispatch(request, *args, **kwargs) # pylint: disable=E1101
+
+        timings = self.timings = instrumentation.ViewTimings(
+            self._viewset.__class__, self._get_view_code())
+        if getattr(self, 'response_class', None) is TemplateResponse:
+            # so that the template rendering, which happens after the
+            # view returns, is recorded as well
+            self.response_class = instrumentation.InstrumentedTemplateResponse
+        with timings.measure(instrumentation.TOTAL), timings.count_queries():
+            response = super(AttributeThunk, self).dispatch(request, *args, **kwargs) # pylint: disable=E1101
+
+        def finish(response):
+            instrumentation.finish(timings, self, request, response,
+                                   POPUPCRUD['instrumentation_sink'])
+
+        if isinstance(response, instrumentation.InstrumentedTemplateResponse) \
+            and not response.is_rendered:
+            response.timings = timings
+            response.add_post_render_callback(finish)
+        else:
+            finish(response)
+        return response
+
+    def measure(self, name):
+        """
+        Returns the context manager that records the time & queries within
+        as the named phase of the view, if instrumentation is enabled.
+        """
+        return instrumentation.measure(self.timings, name)
+
     @property
     def model(self):
         return self._viewset.model
@@ -217,8 +376,9 @@ class AttributeThunk(object):
         title_cv = POPUPCRUD['page_title_context_variable']
         kwargs[title_cv] = kwargs['pagetitle'] #self._viewset.get_page_title()
         kwargs['viewset'] = self._viewset
+        # a copy, as the legacy crud views append to it
         kwargs[self._viewset.breadcrumbs_context_variable] = \
-                copy.deepcopy(self._viewset.get_breadcrumbs())
+                list(self._viewset.get_breadcrumbs())
         if not self.request.is_ajax() and not isinstance(self, ListView): # pylint: disable=E1101
             # for legacy crud views, add the listview url to the breadcrumb
             kwargs[self._viewset.breadcrumbs_context_variable].append(
@@ -247,28 +407,35 @@ class AttributeThunk(object):
 
     def _get_view_code(self):
         """ Returns the short code for this ViewSet view """
-        codes = {
-            'ListView': 'list',
-            'DetailView': 'detail',
-            'CreateView': 'create',
-            'UpdateView': 'update',
-            'DeleteView': 'delete'
-        }
-        return codes[self.__class__.__name__]
+        return self.view_code
 
     @property
     def media(self):
+        # Optimization: add the form and formset media only if we're either
+        # (CreateView or UpdateView) or in a ListView with popups enabled for
+        # either of 'create' or 'update' operation.
         popups = self._viewset.popups
+        form_view = isinstance(self, (CreateView, UpdateView))
+        with_forms = form_view or popups['create'] or popups['update']
+        if settings.DEBUG:
+            return self._get_media(with_forms)
+
+        # Media is built once per ViewSet class and form & formset class, as
+        # the formset class may be chosen per request
+        key = (form_view, self._viewset.form_class, self._viewset.formset_class) \
+            if with_forms else (form_view,)
+        media = self._viewset.config.media.get(key)
+        if media is None:
+            media = self._viewset.config.media.set(key, self._get_media(with_forms))
+        return media
+
+    def _get_media(self, with_forms):
         # don't load popupcrud.js if all crud views are set to 'legacy'
         popupcrud_media = forms.Media(
             css={'all': ('popupcrud/css/popupcrud.css',)},
             js=('popupcrud/js/popupcrud.js',))
 
-        # Optimization: add the form and formset media only if we're either
-        # (CreateView or UpdateView) or in a ListView with popups enabled for
-        # either of 'create' or 'update' operation.
-        if isinstance(self, (CreateView, UpdateView)) or \
-            popups['create'] or popups['update']:
+        if with_forms:
             # Can't we load media of forms created using modelform_factory()?
             # Need to investigate.
             if self._viewset.form_class:
@@ -284,35 +451,371 @@ class AttributeThunk(object):
         return popupcrud_media
 
 
-class ListView(AttributeThunk, PaginationMixin, PermissionRequiredMixin,
-               generic.ListView):
+class ConditionalGetMixin(object):
+    """
+    Answers GET requests with ``304 Not Modified``, without rendering the
+    response, if the content has not changed since the client fetched it,
+    as per the ETag and Last-Modified validators of the response. Enabled
+    by the ViewSet's ``conditional_get`` attribute.
+
+    The ETag is derived from the request URL, the user, the language and
+    the model's data version, which is bumped whenever the model's objects
+    are written to. If the ViewSet's ``last_modified_field`` is set, the
+    latest value of the field among the view's rows is included as well,
+    and sent as Last-Modified.
+    """
+    def get(self, request, *args, **kwargs):
+        if not self._viewset.conditional_get:
+            return super(ConditionalGetMixin, self).get(request, *args, **kwargs)
+
+        last_modified = self._viewset.get_last_modified(self.get_conditional_queryset())
+        parts = [
+            request.get_full_path(),
+            '1' if request.is_ajax() else '0',
+            six.text_type(request.user.pk or ''),
+            get_language() or '',
+            six.text_type(model_version(get_cache(), self.model)),
+            last_modified.isoformat() if last_modified else '',
+        ]
+        etag = quote_etag(hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest())
+        timestamp = calendar.timegm(last_modified.utctimetuple()) \
+            if last_modified else None
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super(ConditionalGetMixin, self).get(request, *args, **kwargs)
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        # the content is per user and has to be revalidated every time
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_conditional_queryset(self):
+        """
+        Returns the queryset of the rows the response is rendered from, which
+        the Last-Modified validator is computed from. Default implementation
+        returns ``get_queryset()``.
+        """
+        return self.get_queryset()
+
+
+class ListView(AttributeThunk, ConditionalGetMixin, PaginationMixin,
+               PermissionRequiredMixin, generic.ListView):
     """ Model list view """
 
+    view_code = 'list'
+
     def __init__(self, viewset_cls, *args, **kwargs):
         super(ListView, self).__init__(viewset_cls, *args, **kwargs)
         request = kwargs['request']
         self.params = dict(request.GET.items())
+        # Only the list content, the table & the pagination, is rendered for
+        # AJAX requests and when asked for explicitly. This allows the list
+        # to be refreshed in place when it's sorted or paged.
+        fragment = self.params.pop(FRAGMENT_VAR, None)
+        self.fragment = request.method == 'GET' and \
+            (fragment is not None or request.is_ajax())
         self.query = request.GET.get(SEARCH_VAR, '')
         self.lookup_opts = self.model._meta
+        self._queryset = None
+
+    paginator_class = CountStrategyPaginator
 
     def get_paginate_by(self, queryset):
         return self._viewset.get_paginate_by()
 
+    def get_paginator(self, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True, **kwargs):
+        return self.paginator_class(
+            queryset, per_page, count_func=self.count_rows, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            request=self._get_pagination_request())
+
+    def _get_pagination_request(self):
+        """
+        Returns the request that the page links are built from. It's a copy
+        of the request without the fragment parameter in its query string,
+        so that the page links load the full list page.
+        """
+        if FRAGMENT_VAR not in self.request.GET:
+            return self.request
+        request = copy.copy(self.request)
+        request.GET = self.request.GET.copy()
+        del request.GET[FRAGMENT_VAR]
+        return request
+
+    def count_rows(self, queryset):
+        """
+        Returns the number of rows in the list queryset as per the ViewSet's
+        ``count_strategy``. Return value is a 2-tuple of (count, exact).
+        """
+        with self.measure('count'):
+            strategy = self._viewset.count_strategy
+            if strategy == 'estimated':
+                estimate = planner_row_estimate(queryset)
+                if estimate is not None and \
+                    estimate >= self._viewset.count_estimate_threshold:
+                    return estimate, False
+            elif strategy == 'cached':
+                cache = get_cache()
+                key = queryset_key(cache, 'count', queryset)
+                if key:
+                    count = cache.get(key)
+                    if count is None:
+                        count = queryset.count()
+                        cache.set(key, count, self._viewset.count_cache_timeout)
+                    return count, True
+            return queryset.count(), True
+
+    def get_aggregates(self):
+        """
+        Returns the values of the ViewSet's ``list_aggregates`` for the list
+        rows, across all the pages, as a dict of column name to value.
+        """
+        list_aggregates = self._viewset.get_list_aggregates()
+        if not list_aggregates:
+            return {}
+        aggregates = self._viewset.column_plan.get_aggregates(list_aggregates)
+        # aliased, as aggregates can't be named after a model field
+        names = OrderedDict(
+            ('popupcrud_agg_%d' % index, name) for index, name in enumerate(aggregates))
+        expressions = dict(zip(names, aggregates.values()))
+        queryset = self.object_list.order_by()
+
+        with self.measure('aggregates'):
+            key = None
+            signature = self._get_aggregates_signature(names, expressions)
+            if self._viewset.count_strategy == 'cached' and signature:
+                cache = get_cache()
+                key = queryset_key(cache, 'aggregates:%s' % hashlib.md5(
+                    signature.encode('utf-8')).hexdigest(), queryset)
+                values = cache.get(key) if key else None
+                if values is not None:
+                    return values
+            result = queryset.aggregate(**expressions)
+            values = dict((names[alias], value) for alias, value in result.items())
+            if key:
+                cache.set(key, values, self._viewset.count_cache_timeout)
+            return values
+
+    @staticmethod
+    def _get_aggregates_signature(names, expressions):
+        """
+        Returns a string that identifies the aggregates by their columns and
+        the default aliases of their expressions, such as ``age__sum``, or
+        None if an expression has no default alias, in which case the
+        aggregates are not cached.
+        """
+        try:
+            return ','.join(sorted(
+                '%s=%s' % (names[alias], expression.default_alias)
+                for alias, expression in expressions.items()))
+        except (AttributeError, TypeError):
+            return None
+
+    def paginate_queryset(self, queryset, page_size):
+        if self._viewset.pagination == 'keyset':
+            paginator = KeysetPaginator(queryset, page_size)
+            if paginator.supported:
+                return self._paginate_keyset(paginator)
+        # offset pagination, also the fallback for orderings that keyset
+        # pagination cannot handle
+        return super(ListView, self).paginate_queryset(queryset, page_size)
+
+    def _paginate_keyset(self, paginator):
+        page = paginator.page(self.params.get(PAGE_VAR))
+        if page.object_list:
+            if page.has_previous():
+                page.previous_querystring = self.get_query_string({
+                    PAGE_VAR: paginator.encode_cursor(
+                        page.object_list[0], CURSOR_PREVIOUS)})
+            if page.has_next():
+                page.next_querystring = self.get_query_string({
+                    PAGE_VAR: paginator.encode_cursor(
+                        page.object_list[-1], CURSOR_NEXT)})
+        return (paginator, page, page.object_list, page.has_other_pages())
+
     def get_queryset(self):
+        # built once per request, the conditional GET validators and the list
+        # share the queryset
+        if self._queryset is None:
+            self._queryset = self._build_queryset()
+        return self._queryset
+
+    def _build_queryset(self):
         qs = super(ListView, self).get_queryset()
         qs = self._viewset.get_queryset(qs)
 
+        # Apply search results
+        qs = self._apply_search(qs)
+        # the list filter facets are counted off the searched rows
+        self.filter_base_queryset = qs
+
         # Apply any filters
+        for list_filter in self.get_list_filters():
+            qs = list_filter.queryset(qs)
+
+        # expression columns are computed by the database
+        annotations = self._viewset.column_plan.annotations
+        if annotations:
+            qs = qs.annotate(**annotations)
+
+        qs = self._apply_related_lookups(qs)
+        qs = self._apply_projection(qs)
 
         # Set ordering.
         ordering = self._get_ordering(self.request, qs)
         qs = qs.order_by(*ordering)
 
-        # Apply search results
+        return qs
+
+    def get_row_cache_prefix(self):
+        """
+        Returns the prefix of the cache keys of the rendered list rows for
+        this request, or None if rows are not to be cached. The prefix
+        covers everything, besides the row itself, that the rendered row
+        depends on: the ViewSet, the model's data version, the language, the
+        time zone and the user's permissions.
+        """
+        viewset = self._viewset
+        if viewset.row_cache_timeout == 0:
+            return None
+        parts = [
+            '%s.%s' % (viewset.__class__.__module__, viewset.__class__.__name__),
+            six.text_type(model_version(get_cache(), self.model)),
+            get_language() or '',
+            get_current_timezone_name(),
+            six.text_type(viewset.get_row_cache_vary(self.request)),
+        ]
+        return 'popupcrud:row:%s:%s' % (
+            self.model._meta.label_lower,
+            hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest())
+
+    def get_row_cache_key(self, prefix, obj):
+        """
+        Returns the cache key of the object's rendered row. The row version,
+        the value of the ViewSet's ``last_modified_field``, is part of the
+        key if set.
+        """
+        field = self._viewset.last_modified_field
+        if field:
+            version = getattr(obj, field, None)
+            return '%s:%s:%s' % (prefix, obj.pk,
+                                 version.isoformat() if version else '')
+        return '%s:%s' % (prefix, obj.pk)
+
+    def get_list_filters(self):
+        """
+        Returns the filters for the ViewSet's ``list_filter``, initialized
+        with the filter parameters in the request's query string. Parameters
+        that do not belong to any of the declared filters are ignored.
+        """
+        if not hasattr(self, '_list_filters'):
+            params = dict((k, v) for k, v in self.params.items()
+                          if k not in IGNORED_PARAMS)
+            self._list_filters = [  # pylint: disable=W0201
+                build_list_filter(self.model, spec, params)
+                for spec in self._viewset.get_list_filter()]
+        return self._list_filters
+
+    def get_list_filter_options(self):
+        """
+        Returns a list of (filter, options) for the list filters where
+        options are the filter's options along with their facet counts. The
+        counts for each filter take the search and the other filters into
+        account, and are computed with one aggregated query per filter.
+
+        Options are cached, per list query and language, for
+        ``list_filter_cache_timeout`` seconds.
+        """
+        filters = self.get_list_filters()
+        timeout = self._viewset.list_filter_cache_timeout
+        cache = get_cache() if timeout != 0 else None
+        result = []
+        for list_filter in filters:
+            qs = self.filter_base_queryset
+            for other in filters:
+                if other is not list_filter:
+                    qs = other.queryset(qs)
+            facet_qs = list_filter.facet_queryset(qs)
+            # options carry labels translated to the request's language
+            key = queryset_key(cache, 'facets:%s' % (get_language() or ''),
+                               facet_qs) if cache else None
+            options = cache.get(key) if key else None
+            if options is None:
+                options = list_filter.get_options(facet_qs)
+                if key:
+                    cache.set(key, options, timeout)
+            result.append((list_filter, options))
+        return result
+
+    def _apply_search(self, qs):
+        """ Filters the list rows by the search string in SEARCH_VAR """
+        if not self.query or not self._viewset.get_search_fields():
+            return qs
+        qs, may_have_duplicates = self._viewset.get_search_results(qs, self.query)
+        return qs.distinct() if may_have_duplicates else qs
+
+    def _apply_related_lookups(self, qs):
+        """
+        Fetches the related objects accessed by list_display columns along
+        with the rows, avoiding one query per row for each of them.
+        """
+        plan = self._viewset.column_plan
+        select_related = self._viewset.get_list_select_related()
+        if select_related is True:
+            qs = qs.select_related()
+        elif select_related is False:
+            if plan.select_related:
+                qs = qs.select_related(*plan.select_related)
+        elif select_related:
+            qs = qs.select_related(*select_related)
+
+        if plan.prefetch_related:
+            qs = qs.prefetch_related(*plan.prefetch_related)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s related lookups:\n%s", self._viewset.__class__.__name__,
+                         plan.related_lookups_report())
+        return qs
 
+    def _apply_projection(self, qs):
+        """
+        Restricts the columns fetched for the list rows as per
+        ``list_only_fields``.
+        """
+        only_fields = self._viewset.list_only_fields
+        if only_fields == 'auto':
+            only_fields, defer_fields = self._viewset.column_plan.get_projection(
+                ROW_METHODS)
+            # the row cache keys are versioned with the last modified field
+            last_modified_field = self._viewset.last_modified_field
+            if last_modified_field:
+                defer_fields = tuple(
+                    f for f in defer_fields if f != last_modified_field)
+            # only() cannot account for explicitly selected relations
+            if only_fields is not None and \
+                self._viewset.get_list_select_related() is False:
+                if not self._viewset.pk_url_kwarg and self._viewset.slug_field:
+                    # the object URLs are formatted with the slug
+                    only_fields += (self._viewset.slug_field,)
+                if last_modified_field:
+                    only_fields += (last_modified_field,)
+                return qs.only(*only_fields)
+            return qs.defer(*defer_fields) if defer_fields else qs
+        elif only_fields:
+            return qs.only(*only_fields)
         return qs
 
     def get_template_names(self):
+        if self.fragment:
+            return ["popupcrud/list_fragment.html"]
+        return list(self._viewset.config.cached(
+            ('templates', self.__class__), self._get_template_names))
+
+    def _get_template_names(self):
         templates = super(ListView, self).get_template_names()
 
         # if the viewset customized listview template, make sure that is
@@ -325,6 +828,12 @@ class ListView(AttributeThunk, PaginationMixin, PermissionRequiredMixin,
         templates.append("popupcrud/list.html")
         return templates
 
+    def render_to_response(self, context, **response_kwargs):
+        response = super(ListView, self).render_to_response(context, **response_kwargs)
+        # full page & fragment responses are served from the same URL
+        patch_vary_headers(response, ('X-Requested-With',))
+        return response
+
     def get_context_data(self, **kwargs):
         kwargs['pagetitle'] = self._viewset.get_page_title('list')
         context = super(ListView, self).get_context_data(**kwargs)
@@ -337,9 +846,11 @@ class ListView(AttributeThunk, PaginationMixin, PermissionRequiredMixin,
         context['edit_item_dialog_title'] = ugettext("Edit {0}").format(
             self.model._meta.verbose_name)
         context['legacy_crud'] = self._viewset.legacy_crud
-        modal_sizes = copy.deepcopy(DEFAULT_MODAL_SIZES)
-        modal_sizes.update(self._viewset.modal_sizes)
-        context['modal_sizes'] = modal_sizes
+        context['modal_sizes'] = self._viewset.config.modal_sizes
+        # fetch the page's rows here, rather than in the template, so that
+        # it's recorded apart from the rendering
+        with self.measure('queryset'):
+            len(context['object_list'])
         return context
 
     def _get_default_ordering(self):
@@ -390,8 +901,7 @@ class ListView(AttributeThunk, PaginationMixin, PermissionRequiredMixin,
             for p in order_params:
                 try:
                     _, pfx, idx = p.rpartition('-')
-                    field_name = self._viewset.list_display[int(idx)]
-                    order_field = self.get_ordering_field(field_name)
+                    order_field = self._viewset.column_plan[int(idx)].order_field
                     if not order_field:
                         continue  # No 'order_field', skip it
                     # reverse order if order_field has already "-" as prefix
@@ -435,9 +945,9 @@ class ListView(AttributeThunk, PaginationMixin, PermissionRequiredMixin,
                     order_type = 'desc'
                 else:
                     order_type = 'asc'
-                for index, attr in enumerate(self._viewset.list_display):
-                    if self.get_ordering_field(attr) == field:
-                        ordering_fields[index] = order_type
+                for column in self._viewset.column_plan:
+                    if column.order_field == field:
+                        ordering_fields[column.index] = order_type
                         break
         else:
             for p in self.params[ORDER_VAR].split('.'):
@@ -468,13 +978,26 @@ class ListView(AttributeThunk, PaginationMixin, PermissionRequiredMixin,
         return '?%s' % urlencode(sorted(p.items()))
 
     def post(self, request, *args, **kwargs):
+        if request.POST.get('bulk_action', None) is not None:
+            return self.post_bulk_action(request)
+
         action = request.POST.get('action', None)
         pk = request.POST.get('item', None)
         try:
             if action and pk:
                 obj = self.model.objects.get(pk=pk)
+                if self._viewset.is_background_action(int(action), obj):
+                    job_id = self._viewset.submit_action(
+                        self.request, int(action), obj)
+                    return JsonResponse({
+                        'result': True,
+                        'message': ugettext("Action started"),
+                        'job': job_id,
+                        'status_url': self._viewset.get_job_status_url(job_id),
+                    })
                 result = self._viewset.invoke_action(
                     self.request, int(action), obj)
+                bump_model_version(get_cache(), self.model)
                 return JsonResponse({
                     'result': result[0],
                     'message': result[1]
@@ -488,6 +1011,34 @@ class ListView(AttributeThunk, PaginationMixin, PermissionRequiredMixin,
             'message': "Invalid operation"
         })
 
+    def post_bulk_action(self, request):
+        """
+        Runs a bulk action over the rows selected in the list, posted as
+        ``items``, or over all the rows of the list, as searched and filtered
+        by the query string, if ``select_all`` is set.
+        """
+        try:
+            index = int(request.POST['bulk_action'])
+            rows = self.get_queryset().order_by()
+            if request.POST.get('select_all') != '1':
+                rows = rows.filter(pk__in=request.POST.getlist('items'))
+            # act on the rows through a plain queryset, free of the list's
+            # joins, distinct() & projection, that can be updated or deleted
+            queryset = self.model._default_manager.filter(
+                pk__in=rows.values('pk'))
+            result = self._viewset.invoke_bulk_action(request, index, queryset)
+            return JsonResponse({
+                'result': result[0],
+                'message': result[1]
+            })
+        except (ValueError, IndexError, ValidationError):
+            pass
+
+        return JsonResponse({
+            'result': False,
+            'message': "Invalid operation"
+        })
+
 
 class TemplateNameMixin(object):
     """
@@ -502,6 +1053,13 @@ class TemplateNameMixin(object):
     derive from the site common base template.
     """
     def get_template_names(self):
+        # the same for every request of a kind, built once per ViewSet class
+        obj = getattr(self, 'object', None)
+        key = ('templates', self.__class__, self.request.is_ajax(),
+               obj.__class__ if obj is not None else None)
+        return list(self._viewset.config.cached(key, self._get_template_names))
+
+    def _get_template_names(self):
         templates = super(TemplateNameMixin, self).get_template_names()
 
         # if the viewset customized listview template, make sure that is
@@ -530,6 +1088,8 @@ class TemplateNameMixin(object):
 class CreateView(AttributeThunk, TemplateNameMixin, AjaxObjectFormMixin,
                  PermissionRequiredMixin, generic.CreateView):
 
+    view_code = 'create'
+
     popupcrud_template_name = "form_template"
     form_template = "popupcrud/form.html"
 
@@ -543,8 +1103,17 @@ class CreateView(AttributeThunk, TemplateNameMixin, AjaxObjectFormMixin,
         return super(CreateView, self).get_context_data(**kwargs)
 
 
-class DetailView(AttributeThunk, TemplateNameMixin, PermissionRequiredMixin,
-                 generic.DetailView):
+class DetailView(AttributeThunk, ConditionalGetMixin, TemplateNameMixin,
+                 PermissionRequiredMixin, generic.DetailView):
+
+    view_code = 'detail'
+
+    def get_conditional_queryset(self):
+        queryset = self.get_queryset()
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        if pk is not None:
+            return queryset.filter(pk=pk)
+        return queryset.filter(**{self.get_slug_field(): self.kwargs.get(self.slug_url_kwarg)})
 
     popupcrud_template_name = "detail_template"
     detail_template = "popupcrud/detail.html"
@@ -561,6 +1130,8 @@ class DetailView(AttributeThunk, TemplateNameMixin, PermissionRequiredMixin,
 class UpdateView(AttributeThunk, TemplateNameMixin, AjaxObjectFormMixin,
                  PermissionRequiredMixin, generic.UpdateView):
 
+    view_code = 'update'
+
     popupcrud_template_name = "form_template"
     form_template = "popupcrud/form.html"
 
@@ -573,6 +1144,8 @@ class UpdateView(AttributeThunk, TemplateNameMixin, AjaxObjectFormMixin,
 
 class DeleteView(AttributeThunk, PermissionRequiredMixin, generic.DeleteView):
 
+    view_code = 'delete'
+
     template_name = "popupcrud/confirm_delete.html"
 
     def get_context_data(self, **kwargs):
@@ -599,6 +1172,7 @@ class DeleteView(AttributeThunk, PermissionRequiredMixin, generic.DeleteView):
     def delete(self, request, *args, **kwargs):
         """ Override to return JSON success response for AJAX requests """
         retval = super(DeleteView, self).delete(request, *args, **kwargs)
+        bump_model_version(get_cache(), self.model)
         if self.request.is_ajax():
             return JsonResponse({
                 'result': True,
@@ -613,7 +1187,260 @@ class DeleteView(AttributeThunk, PermissionRequiredMixin, generic.DeleteView):
         return retval
 
 
-class PopupCrudViewSet(object):
+class JobStatusView(AttributeThunk, PermissionRequiredMixin, generic.View):
+    """
+    Returns the status of a background item action as JSON. Requires the
+    list view permissions.
+    """
+
+    view_code = 'list'
+
+    def get(self, request, *args, **kwargs):
+        cache = get_cache()
+        status = jobs.get_job_status(cache, kwargs['job_id'])
+        # jobs are visible only to the user who submitted them
+        if status is None or \
+            jobs.get_job_owner(cache, kwargs['job_id']) != request.user.pk:
+            raise Http404(ugettext("No such job"))
+        return JsonResponse(status)
+
+
+class AutocompleteView(AttributeThunk, PermissionRequiredMixin, generic.View):
+    """
+    Searches the ViewSet's objects for the autocomplete mode of
+    ``RelatedFieldPopupFormWidget``, in the ViewSet's ``search_fields``, and
+    returns a page of them as JSON, in the format expected by select2::
+
+        {"results": [{"id": 1, "text": "John"}, ...],
+         "pagination": {"more": true}}
+
+    The search string and the 1-based page number are passed as the ``term``
+    and ``page`` query string parameters. The ids are the objects' pks, or
+    the values of the unique field named by the ``_to_field`` parameter,
+    which the widget adds for fields with ``to_field_name`` set. Requires the
+    list view permissions.
+    """
+
+    view_code = 'list'
+
+    def get(self, request, *args, **kwargs):
+        viewset = self._viewset
+        to_field = request.GET.get(TO_FIELD_VAR) or 'pk'
+        if not self._to_field_allowed(to_field):
+            raise Http404(ugettext("Unsupported field"))
+        queryset = viewset.get_queryset(self.model._default_manager.all())
+        term = request.GET.get('term', '')
+        if term and viewset.get_search_fields():
+            queryset, may_have_duplicates = viewset.get_search_results(queryset, term)
+            if may_have_duplicates:
+                queryset = queryset.distinct()
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        ordering = list(viewset.ordering or self.model._meta.ordering or ())
+        queryset = queryset.order_by(*(ordering + ['pk']))
+
+        # one more row than the page tells if there are more, without a COUNT
+        size = viewset.autocomplete_page_size
+        objects = list(queryset[(page - 1) * size:page * size + 1])
+        return JsonResponse({
+            'results': [{'id': obj.serializable_value(to_field),
+                         'text': six.text_type(obj)}
+                        for obj in objects[:size]],
+            'pagination': {'more': len(objects) > size},
+        })
+
+    def _to_field_allowed(self, name):
+        """
+        Only the pk and unique fields, which the options can be identified
+        by, are returned as the ids. So other field values are not disclosed.
+        """
+        if name == 'pk':
+            return True
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        return bool(field.concrete and field.unique)
+
+
+class ExportView(ListView):
+    """
+    Exports the list view rows, as searched, filtered and sorted by the query
+    string, in one of the ViewSet's ``export_formats``. The format is
+    specified by the ``_format`` query string parameter and defaults to CSV.
+
+    Rows are fetched in chunks, using ``QuerySet.iterator()``, and streamed
+    to the client as they are written. So memory use does not grow with the
+    number of rows exported. The related objects of the list queryset's
+    ``prefetch_related()`` lookups, which ``iterator()`` ignores, are
+    prefetched for each chunk. Requires the list view permissions.
+    """
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get(FORMAT_VAR, 'csv')
+        if fmt not in self._viewset.get_export_formats() or \
+            not export.format_available(fmt):
+            raise Http404(ugettext("Unsupported export format"))
+
+        columns = list(self._viewset.column_plan)
+        queryset = self.get_queryset()
+        return export.export_response(
+            fmt,
+            slugify(six.text_type(self.model._meta.verbose_name_plural)),
+            [strip_tags(six.text_type(column.text)) for column in columns],
+            [column.css_name for column in columns],
+            self._export_rows(columns, queryset))
+
+    def _export_objects(self, queryset):
+        chunk_size = self._viewset.export_chunk_size
+        lookups = queryset._prefetch_related_lookups  # pylint: disable=W0212
+        if not lookups:
+            return queryset.iterator(chunk_size=chunk_size)
+        return self._prefetched_chunks(
+            queryset.prefetch_related(None).iterator(chunk_size=chunk_size),
+            chunk_size, lookups)
+
+    @staticmethod
+    def _prefetched_chunks(objects, chunk_size, lookups):
+        while True:
+            chunk = list(itertools.islice(objects, chunk_size))
+            if not chunk:
+                return
+            prefetch_related_objects(chunk, *lookups)
+            for obj in chunk:
+                yield obj
+
+    def _export_rows(self, columns, queryset):
+        viewset = self._viewset
+        for obj in self._export_objects(queryset):
+            row = []
+            for column in columns:
+                try:
+                    value = column.value(viewset, obj)
+                except AttributeError:
+                    value = None
+                row.append(export.export_value(value))
+            yield row
+
+
+class JsonListView(ListView):
+    """
+    Returns the list view rows, as searched, filtered, sorted and paginated
+    by the query string, as JSON, for clients that render the list
+    themselves. Requires the list view permissions.
+
+    No template is rendered. If every ``list_display`` column is a plain
+    field, the rows are fetched with ``QuerySet.values()``, without creating
+    the model objects. Otherwise the column values are read off the objects,
+    as in the list view.
+
+    The response is an object with the keys:
+
+        - ``columns``: list of ``{"name", "label", "sortable"}`` objects.
+        - ``rows``: list of objects, with the ``pk`` of the row and the
+          value of each column keyed by the column name.
+        - ``count``: number of rows in the list, which is not exact if
+          ``count_exact`` is false, or null for keyset pagination.
+        - ``next`` & ``previous``: the query strings of the adjacent pages,
+          or null.
+    """
+
+    def get(self, request, *args, **kwargs):
+        columns = list(self._viewset.column_plan)
+        queryset = self.get_queryset()
+        page_size = self.get_paginate_by(queryset)
+        if page_size:
+            paginator, page, rows, _ = self.paginate_queryset(queryset, page_size)
+        else:
+            paginator, page, rows = None, None, self._get_rows(queryset)
+
+        data = OrderedDict()
+        data['columns'] = [{
+            'name': column.css_name,
+            'label': strip_tags(six.text_type(column.text)),
+            'sortable': column.sortable,
+        } for column in columns]
+        with self.measure('rows'):
+            data['rows'] = list(self._serialize_rows(columns, rows))
+        data['count'], data['count_exact'] = len(data['rows']), True
+        data['next'] = data['previous'] = None
+        if isinstance(page, KeysetPage):
+            data['count'], data['count_exact'] = None, False
+            data['next'] = page.next_querystring or None
+            data['previous'] = page.previous_querystring or None
+        elif page is not None:
+            data['count'] = paginator.count
+            data['count_exact'] = paginator.count_is_exact
+            # offset pages are numbered by page_kwarg, PAGE_VAR is the
+            # keyset pagination cursor
+            if page.has_next():
+                data['next'] = self.get_query_string(
+                    {self.page_kwarg: page.next_page_number()})
+            if page.has_previous():
+                data['previous'] = self.get_query_string(
+                    {self.page_kwarg: page.previous_page_number()})
+        return JsonResponse(data)
+
+    def paginate_queryset(self, queryset, page_size):
+        return super(JsonListView, self).paginate_queryset(
+            self._get_rows(queryset), page_size)
+
+    def _get_rows(self, queryset):
+        """
+        Returns the ``values()`` queryset of the columns, along with the
+        primary key and the keyset pagination keys, if every column is a
+        plain field. Returns the queryset as is otherwise.
+        """
+        fields = self._viewset.column_plan.values_fields
+        if fields is None:
+            return queryset
+        fields = ['pk'] + list(fields)
+        if self._viewset.pagination == 'keyset':
+            paginator = KeysetPaginator(queryset, 1)
+            if paginator.supported:
+                fields.extend(f for f in paginator.values_fields() if f not in fields)
+        # values() does not select the related objects or defer fields,
+        # prefetching is not supported
+        return queryset.prefetch_related(None).values(*fields)
+
+    def _serialize_rows(self, columns, rows):
+        viewset = self._viewset
+        for obj in rows:
+            row = OrderedDict()
+            if isinstance(obj, dict):
+                row['pk'] = obj['pk']
+                for column in columns:
+                    value = obj[column.name]
+                    if column.choices is not None and value in column.choices:
+                        value = column.choices[value]
+                    row[column.css_name] = export.export_value(value)
+            else:
+                row['pk'] = obj.pk
+                for column in columns:
+                    try:
+                        value = column.value(viewset, obj)
+                    except AttributeError:
+                        value = None
+                    row[column.css_name] = export.export_value(value)
+            yield row
+
+
+class PopupCrudViewSetMeta(type):
+    """
+    Metaclass of PopupCrudViewSet, which tracks the changes made to the
+    ViewSet's model as soon as the ViewSet class is created. Changes made
+    anywhere, such as in management commands or task workers that never
+    build the ViewSet's views, invalidate the values cached by popupcrud.
+    """
+    def __init__(cls, name, bases, attrs):
+        super(PopupCrudViewSetMeta, cls).__init__(name, bases, attrs)
+        if cls.model is not None:
+            track_model_changes(cls.model, POPUPCRUD['cache'])
+
+
+class PopupCrudViewSet(object, metaclass=PopupCrudViewSetMeta):
     """
     This is the base class from which you derive a class in your project
     for each model that you need to build CRUD views for.
@@ -628,16 +1455,39 @@ class PopupCrudViewSet(object):
     #: attribute.
     new_url = None
 
+    #: URL to the export view. When set, the list view shows a menu to export
+    #: the list, as currently searched, filtered and sorted, in each of the
+    #: ``export_formats``. The export view is registered by ``urls()``, if
+    #: ``'export'`` is included in its ``views`` argument, or can be
+    #: registered explicitly using ``export()``.
+    export_url = None
+
+    #: The formats the list can be exported in. Supported formats are
+    #: ``'csv'``, ``'json'`` & ``'xlsx'``, the last of which requires the
+    #: ``openpyxl`` package.
+    export_formats = ('csv', 'json', 'xlsx')
+
+    #: Number of rows fetched from the database at a time by the export view.
+    export_chunk_size = 2000
+
     #: Lists the fields to be displayed in the list view columns. This attribute
     #: is modelled after ModelAdmin.list_display and supports model methods as
     #: as ViewSet methods much like ModelAdmin. This is a required attribute.
     #:
-    #: So you have four possible values that can be used in list_display:
+    #: So you have six possible values that can be used in list_display:
     #:
     #:  - A field of the model
     #:  - A callable that accepts one parameter for the model instance.
     #:  - A string representing an attribute on ViewSet class.
     #:  - A string representing an attribute on the model
+    #:  - A path to a field of a related model, such as ``author__name``.
+    #:    Such columns are sortable.
+    #:  - An ORM expression, such as ``F('age') * 2``, ``Case()``,
+    #:    ``Subquery()`` or an aggregate like ``Count('book')``, or a 2-tuple
+    #:    of (name, expression) to name the column, such as
+    #:    ``('book_count', Count('book'))``. Expressions are annotated to the
+    #:    list queryset, so that they're computed by the database along with
+    #:    the rows, and are sortable.
     #:
     #: See ModelAdmin.list_display `documentation
     #: <https://docs.djangoproject.com/en/1.11/ref/contrib/admin/#django.contrib.admin.ModelAdmin.list_display>`_
@@ -651,8 +1501,147 @@ class PopupCrudViewSet(object):
     #: the method's ``admin_order_field`` attribute to the relevant database
     #: field that can be used as the sort field. In ``PopupCrudViewSet``, this
     #: attribute is named ``order_Field``.
+    #:
+    #: ``list_display`` is compiled, once per ViewSet class, into a column
+    #: plan where each column is resolved into its accessor, label and order
+    #: field. See ``column_plan``.
     list_display = ()
 
+    #: Controls the ``select_related()`` applied to the list view queryset.
+    #: This is modelled after ``ModelAdmin.list_select_related`` and can be
+    #: one of:
+    #:
+    #:  - ``False``: the default, the related objects are inferred from
+    #:    ``list_display``. Foreign keys and related field paths (such as
+    #:    ``author__name``) in ``list_display`` are selected. So are the
+    #:    relations spanned by the ``order_field`` and the ``requires``
+    #:    attributes of method columns. ``requires`` is a tuple of the field
+    #:    paths that the method reads, for example::
+    #:
+    #:        def author_age(self, book):
+    #:            return book.author.age
+    #:        author_age.requires = ('author__age',)
+    #:
+    #:  - ``True``: ``select_related()`` is called without arguments.
+    #:  - A list or tuple of lookups that are passed to ``select_related()``.
+    #:
+    #: Paths that span a multi-valued relation (many-to-many or reverse foreign
+    #: key) are always prefetched through ``prefetch_related()``.
+    #:
+    #: The inferred lookups and the columns that require them are available
+    #: from ``column_plan.related_lookups_report()`` and are also logged to the
+    #: ``popupcrud`` logger at ``DEBUG`` level.
+    list_select_related = False
+
+    #: Restricts the model columns fetched for the list view rows, which
+    #: helps with models that carry large text or JSON payloads that are not
+    #: displayed in the list. Can be one of:
+    #:
+    #:  - ``None``: the default, all columns are fetched.
+    #:  - ``'auto'``: the columns are derived from ``list_display``, the
+    #:    ``order_field`` and ``requires`` attributes of method columns and
+    #:    the ``requires`` attribute of the ViewSet methods called for each
+    #:    row -- ``get_obj_name()``, ``get_detail_url()``, ``get_edit_url()``,
+    #:    ``get_delete_url()`` & ``get_item_actions()``. If all of these
+    #:    declare what they read, only the needed columns are fetched.
+    #:    Otherwise, large text, binary & JSON fields that are not known to
+    #:    be needed are deferred. For example::
+    #:
+    #:        def get_obj_name(self, obj):
+    #:            return obj.name
+    #:        get_obj_name.requires = ('name',)
+    #:
+    #:  - A list or tuple of field names that are passed to ``only()``.
+    #:
+    #: Note that deferred fields are still loaded, albeit with an extra query
+    #: per object, if they are accessed. So results remain correct even if
+    #: a callable reads an undeclared field.
+    list_only_fields = None
+
+    #: Fields that the list view can be searched on. When set, a search box
+    #: is shown above the list. Like ``ModelAdmin.search_fields``, these are
+    #: field names or paths to related fields (such as ``author__name``),
+    #: optionally with one of the following prefixes:
+    #:
+    #:  - ``^``: matches the start of the field.
+    #:  - ``=``: matches the field exactly.
+    #:  - ``@``: full-text search, see ``search_backend``.
+    #:
+    #: Fields without a prefix match if they contain the search term. All
+    #: matches are case insensitive.
+    search_fields = ()
+
+    #: The class that implements the search, one of the backends in
+    #: ``popupcrud.search`` or a class derived from them:
+    #:
+    #:  - ``SimpleSearchBackend``: the default, works like Django admin's
+    #:    search. Portable, but ``icontains`` cannot use an index.
+    #:  - ``PostgresSearchBackend``: PostgreSQL full-text search using a
+    #:    ``SearchVector``, which can be served from a GIN index.
+    #:  - ``TrigramSearchBackend``: PostgreSQL ``pg_trgm`` similarity search,
+    #:    which can be served from a trigram index.
+    #:
+    #: The PostgreSQL backends fall back to the simple search on other
+    #: databases.
+    search_backend = SimpleSearchBackend
+
+    #: Fields that the list view can be filtered by. Filters are shown as
+    #: dropdowns above the list, each option showing the number of rows that
+    #: it would select. Like ``ModelAdmin.list_filter``, entries are either
+    #: field names, paths to fields of related models (such as
+    #: ``author__country``) or a 2-tuple of (field path, filter class). The
+    #: filter class is otherwise chosen as per the field type:
+    #:
+    #:  - fields with ``choices``: lists all the choices.
+    #:  - ``BooleanField``: Yes/No.
+    #:  - ``ForeignKey`` & ``OneToOneField``: the related objects referenced
+    #:    by the list rows.
+    #:  - ``DateField`` & ``DateTimeField``: by year and then by month.
+    #:  - other fields: the distinct values of the field.
+    #:
+    #: Filter classes are in ``popupcrud.filters``. For best results the
+    #: filter fields should be indexed.
+    list_filter = ()
+
+    #: Number of seconds the list filter options and their counts are cached
+    #: for. Options are cached per list query, that is per search and the
+    #: filter selections. Like the cached row counts, these are invalidated
+    #: when objects are created, updated or deleted through the ViewSet
+    #: views. ``0``, the default, disables caching while ``None`` caches
+    #: them until they are invalidated.
+    list_filter_cache_timeout = 0
+
+    #: Number of seconds the rendered list rows are cached for. ``0``, the
+    #: default, disables caching while ``None`` caches them until they are
+    #: invalidated. The rows of a page are fetched from the cache together,
+    #: with a single ``get_many()``, and only the rows that are not found are
+    #: rendered.
+    #:
+    #: Rows are cached per user permissions, language & time zone and are
+    #: invalidated when objects of the model are saved or deleted. If the
+    #: rows display related objects, or anything else that can change
+    #: without the model's objects being saved, set ``last_modified_field``
+    #: or a short timeout. See ``get_row_cache_vary()`` too.
+    row_cache_timeout = 0
+
+    #: Set this to True to answer the list and detail view GET requests
+    #: with ``304 Not Modified``, skipping the rendering, if nothing has
+    #: changed since the client last fetched them. The views send an ETag,
+    #: derived from the model's data version, which is bumped whenever an
+    #: object is created, updated, deleted or acted upon through the ViewSet
+    #: views, or saved or deleted elsewhere. Changes that do not send the
+    #: model signals, such as ``QuerySet.update()``, and changes to related
+    #: models that are displayed are not detected unless
+    #: ``last_modified_field`` is set.
+    conditional_get = False
+
+    #: Name of a ``DateTimeField`` of the model, such as ``updated_at``,
+    #: that is updated on every change. If set, the latest value of the
+    #: field among the rows of the list, or of the detail view's object, is
+    #: included in the ETag and sent as Last-Modified. Computing it costs an
+    #: aggregate query. Used only if ``conditional_get`` is set.
+    last_modified_field = None
+
     #: A list of names of fields. This is interpreted the same as the Meta.fields
     #: attribute of ModelForm. This is a required attribute.
     fields = ()
@@ -671,6 +1660,62 @@ class PopupCrudViewSet(object):
     #: to None will disable pagination. This is an optional attribute.
     paginate_by = POPUPCRUD['paginate_by'] #10 # turn on pagination by default
 
+    #: The pagination scheme for the list view. One of:
+    #:
+    #:  - ``'offset'``: the default, pages are numbered and fetched using
+    #:    OFFSET/LIMIT. This requires a ``COUNT(*)`` of the rows to determine
+    #:    the number of pages and deeper pages get progressively slower.
+    #:  - ``'keyset'``: pages are fetched by seeking to the values of the
+    #:    ordering fields of the last row of the previous page, which are
+    #:    passed around as an opaque cursor in the ``p`` query string
+    #:    parameter. Every page costs the same as the first and no
+    #:    ``COUNT(*)`` is issued. Only 'previous' and 'next' page links are
+    #:    shown. For best results the ordering fields should be indexed.
+    #:
+    #:    Ordering on relation fields or expressions cannot be used for
+    #:    keyset pagination. Lists ordered this way fall back to offset
+    #:    pagination.
+    pagination = 'offset'
+
+    #: How the rows in the list are counted for offset pagination. One of:
+    #:
+    #:  - ``'exact'``: the default, a ``COUNT(*)`` is issued for every request.
+    #:  - ``'cached'``: the count is cached, for ``count_cache_timeout``
+    #:    seconds, in the cache set by ``POPUPCRUD['cache']``. Counts are
+    #:    cached per list query (that is per search, filter, etc) and are
+    #:    invalidated when objects are created, updated or deleted through
+    #:    the ViewSet views.
+    #:  - ``'estimated'``: for PostgreSQL, the query planner's estimate of the
+    #:    number of rows is used if it's at or above
+    #:    ``count_estimate_threshold``. Smaller lists, and other databases,
+    #:    are counted exactly. The pagination shows approximate counts as
+    #:    "about N".
+    count_strategy = 'exact'
+
+    #: Number of seconds the row counts are cached for, when
+    #: ``count_strategy`` is ``'cached'``. ``None`` caches them until they are
+    #: invalidated.
+    count_cache_timeout = 300
+
+    #: Planner row estimates at or above this value are used instead of the
+    #: exact count, when ``count_strategy`` is ``'estimated'``.
+    count_estimate_threshold = 100000
+
+    #: Aggregates shown in the list footer, under their columns. A dict of
+    #: ``list_display`` column name to either an aggregate function, which is
+    #: applied to the column's field, or an aggregate expression. For example::
+    #:
+    #:     list_aggregates = {'amount': Sum, 'age': Avg}
+    #:
+    #: Aggregates are computed over the searched & filtered rows of all the
+    #: pages, with a single ``aggregate()`` query. They're cached along with
+    #: the row count when ``count_strategy`` is ``'cached'``.
+    #:
+    #: Aggregate functions can only be set for field and expression columns.
+    #: For method columns, give an aggregate expression, such as
+    #: ``{'half_age': Sum('age') / 2}``.
+    list_aggregates = {}
+
     #: List of permission names for the list view. Permission names are of the
     #: same format as what is specified in ``permission_required()`` decorator.
     #: Defaults to no permissions, meaning no permission is required.
@@ -748,6 +1793,21 @@ class PopupCrudViewSet(object):
     #: foreign keys of a model, from a popup is disabled.
     related_object_popups = {}
 
+    #: A table that maps foreign keys to the url of their target model's
+    #: ``PopupCrudViewSet.autocomplete()`` view. The select box for such
+    #: foreign keys is rendered with only the selected option and the rest
+    #: are searched for from the url as the user types. Use this for foreign
+    #: keys to tables with too many rows to list in the select box. The
+    #: target model's ViewSet has to have ``search_fields`` set.
+    #:
+    #: Like ``related_object_popups``, this applies only to the forms built
+    #: from ``fields``. Forms set as ``form_class`` can use
+    #: ``RelatedFieldPopupFormWidget`` with its ``autocomplete_url`` directly.
+    related_object_autocomplete = {}
+
+    #: Number of objects returned by the autocomplete view at a time.
+    autocomplete_page_size = 20
+
     #: Page title for the list view page.
     page_title = ''
 
@@ -849,9 +1909,47 @@ class PopupCrudViewSet(object):
     #:       consists of a boolean success indicator and a message. The message
     #:       is displayed to the user when the action is completed.
     #:
+    #: Long-running action handlers can be marked to run in the background by
+    #: setting their ``background`` attribute::
+    #:
+    #:     def resend_invoices(self, request, item):
+    #:         ...
+    #:     resend_invoices.background = True
+    #:
+    #: Such actions are run by the executor set in
+    #: ``POPUPCRUD['action_executor']`` and the request returns right away.
+    #: The list view then polls the job status view, registered by
+    #: ``urls()`` if the ViewSet has such actions, until the action completes
+    #: and displays its result. Only the user who started the action can
+    #: query its status. Note
+    #: that the handler is run outside the request/response cycle, it should
+    #: only read from the request it's passed, such as ``request.user``.
+    #:
     #: Also see ``get_item_actions()`` documentation below.
     item_actions = []
 
+    #: Bulk actions are actions performed on the rows selected in the list
+    #: view, or on all the rows of the list as searched and filtered. When
+    #: set, the list shows a checkbox for each row and a menu of the bulk
+    #: actions. Like item actions, each is specified as a 3-tuple of its
+    #: title, its icon css and the name of its handler, a ViewSet method
+    #: with the following signature::
+    #:
+    #:     def action_handler(self, request, queryset):
+    #:         count = queryset.update(in_print=False)
+    #:         return (True, "%d books marked as out of print" % count)
+    #:
+    #: ``queryset`` selects the rows to act upon, so that the action can be
+    #: performed using a few set based queries such as ``update()`` or
+    #: ``delete()`` instead of one per object. The handler is run inside a
+    #: transaction. ``bulk_delete`` is a built-in handler that deletes the
+    #: selected rows, if the user has the delete view permissions::
+    #:
+    #:     bulk_actions = [
+    #:         ('Delete', 'glyphicon glyphicon-trash', 'bulk_delete'),
+    #:     ]
+    bulk_actions = []
+
     #: .. _modal_sizes:
     #:
     #: Allows specifying the size of the modal windows used for the CRUD operations.
@@ -926,8 +2024,8 @@ class PopupCrudViewSet(object):
         update_wrapper() calls at the end.
         """
         def view(request, *args, **kwargs):
-            initkwargs['request'] = request
-            view = crud_view_class(cls, **initkwargs)
+            # initkwargs is shared by the requests, pass a copy
+            view = crud_view_class(cls, **dict(initkwargs, request=request))
             if hasattr(view, 'get') and not hasattr(view, 'head'):
                 view.head = view.get
             view.request = request
@@ -937,6 +2035,7 @@ class PopupCrudViewSet(object):
 
         view.view_class = crud_view_class
         view.view_initkwargs = initkwargs
+        view.viewset_class = cls
 
         # take name and docstring from class
         #update_wrapper(view, crud_view_class, updated=())
@@ -984,6 +2083,37 @@ class PopupCrudViewSet(object):
         """
         return cls._generate_view(DeleteView, **initkwargs)
 
+    @classonlymethod
+    def job_status(cls, **initkwargs):
+        """Returns the background action job status view that can be specified
+        as the second argument to url() in urls.py. The url should capture the
+        job id as the ``job_id`` keyword argument. The status of a job is only
+        returned to the user who submitted it.
+        """
+        return cls._generate_view(JobStatusView, **initkwargs)
+
+    @classonlymethod
+    def export(cls, **initkwargs):
+        """Returns the export view that can be specified as the second argument
+        to url() in urls.py.
+        """
+        return cls._generate_view(ExportView, **initkwargs)
+
+    @classonlymethod
+    def autocomplete(cls, **initkwargs):
+        """Returns the autocomplete view, that searches the objects for the
+        autocomplete mode of the related object select boxes, that can be
+        specified as the second argument to url() in urls.py.
+        """
+        return cls._generate_view(AutocompleteView, **initkwargs)
+
+    @classonlymethod
+    def json_list(cls, **initkwargs):
+        """Returns the JSON list view that can be specified as the second
+        argument to url() in urls.py.
+        """
+        return cls._generate_view(JsonListView, **initkwargs)
+
     def get_list_url(self):
         return self.list_url
 
@@ -998,6 +2128,19 @@ class PopupCrudViewSet(object):
         """
         return self.new_url
 
+    def get_export_url(self):
+        """ Returns the URL to export the list. Returning None hides the
+        export menu in the list view. Default implementation returns the value
+        of ``ViewSet.export_url``.
+        """
+        return self.export_url
+
+    def get_export_formats(self):
+        """ Returns the formats that the list can be exported in. Default
+        implementation returns the value of ``ViewSet.export_formats``.
+        """
+        return self.export_formats
+
     def get_detail_url(self, obj):
         """ Override this returning the URL where ``PopupCrudViewSet.detail()``
         is placed in the URL namespace such that ViewSet can generate the
@@ -1013,9 +2156,11 @@ class PopupCrudViewSet(object):
         template file to access the object and its properties.
 
         Default implementations returns None, which results in object detail
-        popup being disabled.
+        popup being disabled. To enable it for the ``detail`` view registered
+        by ``urls()``, return ``self.get_object_url('detail', obj)``.
         """
         return None
+    get_detail_url.requires = ()
 
     def get_edit_url(self, obj):
         """ Override this returning the URL where PopupCrudViewSet.update() is
@@ -1023,9 +2168,12 @@ class PopupCrudViewSet(object):
         appropriate href to the item edit hyperlink in list view.
 
         If None is returned, link to edit the specified item won't be
-        shown in the object row.
+        shown in the object row. Default implementation returns the URL of the
+        ``update`` view registered by ``urls()``, if there's one.
         """
-        return "#"
+        url = self.get_object_url('update', obj)
+        return "#" if url is None else url
+    get_edit_url.requires = ()
 
     def get_delete_url(self, obj):
         """ Override this returning the URL where PopupCrudViewSet.delete() is
@@ -1033,9 +2181,59 @@ class PopupCrudViewSet(object):
         appropriate href to the item delete hyperlink in list view.
 
         If None is returned, link to delete the specified item won't be
-        shown in the object row.
+        shown in the object row. Default implementation returns the URL of
+        the ``delete`` view registered by ``urls()``, if there's one.
         """
-        return "#"
+        url = self.get_object_url('delete', obj)
+        return "#" if url is None else url
+    get_delete_url.requires = ()
+
+    def get_object_url(self, op, obj):
+        """
+        Returns the URL of the view of ``op``, one of ``detail``, ``update``
+        or ``delete``, for obj, if the view is registered by this ViewSet's
+        ``urls()`` and the request is answered by one of its views. Returns
+        None otherwise.
+
+        The URL is formatted from a template, the URL reversed once with a
+        placeholder for the object's ``pk`` or slug, rather than reversed for
+        every object. Values that the URL pattern would not match are
+        reversed, so that they raise ``NoReverseMatch`` as before.
+        """
+        name = self._get_url_name(op)
+        if name is None:
+            return None
+        kwarg = self.pk_url_kwarg or self.slug_url_kwarg
+        value = obj.pk if self.pk_url_kwarg else getattr(obj, self.slug_field)
+        if isinstance(value, uuid.UUID):
+            # as the urls() patterns match word characters only
+            value = value.hex
+        value = six.text_type(value)
+        if not OBJECT_ID_RE.match(value):
+            return reverse(name, kwargs={kwarg: value})
+        return iri_to_uri(value).join(self._get_url_template(name, kwarg))
+
+    def _get_url_name(self, op):
+        """
+        Returns the name of the urls() view of op, in the namespace the
+        request is served from, or None if there isn't one.
+        """
+        if op not in self.__class__.__dict__.get('_url_views', ()):
+            return None
+        match = getattr(getattr(self.view, 'request', None), 'resolver_match', None)
+        if match is None or getattr(match.func, 'viewset_class', None) is not self.__class__:
+            return None
+        return '%s:%s' % (match.namespace, op)
+
+    def _get_url_template(self, name, kwarg):
+        def compile_template():
+            # the URL split around the placeholder, a 2-tuple of
+            # (prefix, suffix)
+            return tuple(reverse(name, kwargs={kwarg: URL_PLACEHOLDER}).split(
+                URL_PLACEHOLDER, 1))
+
+        return self.config.cached(
+            ('url_template', name, kwarg, get_script_prefix()), compile_template)
 
     def get_obj_name(self, obj):
         """ Return the name of the object that will be displayed in item
@@ -1049,6 +2247,34 @@ class PopupCrudViewSet(object):
         """
         return six.text_type(obj)
 
+    def get_row_urls(self, objects):
+        """
+        Returns the detail, edit & delete URLs of the rows of a list page, as
+        a dict of object pk to ``RowUrls``, a namedtuple of
+        ``(detail, edit, delete)``. ``objects`` is the list of the page's
+        objects.
+
+        This is called once for every page. Override this, rather than the
+        per object ``get_detail_url()``, ``get_edit_url()`` &
+        ``get_delete_url()``, if working out the URLs needs the database, so
+        that it can be done for the whole page at once. Default
+        implementation calls those methods for each object.
+        """
+        return dict((obj.pk, RowUrls(self.get_detail_url(obj),
+                                     self.get_edit_url(obj),
+                                     self.get_delete_url(obj)))
+                    for obj in objects)
+    get_row_urls.requires = ()
+
+    def get_obj_names(self, objects):
+        """
+        Returns the names of the objects of a list page, as a dict of object
+        pk to name. This is the page at once version of ``get_obj_name()``,
+        which the default implementation calls for each object.
+        """
+        return dict((obj.pk, self.get_obj_name(obj)) for obj in objects)
+    get_obj_names.requires = ()
+
     def get_permission_required(self, op):
         """
         Return the permission required for the CRUD operation specified in op.
@@ -1111,6 +2337,18 @@ class PopupCrudViewSet(object):
         return self.page_title if self.page_title else \
                 self.model._meta.verbose_name_plural
 
+    def get_last_modified(self, queryset):
+        """
+        Returns the time the rows of the given queryset, the rows of the list
+        or the object of the detail view, were last modified, or None if it
+        isn't known. Default implementation returns the latest value of
+        ``last_modified_field`` among the rows.
+        """
+        if not self.last_modified_field:
+            return None
+        return queryset.order_by().aggregate(
+            popupcrud_last_modified=Max(self.last_modified_field))['popupcrud_last_modified']
+
     def get_paginate_by(self):
         #: Returns the number of items to paginate by, or None for no
         #: pagination. By default this simply returns the value of
@@ -1143,6 +2381,9 @@ class PopupCrudViewSet(object):
         :param views: A tuple of strings representing the CRUD views whose URL
             patterns are to be registered. Defaults to ``('create', 'update',
             'delete', 'detail')``, that is all the CRUD operations for the model.
+            Add ``'export'``, ``'json'`` and ``'autocomplete'`` to register
+            the list export view, the JSON list view and the autocomplete view
+            as well.
 
         :rtype:
             A collection of URLs, packaged using ``django.conf.urls.include()``,
@@ -1165,7 +2406,9 @@ class PopupCrudViewSet(object):
                 reverse("library:books:delete", kwargs={'pk': book.pk})
 
         """
-        if not cls._urls:
+        # looked up in the class' own dict, so that a derived ViewSet does
+        # not return the urls of its base
+        if not cls.__dict__.get('_urls'):
             if not namespace:
                 with override('en'): # force URLs to be in English even when
                                      # default language is set to something else
@@ -1174,8 +2417,12 @@ class PopupCrudViewSet(object):
             # start with only list url, the rest are optional based on views arg
             urls = [url(r'$', cls.list(), name='list')]
 
-            obj_url_pattern = r'(?P<%s>\w+)' % (cls.pk_url_kwarg \
-                if cls.pk_url_kwarg else cls.slug_url_kwarg)
+            if cls.has_background_actions():
+                urls.insert(0, url(r'^jobs/(?P<job_id>[0-9a-f]+)/$', cls.job_status(),
+                                   name='job-status'))
+
+            obj_url_pattern = r'(?P<%s>%s)' % (cls.pk_url_kwarg \
+                if cls.pk_url_kwarg else cls.slug_url_kwarg, OBJECT_ID_PATTERN)
 
             if 'detail' in views:
                 urls.insert(0, url(r'^%s/$' % obj_url_pattern, cls.detail(), name='detail'))
@@ -1189,34 +2436,49 @@ class PopupCrudViewSet(object):
             if 'create' in views:
                 urls.insert(0, url(r'^create/$', cls.create(), name='create'))
 
+            if 'export' in views:
+                urls.insert(0, url(r'^export/$', cls.export(), name='export'))
+
+            if 'json' in views:
+                urls.insert(0, url(r'^json/$', cls.json_list(), name='json'))
+
+            if 'autocomplete' in views:
+                urls.insert(0, url(r'^autocomplete/$', cls.autocomplete(),
+                                   name='autocomplete'))
+
             cls._urls = include((urls, namespace), namespace)
+            # the object views whose URLs get_object_url() can format
+            cls._url_views = tuple(views)
 
-        return cls._urls
+        return cls.__dict__['_urls']
 
     @property
-    def popups(self):
+    def column_plan(self):
+        """
+        The compiled ``list_display``, a ``popupcrud.columns.ColumnPlan``
+        instance. This is built once per ViewSet class and reused across
+        requests.
         """
-        Provides a normalized dict of crud view types to use for the viewset
-        depending on client.legacy_crud setting.
+        return ColumnPlan.for_viewset(self.__class__)
 
-        Computes this dict only once per object as an optimization.
+    @property
+    def config(self):
         """
-        if not hasattr(self, '_popups'):
-            popups_enabled = {
-                'detail': True, 'create': True, 'update': True, 'delete': True
-            }
-            if isinstance(self.legacy_crud, dict):
-                _popups = popups_enabled
-                for k, v in self.legacy_crud.items(): # pylint: disable=E1101
-                    _popups[k] = False if v else True
-            else:
-                popups_disabled = popups_enabled.copy()
-                for k, v in popups_disabled.items():
-                    popups_disabled[k] = False
-                _popups = popups_disabled if self.legacy_crud else popups_enabled
-            self._popups = _popups  # pylint: disable=W0201
+        The parts of the ViewSet derived from its class attributes, a
+        ``popupcrud.config.ViewSetConfig`` instance. This is built once per
+        ViewSet class and reused across requests.
+        """
+        return ViewSetConfig.for_viewset(self.__class__)
+
+    @property
+    def popups(self):
+        """
+        Provides a normalized, read-only, dict of crud view types to use for
+        the viewset depending on client.legacy_crud setting.
 
-        return self._popups
+        Computes this dict only once per ViewSet class as an optimization.
+        """
+        return self.config.popups
 
     def get_empty_list_icon(self):
         """
@@ -1253,6 +2515,63 @@ class PopupCrudViewSet(object):
         """
         return qs
 
+    def get_list_aggregates(self):
+        """
+        Returns the value of ``list_aggregates``. Override this to determine
+        the list aggregates dynamically.
+        """
+        return self.list_aggregates
+
+    def get_list_filter(self):
+        """
+        Returns the value of ``list_filter``. Override this to determine the
+        list filters dynamically.
+        """
+        return self.list_filter
+
+    def get_search_fields(self):
+        """
+        Returns the value of ``search_fields``. Override this to determine
+        the fields to search on dynamically.
+        """
+        return self.search_fields
+
+    def get_search_results(self, queryset, search_term):
+        """
+        Filters the list queryset by the search string entered by the user.
+        The default implementation delegates the search to the
+        ``search_backend``.
+
+        :param queryset: Queryset that is used for rendering ListView content.
+        :param search_term: The search string.
+
+        :rtype: A 2-tuple of (queryset, may_have_duplicates). If
+            ``may_have_duplicates`` is True, ``distinct()`` is applied to the
+            queryset.
+        """
+        return self.search_backend().search(
+            queryset, self.get_search_fields(), search_term)
+
+    def get_row_cache_vary(self, request):
+        """
+        Returns a string identifying the variant of the list rows rendered
+        for the request's user, when ``row_cache_timeout`` is set. Rows
+        rendered for users with the same variant are shared. Default
+        implementation returns the user's permissions, which suffices if the
+        URLs and item actions returned for the rows depend only on the
+        permissions. Override this if they depend on the user otherwise.
+        """
+        user = request.user
+        return '%s:%s' % (user.is_superuser if user.is_authenticated else '',
+                          ','.join(sorted(user.get_all_permissions())))
+
+    def get_list_select_related(self):
+        """
+        Returns the value of ``list_select_related``. Override this to
+        determine the related objects to be selected dynamically.
+        """
+        return self.list_select_related
+
     def get_form_kwargs(self):
         """
         For Create and Update views, this method allows passing custom arguments
@@ -1268,6 +2587,7 @@ class PopupCrudViewSet(object):
 
     @cached_property
     def formset_class(self):
+        # computed once per ViewSet instance, that is, once per request
         return self.get_formset_class()
 
     def get_formset_class(self):
@@ -1316,6 +2636,68 @@ class PopupCrudViewSet(object):
         off all actions for an object by returning an empty list(``[]``).
         """
         return self.item_actions
+    get_item_actions.requires = ()
+
+    def get_item_actions_for_page(self, objects):
+        """
+        Returns the custom actions of the rows of a list page, as a dict of
+        object pk to the list of the object's actions. This is the page at
+        once version of ``get_item_actions()``, to be overridden if the
+        actions of an object depend on the database, such as its permissions.
+
+        Default implementation calls ``get_item_actions()`` for each object.
+        """
+        return dict((obj.pk, self.get_item_actions(obj)) for obj in objects)
+    get_item_actions_for_page.requires = ()
+
+    def get_bulk_actions(self):
+        """
+        Returns the bulk actions for the list view, a list of 3-tuples as
+        explained in ``bulk_actions``. Default implementation returns the
+        value of ``bulk_actions`` class variable.
+        """
+        return self.bulk_actions
+
+    def invoke_bulk_action(self, request, index, queryset):
+        """
+        Invokes the bulk action specified by the index, inside a transaction.
+
+        Parameters:
+            request - HttpRequest object
+            index - the index of the action into get_bulk_actions() list
+            queryset - the rows upon which action is to be performed
+
+        Return:
+            Action result as a 2-tuple: (bool, message)
+
+        Raises:
+            Index error if the action index specified is outside the scope
+            of the array returned by get_bulk_actions().
+        """
+        actions = self.get_bulk_actions()
+        if index < 0 or index >= len(actions):
+            raise IndexError
+
+        action_method = getattr(self, actions[index][2])
+        if not callable(action_method):
+            return (False, ugettext("Action failed"))
+
+        with transaction.atomic():
+            result = action_method(request, queryset)
+        bump_model_version(get_cache(), self.model)
+        return result
+
+    def bulk_delete(self, request, queryset):
+        """
+        Built-in bulk action handler that deletes the selected rows. Requires
+        the delete view permissions.
+        """
+        if not request.user.has_perms(self.get_permission_required('delete')):
+            return (False, ugettext("You do not have permission to delete {0}").format(
+                self.model._meta.verbose_name_plural))
+        deleted = queryset.delete()[1].get(self.model._meta.label, 0)
+        return (True, ugettext("{0} {1} deleted").format(
+            deleted, self.model._meta.verbose_name_plural))
 
     def invoke_action(self, request, index, item):
         """
@@ -1333,16 +2715,66 @@ class PopupCrudViewSet(object):
             Index error if the action index specified is outside the scope
             of the array returned by get_item_actions().
         """
+        action_method = self._get_action_method(index, item)
+        if callable(action_method):
+            return action_method(request, item)
+
+        return (False, ugettext("Action failed"))
+
+    def _get_action_method(self, index, item):
         actions = self.get_item_actions(item)
         if index >= len(actions):
             raise IndexError
 
         action = actions[index][2]  # method to invoke
-        action_method = getattr(self, action)
-        if callable(action_method):
-            return action_method(request, item)
+        return getattr(self, action)
 
-        return (False, ugettext("Action failed"))
+    def is_background_action(self, index, item):
+        """
+        Returns True if the custom action specified by the index is to be run
+        in the background, which is the case if its handler's ``background``
+        attribute is set.
+        """
+        return getattr(self._get_action_method(index, item), 'background', False)
+
+    def submit_action(self, request, index, item):
+        """
+        Submits the custom action specified by the index to be run in the
+        background by the executor set in ``POPUPCRUD['action_executor']``.
+
+        Return:
+            The job id, which can be used to query the status of the action.
+        """
+        action_method = self._get_action_method(index, item)
+        model = self.model
+
+        def run_action(request, item):
+            try:
+                return action_method(request, item)
+            finally:
+                # the action may have changed the data, as in invoke_action()
+                bump_model_version(get_cache(), model)
+
+        return jobs.submit_job(POPUPCRUD['action_executor'], get_cache(),
+                               request.user.pk, run_action, request, item)
+
+    @classmethod
+    def has_background_actions(cls):
+        """
+        Returns True if any of the ViewSet's methods is an action handler
+        marked to run in the background.
+        """
+        return any(getattr(getattr(cls, name, None), 'background', False)
+                   for name in dir(cls))
+
+    def get_job_status_url(self, job_id):
+        """
+        Returns the URL of the status view of the background action job.
+        Default implementation returns the URL of the status view registered
+        by ``urls()``, relative to the list url. Override this if the view is
+        registered separately using ``job_status()``.
+        """
+        return '%sjobs/%s/' % (self.get_list_url(), job_id)
 
     def get_context_data(self, kwargs):
         """
@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
 """ popupcrud widgets """
 
+from django import forms
 from django.contrib.admin.widgets import RelatedFieldWidgetWrapper
+from django.core.exceptions import ValidationError
+from django.utils.http import urlencode
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext
 from django.utils.text import camel_case_to_spaces
 
+# Query string parameter of the autocomplete URL naming the field whose
+# values identify the options, the to_field_name of the ModelChoiceField
+TO_FIELD_VAR = '_to_field'
+
 
 class RelatedFieldPopupFormWidget(RelatedFieldWidgetWrapper):
     """
@@ -21,6 +28,20 @@ class RelatedFieldPopupFormWidget(RelatedFieldWidgetWrapper):
 
     The JavaScript file is added to the form's media list automatically.
 
+    In autocomplete mode, enabled by passing ``autocomplete_url``, only the
+    selected options are rendered. The rest are searched for, as the user
+    types, from the given URL, which is typically the related model ViewSet's
+    ``autocomplete()`` view. This keeps the form small for related tables
+    with many rows. The search box uses select2, if it's loaded, or a plain
+    text input otherwise. Options of fields with ``to_field_name`` set are
+    searched for by that field, which has to be unique.
+
+    The related field's choices are kept as the lazy ``ModelChoiceIterator``
+    and fetched, with a single query, only when the widget is rendered. Use
+    ``for_field()`` to create the widget for a form field, rather than
+    passing ``forms.Select(choices=field.choices)``, which fetches the
+    choices right away and then again when the widget is rendered.
+
     """
     def __init__(self, widget, new_url, *args, **kwargs):
         """
@@ -28,23 +49,84 @@ class RelatedFieldPopupFormWidget(RelatedFieldWidgetWrapper):
 
         :param widget: The underlying `Select` widget that this widget replaces.
         :param url: The url to load the HTML content to fill the assocaited modal
-            body.
+            body. May be None to leave out the **Create New** hyperlink.
+        :param autocomplete_url: Optional keyword argument, the url to search
+            the options from.
         """
+        self.autocomplete_url = kwargs.pop('autocomplete_url', None)
         _unused = args, kwargs
         self.widget = widget
-        self.new_url = str(new_url)
+        self.new_url = str(new_url) if new_url else None
         self.choices = widget.choices
         self.needs_multipart_form = getattr(widget, "needs_multipart_form", False)
+        if self.autocomplete_url:
+            autocomplete_url = str(self.autocomplete_url)
+            # options are identified by the field's to_field_name, if it's
+            # not the pk, as it is for the fields of foreign keys
+            field = getattr(self.choices, 'field', None)
+            to_field = getattr(field, 'to_field_name', None)
+            if to_field and to_field != field.queryset.model._meta.pk.name:
+                autocomplete_url = '%s%s%s' % (
+                    autocomplete_url, '&' if '?' in autocomplete_url else '?',
+                    urlencode({TO_FIELD_VAR: to_field}))
+            widget.attrs = dict(widget.attrs or {})
+            widget.attrs['data-autocomplete-url'] = autocomplete_url
+            widget.attrs['class'] = ' '.join(
+                c for c in (widget.attrs.get('class'), 'popupcrud-autocomplete') if c)
         self.attrs = getattr(widget, 'attrs', None)
 
+    @classmethod
+    def for_field(cls, field, new_url, widget_class=forms.Select, **kwargs):
+        """
+        Returns the widget for the given ``ModelChoiceField``, wrapping an
+        instance of ``widget_class`` whose choices are fetched only when it's
+        rendered. Rest of the arguments are passed on to the constructor.
+        """
+        widget = widget_class()
+        # choices are assigned, rather than passed to the constructor, so
+        # that they're not fetched right away
+        widget.choices = field.choices
+        return cls(widget=widget, new_url=new_url, **kwargs)
+
+    def selected_choices(self, value):
+        """
+        Returns the choices for the selected values only, along with the
+        empty choice, if there's one. Labels of the selected values are
+        fetched from the related model with one query.
+        """
+        values = value if isinstance(value, (list, tuple)) else [value]
+        values = [v for v in values if v not in (None, '')]
+        choices = []
+        queryset = getattr(self.choices, 'queryset', None)
+        if getattr(self.choices, 'field', None) is not None and \
+            self.choices.field.empty_label is not None:
+            choices.append(('', self.choices.field.empty_label))
+        if values and queryset is not None:
+            field = self.choices.field
+            key = field.to_field_name or 'pk'
+            try:
+                objects = queryset.filter(**{'%s__in' % key: values})
+                choices.extend((field.prepare_value(obj), field.label_from_instance(obj))
+                               for obj in objects)
+            except (ValueError, ValidationError):
+                pass
+        return choices
+
     def render(self, name, value, *args, **kwargs):
         widget = self.widget
-        widget.choices = self.choices
+        if self.autocomplete_url:
+            widget.choices = self.selected_choices(value)
+        else:
+            # fetch the choices once, as the underlying widget may iterate
+            # over them more than once. iter() avoids list() asking the
+            # ModelChoiceIterator for its length, which costs a COUNT query.
+            widget.choices = list(iter(self.choices))
         output = [self.widget.render(name, value, *args, **kwargs)]
-        output.append(u'<a href="javascript:void(0);" class="add-another" id="add_id_{0}" data-url="{1}">'\
-                      .format(name, self.new_url))
-        output.append(u'<small>%s</small></a>' % ugettext('New {0}').\
-                      format(camel_case_to_spaces(name).title()))
+        if self.new_url:
+            output.append(u'<a href="javascript:void(0);" class="add-another" id="add_id_{0}" data-url="{1}">'\
+                          .format(name, self.new_url))
+            output.append(u'<small>%s</small></a>' % ugettext('New {0}').\
+                          format(camel_case_to_spaces(name).title()))
         return mark_safe(u''.join(output))
 
     class Media:
@@ -28,6 +28,9 @@ setup(
         'django-bootstrap3',
         'django-pure-pagination',
     ],
+    extras_require={
+        'xlsx': ['openpyxl'],
+    },
     url='https://github.com/harikvpy/django-popupcrud',
     author='Hari Mahadevan',
     author_email='hari@smallpearl.com',
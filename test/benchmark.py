@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# pylint: skip-file
+"""
+Micro-benchmark of the per-request overhead of the ViewSet views.
+
+Calls the create view, as the create popup would (AJAX GET), the delete
+view and the list view, as HTML and as JSON, of a ViewSet with a formset,
+legacy_crud dict, permissions table & modal sizes, and reports the
+requests per second. The views are
+called directly, bypassing middleware & URL resolution, so that the
+numbers mostly reflect popupcrud's own overhead.
+
+Usage::
+
+    python test/benchmark.py [iterations]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testsettings")
+
+import django
+django.setup()
+
+from django import forms
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment
+
+from popupcrud.views import PopupCrudViewSet
+
+from test.models import Author, Book
+
+
+class BenchmarkViewSet(PopupCrudViewSet):
+    model = Author
+    fields = ('name', 'age')
+    list_display = ('name', 'age')
+    list_url = '/authors/'
+    new_url = '/authors/new/'
+    legacy_crud = {'detail': True}
+    permissions_required = {
+        'list': (),
+        'create': (),
+        'update': (),
+    }
+    modal_sizes = {'create_update': 'large'}
+
+    def get_formset_class(self):
+        return forms.models.inlineformset_factory(
+            Author, Book, fields=('title',), can_delete=True, extra=1)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    author = Author.objects.create(name="John", age=25)
+    for index in range(0, 20):
+        Author.objects.create(name="Author %02d" % index, age=index)
+
+    factory = RequestFactory()
+    create_view = BenchmarkViewSet.create()
+    delete_view = BenchmarkViewSet.delete()
+    list_view = BenchmarkViewSet.list()
+    json_view = BenchmarkViewSet.json_list()
+
+    def create():
+        request = factory.get('/authors/new/', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        request.user = AnonymousUser()
+        response = create_view(request)
+        response.render()
+
+    def delete():
+        request = factory.get('/authors/%d/delete/' % author.pk)
+        request.user = AnonymousUser()
+        response = delete_view(request, pk=author.pk)
+        response.render()
+
+    def list_html():
+        request = factory.get('/authors/?o=1', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        request.user = AnonymousUser()
+        response = list_view(request)
+        response.render()
+
+    def list_json():
+        request = factory.get('/authors/json/?o=1')
+        request.user = AnonymousUser()
+        json_view(request)
+
+    for name, func in (('create (AJAX GET)', create), ('delete (GET)', delete),
+                       ('list (AJAX GET)', list_html), ('list (JSON)', list_json)):
+        func()  # warm up
+        elapsed = min(timeit.repeat(func, number=iterations, repeat=3))
+        print("%-20s %8.0f requests/sec" % (name, iterations / elapsed))
+
+
+if __name__ == '__main__':
+    main()
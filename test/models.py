@@ -10,6 +10,7 @@ from django.db import models
 class Author(models.Model):
     name = models.CharField("Name", max_length=128)
     age = models.SmallIntegerField("Age", null=True, blank=True)
+    bio = models.TextField("Bio", blank=True)
 
     class Meta:
         ordering = ('name',)
@@ -28,7 +29,12 @@ class Author(models.Model):
 class Book(models.Model):
     title = models.CharField("Title", max_length=128)
     author = models.ForeignKey(Author, on_delete=models.CASCADE)
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
+    genre = models.CharField("Genre", max_length=16, blank=True, choices=(
+        ('fiction', 'Fiction'), ('poetry', 'Poetry'), ('travel', 'Travel')))
+    published = models.DateField("Published", null=True, blank=True)
+    in_print = models.BooleanField("In Print", default=True)
+    updated = models.DateTimeField("Updated", auto_now=True)
 
     class Meta:
         ordering = ('title',)
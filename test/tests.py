@@ -2,21 +2,39 @@
 # pylint: skip-file
 import re
 import json
+import datetime
+import time
 
+from django import forms
+from django.contrib.auth.models import User
 from django.test import TestCase
 from django.http import JsonResponse
 try:
-    from django.urls import reverse
+    from django.urls import NoReverseMatch, reverse
 except expression as identifier:
-    from django.core.urlresolvers import reverse
+    from django.core.urlresolvers import NoReverseMatch, reverse
 
 import six
 
+from popupcrud import instrumentation
+from popupcrud.cache import model_version
+from popupcrud.columns import ColumnPlan, ListColumn
+from popupcrud.testing import PopupCrudTestMixin
+from popupcrud.views import POPUPCRUD, ListView, PopupCrudViewSet, get_cache
+from popupcrud.widgets import RelatedFieldPopupFormWidget
+
 from .models import Author, Book
 from .views import AuthorCrudViewset, BookCrudViewset, BookUUIDCrudViewSet
 
 RE_CREATE_EDIT_FORM = r"\n<form class=\'form-horizontal\' id=\'create-edit-form\' action=\'{0}\' method=\'post\' accept-charset=\'utf-8\'>.*</form>"
 
+class RecordingSink(instrumentation.BaseSink):
+    records = []
+
+    def record(self, timings, request, response):
+        self.records.append(timings)
+
+
 MODAL_PATTERNS = [
     r'<div class="modal fade".*id="create-edit-modal"',
     r'<div class="modal fade".*id="delete-modal"',
@@ -24,7 +42,7 @@ MODAL_PATTERNS = [
     r'<div class="modal fade".*id="add-related-modal"',
 ]
 
-class PopupCrudViewSetTests(TestCase):
+class PopupCrudViewSetTests(PopupCrudTestMixin, TestCase):
 
     def test_settings(self):
         from popupcrud.views import POPUPCRUD
@@ -244,6 +262,7 @@ class PopupCrudViewSetTests(TestCase):
         # modal id=add_related_modal pattern should exist in response
         self.assertIsNotNone(
             re.search(MODAL_PATTERNS[3], response.content.decode('utf-8')))
+        AuthorCrudViewset.legacy_crud = prev_value
 
     def test_viewset_urls(self):
         # default arguments generates all views
@@ -321,3 +340,1163 @@ class PopupCrudViewSetTests(TestCase):
         result = json.loads(response.content.decode('utf-8'))
         self.assertEquals(result, {'result': True,
                                    'message': "Down vote successful"})
+
+    def test_column_plan(self):
+        # plan is built once per viewset class and reused
+        plan = AuthorCrudViewset().column_plan
+        self.assertIs(plan, AuthorCrudViewset().column_plan)
+        self.assertEqual(
+            [column.kind for column in plan],
+            [ListColumn.FIELD, ListColumn.FIELD, ListColumn.VIEWSET,
+             ListColumn.MODEL])
+        self.assertEqual(
+            [column.order_field for column in plan],
+            ['name', 'age', 'age', None])
+        self.assertEqual(plan[2].text, "Half Age")
+
+        john = Author.objects.create(name="John", age=26)
+        values = [column.value(AuthorCrudViewset(), john) for column in plan]
+        self.assertEqual(values, ["John", 26, 13, 52])
+
+    def test_column_plan_related_path(self):
+        class BookAuthorViewset(PopupCrudViewSet):
+            model = Book
+            list_display = ('title', 'author__name')
+
+        john = Author.objects.create(name="John", age=26)
+        book = Book.objects.create(title='Title', author=john)
+        plan = ColumnPlan.for_viewset(BookAuthorViewset)
+        column = plan[1]
+        self.assertEqual(column.kind, ListColumn.RELATED)
+        self.assertEqual(column.text, "Name")
+        self.assertEqual(column.order_field, 'author__name')
+        self.assertEqual(column.value(BookAuthorViewset(), book), "John")
+
+        # plan is rebuilt when list_display is reassigned
+        BookAuthorViewset.list_display = ('title',)
+        self.assertEqual(len(ColumnPlan.for_viewset(BookAuthorViewset)), 1)
+
+    def test_list_select_related(self):
+        # author column is fetched along with the books, not once per row
+        for index in range(0, 5):
+            author = Author.objects.create(name="Author %d" % index, age=30)
+            Book.objects.create(title='Title %d' % index, author=author)
+        with self.assertNumQueries(2):  # COUNT(*) & the page rows
+            response = self.client.get(reverse("books:list"))
+        self.assertContains(response, "<td>Author 4</td>")
+
+        plan = BookCrudViewset().column_plan
+        self.assertEqual(list(plan.select_related), ['author'])
+        self.assertEqual(plan.related_lookups_report(),
+                         "select_related('author'): author")
+
+    def test_list_select_related_requires(self):
+        class BookViewset(PopupCrudViewSet):
+            model = Book
+            list_display = ('title', 'author_age', 'author__name')
+
+            def author_age(self, book):
+                return book.author.age
+            author_age.requires = ('author__age',)
+
+        class AuthorViewset(PopupCrudViewSet):
+            model = Author
+            list_display = ('name', 'titles')
+
+            def titles(self, author):
+                return ', '.join(b.title for b in author.book_set.all())
+            titles.requires = ('book__title',)
+
+        plan = ColumnPlan.for_viewset(BookViewset)
+        self.assertEqual(dict(plan.select_related),
+                         {'author': ['author_age', 'author__name']})
+        self.assertFalse(plan.prefetch_related)
+        plan = ColumnPlan.for_viewset(AuthorViewset)
+        self.assertFalse(plan.select_related)
+        self.assertEqual(list(plan.prefetch_related), ['book_set'])
+
+    def test_list_only_fields(self):
+        Author.objects.create(name="John", age=26, bio="A long biography")
+        prev_value = AuthorCrudViewset.list_only_fields
+        AuthorCrudViewset.list_only_fields = 'auto'
+        # methods half_age, double_age & get_obj_name don't declare what they
+        # read, so only the large fields are deferred.
+        response = self.client.get(reverse("authors"))
+        obj = response.context['object_list'][0]
+        self.assertEqual(obj.get_deferred_fields(), {'bio'})
+        self.assertContains(response, "<td>13</td>")
+        AuthorCrudViewset.list_only_fields = prev_value
+
+    def test_list_only_fields_declared(self):
+        class BookViewset(PopupCrudViewSet):
+            model = Book
+            list_display = ('title', 'author_age')
+            list_only_fields = 'auto'
+
+            def author_age(self, book):
+                return book.author.age
+            author_age.requires = ('author__age',)
+
+            def get_obj_name(self, obj):
+                return obj.title
+            get_obj_name.requires = ('title',)
+
+        from popupcrud.views import ROW_METHODS
+        only, defer = ColumnPlan.for_viewset(BookViewset).get_projection(
+            ROW_METHODS)
+        self.assertEqual(only, ('author', 'author__age', 'title'))
+        self.assertEqual(defer, ())
+        # the row cache keys read the last modified field of each row
+        BookViewset.last_modified_field = 'updated'
+        from django.test import RequestFactory
+        view = ListView(BookViewset, request=RequestFactory().get('/'))
+        qs = view._apply_projection(Book.objects.all())
+        self.assertEqual(qs.query.deferred_loading,
+                         ({'author', 'author__age', 'title', 'updated'}, False))
+        # BookCrudViewset's URL getters don't declare what they read
+        only, defer = ColumnPlan.for_viewset(BookCrudViewset).get_projection(
+            ROW_METHODS)
+        self.assertIsNone(only)
+
+    def test_keyset_pagination(self):
+        for index in range(0, 25):
+            Author.objects.create(name="John %d" % (index % 4), age=index)
+        expected = list(Author.objects.order_by('name', '-pk'))
+        prev_value = AuthorCrudViewset.pagination
+        AuthorCrudViewset.pagination = 'keyset'
+
+        pages = []
+        url = reverse("authors")
+        querystring = ''
+        with self.assertNumQueries(3):  # no COUNT(*), one query per page
+            while True:
+                response = self.client.get(url + querystring)
+                po = response.context['page_obj']
+                self.assertTrue(po.is_keyset)
+                pages.append(list(response.context['object_list']))
+                if not po.has_next():
+                    break
+                querystring = po.next_querystring
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), expected)
+        self.assertContains(response, 'href="%s"' % po.previous_querystring)
+
+        # and back to the previous page
+        response = self.client.get(url + po.previous_querystring)
+        po = response.context['page_obj']
+        self.assertEqual(list(response.context['object_list']), pages[1])
+        self.assertTrue(po.has_previous())
+        self.assertTrue(po.has_next())
+
+        # invalid cursor returns the first page
+        response = self.client.get(url + '?p=garbage')
+        self.assertEqual(list(response.context['object_list']), pages[0])
+
+        # descending order on a method column's order_field
+        objects = []
+        querystring = '?o=-2'
+        while querystring:
+            response = self.client.get(url + querystring)
+            objects.extend(response.context['object_list'])
+            querystring = response.context['page_obj'].next_querystring
+        self.assertEqual(objects, list(Author.objects.order_by('-age', '-pk')))
+        AuthorCrudViewset.pagination = prev_value
+
+    def test_keyset_pagination_fallback(self):
+        # ordering on a relation field is paginated using offsets
+        john = Author.objects.create(name="John", age=25)
+        for index in range(0, 15):
+            Book.objects.create(title='Title %d' % index, author=john)
+        prev_value = BookCrudViewset.pagination
+        BookCrudViewset.pagination = 'keyset'
+        response = self.client.get(reverse("books:list") + '?o=1')
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 2)
+        response = self.client.get(reverse("books:list"))
+        self.assertTrue(response.context['page_obj'].is_keyset)
+        BookCrudViewset.pagination = prev_value
+
+    def test_count_strategy_cached(self):
+        for index in range(0, 15):
+            Author.objects.create(name="John %d" % index, age=index)
+        prev_value = AuthorCrudViewset.count_strategy
+        AuthorCrudViewset.count_strategy = 'cached'
+        url = reverse("authors")
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, 15)
+        with self.assertNumQueries(1):  # rows only, no COUNT(*)
+            response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, 15)
+
+        # changes that do not send model signals are not seen until the
+        # cache expires
+        Author.objects.bulk_create([Author(name="Peter", age=30)])
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, 15)
+
+        # while changes made through the views invalidate the cached count
+        self.client.post(
+            reverse("new-author"),
+            data={'name': 'Mary', 'age': 25},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, 17)
+        self.assertTrue(response.context['page_obj'].paginator.count_is_exact)
+        AuthorCrudViewset.count_strategy = prev_value
+
+    def test_count_strategy_estimated(self):
+        # planner estimates are only available for PostgreSQL
+        Author.objects.create(name="John", age=25)
+        prev_value = AuthorCrudViewset.count_strategy
+        AuthorCrudViewset.count_strategy = 'estimated'
+        response = self.client.get(reverse("authors"))
+        paginator = response.context['page_obj'].paginator
+        self.assertEqual(paginator.count, 1)
+        self.assertTrue(paginator.count_is_exact)
+        AuthorCrudViewset.count_strategy = prev_value
+
+    def test_search(self):
+        Author.objects.create(name="John Smith", age=25)
+        Author.objects.create(name="Smith Johnson", age=30)
+        Author.objects.create(name="Peter", age=35)
+        url = reverse("authors")
+        # search box is only shown if search_fields is set
+        response = self.client.get(url)
+        self.assertNotContains(response, 'class="form-inline pull-right popupcrud-search"')
+
+        prev_value = AuthorCrudViewset.search_fields
+        AuthorCrudViewset.search_fields = ('name',)
+        response = self.client.get(url + '?q=john&o=1')
+        self.assertEqual([a.name for a in response.context['object_list']],
+                         ['John Smith', 'Smith Johnson'])
+        self.assertContains(response, 'name="q" value="john"')
+        self.assertContains(response, '<input type="hidden" name="o" value="1">')
+        # a new search starts at the first page
+        response = self.client.get(url + '?q=john&o=1&page=1&p=x')
+        self.assertContains(response, '<input type="hidden" name="o" value="1">')
+        self.assertNotContains(response, 'name="page"')
+        self.assertNotContains(response, 'name="p"')
+        # every term has to match
+        response = self.client.get(url + '?q=john+peter')
+        self.assertEqual(len(response.context['object_list']), 0)
+        self.assertContains(response, 'No Authors match your search.')
+        # quoted terms
+        response = self.client.get(url + '?q="smith j"')
+        self.assertEqual([a.name for a in response.context['object_list']],
+                         ['Smith Johnson'])
+
+        AuthorCrudViewset.search_fields = ('^name',)
+        response = self.client.get(url + '?q=smith')
+        self.assertEqual([a.name for a in response.context['object_list']],
+                         ['Smith Johnson'])
+        AuthorCrudViewset.search_fields = ('=name',)
+        response = self.client.get(url + '?q=peter')
+        self.assertEqual([a.name for a in response.context['object_list']],
+                         ['Peter'])
+        AuthorCrudViewset.search_fields = prev_value
+
+    def test_search_related(self):
+        john = Author.objects.create(name="John", age=25)
+        peter = Author.objects.create(name="Peter", age=35)
+        Book.objects.create(title="Django Tips", author=john)
+        Book.objects.create(title="Django Tricks", author=john)
+        Book.objects.create(title="Python", author=peter)
+        prev_value = BookCrudViewset.search_fields
+        BookCrudViewset.search_fields = ('title', 'author__name')
+        response = self.client.get(reverse("books:list") + '?q=john')
+        self.assertEqual(len(response.context['object_list']), 2)
+        BookCrudViewset.search_fields = prev_value
+
+        # multi-valued relations do not duplicate rows
+        prev_value = AuthorCrudViewset.search_fields
+        AuthorCrudViewset.search_fields = ('book__title',)
+        response = self.client.get(reverse("authors") + '?q=django')
+        self.assertEqual(list(response.context['object_list']), [john])
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        AuthorCrudViewset.search_fields = prev_value
+
+    def test_search_backend_fallback(self):
+        from popupcrud.search import PostgresSearchBackend, TrigramSearchBackend
+        Author.objects.create(name="John", age=25)
+        Author.objects.create(name="Peter", age=35)
+        for backend in (PostgresSearchBackend, TrigramSearchBackend):
+            qs, _ = backend().search(Author.objects.all(), ('@name',), 'pete')
+            self.assertEqual([a.name for a in qs], ['Peter'])
+
+    def _create_library(self):
+        john = Author.objects.create(name="John", age=25)
+        peter = Author.objects.create(name="Peter", age=35)
+        Book.objects.create(title="Dune", author=john, genre='fiction',
+                            published=datetime.date(2019, 3, 1))
+        Book.objects.create(title="Emma", author=john, genre='fiction',
+                            published=datetime.date(2019, 7, 1), in_print=False)
+        Book.objects.create(title="Odes", author=peter, genre='poetry',
+                            published=datetime.date(2020, 3, 1))
+        Book.objects.create(title="Notes", author=peter)
+        return john, peter
+
+    def _filter_options(self, response, title):
+        for list_filter, options in response.context['view'].get_list_filter_options():
+            if list_filter.title == title:
+                return [(o['label'], o['count']) for o in options]
+
+    def test_list_filter(self):
+        john, peter = self._create_library()
+        prev_value = BookCrudViewset.list_filter
+        BookCrudViewset.list_filter = ('genre', 'author', 'published', 'in_print')
+        url = reverse("books:list")
+        response = self.client.get(url)
+        self.assertEqual(self._filter_options(response, 'Genre'), [
+            ('All', None), ('Fiction', 2), ('Poetry', 1), ('Travel', 0)])
+        self.assertEqual(self._filter_options(response, 'Author'), [
+            ('All', None), ('John', 2), ('Peter', 2)])
+        self.assertEqual(self._filter_options(response, 'Published'), [
+            ('Any date', None), ('2019', 2), ('2020', 1), ('None', 1)])
+        self.assertEqual(self._filter_options(response, 'In Print'), [
+            ('All', None), ('Yes', 3), ('No', 1)])
+        self.assertContains(response, 'href="?genre=poetry"')
+
+        response = self.client.get(url + '?genre=fiction')
+        self.assertEqual([b.title for b in response.context['object_list']],
+                         ['Dune', 'Emma'])
+        # facet counts of the other filters take this filter into account
+        self.assertEqual(self._filter_options(response, 'Author'), [
+            ('All', None), ('John', 2)])
+        self.assertContains(response, 'Genre: Fiction')
+
+        response = self.client.get(url + '?author=%d&in_print=1' % peter.pk)
+        self.assertEqual([b.title for b in response.context['object_list']],
+                         ['Notes', 'Odes'])
+
+        # date hierarchy
+        response = self.client.get(url + '?published__year=2019')
+        self.assertEqual(len(response.context['object_list']), 2)
+        self.assertEqual(self._filter_options(response, 'Published'), [
+            ('Any date', None), ('2019', None), ('March 2019', 1), ('July 2019', 1)])
+        response = self.client.get(url + '?published__year=2019&published__month=7')
+        self.assertEqual([b.title for b in response.context['object_list']], ['Emma'])
+        response = self.client.get(url + '?published__isnull=1')
+        self.assertEqual([b.title for b in response.context['object_list']], ['Notes'])
+
+        # invalid values & undeclared parameters are ignored
+        response = self.client.get(url + '?published__year=abc&title=Dune')
+        self.assertEqual(len(response.context['object_list']), 4)
+
+        # filter links go to the first page of the filtered list
+        prev_paginate_by = BookCrudViewset.paginate_by
+        BookCrudViewset.paginate_by = 2
+        response = self.client.get(url + '?page=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'href="?genre=poetry"')
+        self.assertNotContains(response, 'genre=poetry&amp;page=2')
+        BookCrudViewset.paginate_by = prev_paginate_by
+        BookCrudViewset.list_filter = prev_value
+
+    def test_list_filter_facet_queries(self):
+        self._create_library()
+        prev_value = BookCrudViewset.list_filter, BookCrudViewset.list_filter_cache_timeout
+        BookCrudViewset.list_filter = ('genre', 'published')
+        BookCrudViewset.list_filter_cache_timeout = None
+        url = reverse("books:list")
+        with self.assertNumQueries(4):  # count, rows & one per filter
+            self.client.get(url + '?in_print=1')
+        with self.assertNumQueries(2):  # facets are cached
+            self.client.get(url + '?in_print=1')
+        # and are recomputed once the model data changes
+        book = Book.objects.get(title='Odes')
+        self.client.post(
+            reverse("books:delete", kwargs={'pk': book.pk}),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        response = self.client.get(url)
+        self.assertEqual(self._filter_options(response, 'Genre'), [
+            ('All', None), ('Fiction', 2), ('Poetry', 0), ('Travel', 0)])
+
+        # options are cached per language, as their labels are translated
+        BookCrudViewset.list_filter = ('in_print',)
+        with self.settings(LANGUAGE_CODE='de'):
+            response = self.client.get(url)
+        self.assertContains(response, '>Ja <span class="badge">')
+        response = self.client.get(url)
+        self.assertContains(response, '>Yes <span class="badge">')
+        BookCrudViewset.list_filter, BookCrudViewset.list_filter_cache_timeout = prev_value
+
+    def test_create_update_list_row(self):
+        url = reverse("new-author")
+        response = self.client.post(
+            url,
+            data={'name': 'John', 'age': 26},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            HTTP_X_POPUPCRUD_ROW='1')
+        john = Author.objects.get(name='John')
+        result = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(result['pk'], john.pk)
+        self.assertTrue(result['row'].startswith('<tr data-pk="%d"><td>' % john.pk))
+        self.assertIn('<td>13</td>', result['row'])
+        # same as the row rendered by the list view
+        response = self.client.get(reverse("authors"))
+        self.assertContains(response, result['row'])
+
+        response = self.client.post(
+            reverse("edit-author", kwargs={'pk': john.pk}),
+            data={'name': 'John', 'age': 30},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            HTTP_X_POPUPCRUD_ROW='1')
+        result = json.loads(response.content.decode('utf-8'))
+        self.assertIn('<td>15</td>', result['row'])
+
+    def test_list_fragment(self):
+        for index in range(0, 15):
+            Author.objects.create(name="Author %02d" % index, age=index)
+        url = reverse("authors")
+        response = self.client.get(url + '?o=1&_fragment=1')
+        self.assertTemplateUsed(response, 'popupcrud/list_fragment.html')
+        self.assertTemplateNotUsed(response, 'popupcrud/list.html')
+        self.assertContains(response, '<table class="table table-striped popupcrud-list">')
+        self.assertNotContains(response, 'id="create-edit-modal"')
+        self.assertEqual(response.context['object_list'][0].name, 'Author 00')
+        # fragment parameter is not carried over to the sort & page links
+        self.assertContains(response, 'href="?o=1&amp;page=2"')
+        self.assertNotContains(response, '_fragment')
+        self.assertIn('X-Requested-With', response['Vary'])
+
+        # AJAX requests get the fragment too
+        response = self.client.get(url + '?o=-1', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertTemplateUsed(response, 'popupcrud/list_fragment.html')
+        self.assertEqual(response.context['object_list'][0].name, 'Author 14')
+
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, 'popupcrud/list.html')
+        self.assertContains(response, '<div id="popupcrud-list-content">')
+
+    def _streamed(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_export(self):
+        for index in range(0, 15):
+            Author.objects.create(name="Author %02d" % index, age=index)
+        url = reverse("export-authors")
+        response = self.client.get(url + '?o=-1&q=1&_format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="authors.csv"')
+        # search is ignored as search_fields is not set
+        lines = self._streamed(response).splitlines()
+        self.assertEqual(len(lines), 16)
+        self.assertEqual(lines[0], 'Name,Age,Half Age,Double Age')
+        self.assertEqual(lines[1], 'Author 14,14,7,28')
+
+        prev_value = AuthorCrudViewset.search_fields
+        AuthorCrudViewset.search_fields = ('name',)
+        response = self.client.get(url + '?o=1&q=1&_format=json')
+        rows = json.loads(self._streamed(response))
+        self.assertEqual([row['name'] for row in rows],
+                         ['Author 01', 'Author 10', 'Author 11', 'Author 12',
+                          'Author 13', 'Author 14'])
+        self.assertEqual(rows[0], {'name': 'Author 01', 'age': 1,
+                                   'half_age': 0, 'double_age': 2})
+        AuthorCrudViewset.search_fields = prev_value
+
+        response = self.client.get(url + '?_format=pdf')
+        self.assertEqual(response.status_code, 404)
+
+        # export requires the list view permissions
+        prev_value = AuthorCrudViewset.list_permission_required
+        AuthorCrudViewset.list_permission_required = ('test.view_author',)
+        response = self.client.get(url)
+        self.assertNotEqual(response.status_code, 200)
+        AuthorCrudViewset.list_permission_required = prev_value
+
+    def test_export_prefetch(self):
+        for index in range(0, 5):
+            author = Author.objects.create(name="Author %d" % index, age=index)
+            Book.objects.create(title="Book %d" % index, author=author)
+
+        class AuthorViewset(PopupCrudViewSet):
+            model = Author
+            list_display = ('name', 'titles')
+            export_chunk_size = 2
+
+            def titles(self, author):
+                return ', '.join(b.title for b in author.book_set.all())
+            titles.requires = ('book__title',)
+
+        from django.test import RequestFactory
+        request = RequestFactory().get('/?_format=json')
+        request.user = User.objects.create_superuser("admin", "admin@example.com", "pwd")
+        response = AuthorViewset.export()(request)
+        # the books are prefetched for each chunk of authors, rather than
+        # fetched for each author
+        with self.assertNumQueries(4):
+            rows = json.loads(self._streamed(response))
+        self.assertEqual(rows[-1], {'name': 'Author 4', 'titles': 'Book 4'})
+
+    def test_export_urls(self):
+        john = Author.objects.create(name="John", age=25)
+        Book.objects.create(title="Dune", author=john)
+        url = reverse("books:export")
+        response = self.client.get(url + '?_format=json')
+        self.assertEqual(json.loads(self._streamed(response)),
+                         [{'title': 'Dune', 'author': 'John'}])
+        # export menu is shown only if export_url is set
+        response = self.client.get(reverse("books:list"))
+        self.assertNotContains(response, 'popupcrud-export')
+        prev_value = BookCrudViewset.export_url
+        BookCrudViewset.export_url = url
+        response = self.client.get(reverse("books:list") + '?o=1&p=2&page=1')
+        self.assertContains(response, 'href="%s?_format=csv&amp;o=1"' % url)
+        BookCrudViewset.export_url = prev_value
+
+    def test_json_list(self):
+        john, peter = self._create_library()
+        url = reverse("books:json")
+        # author column is a relation, rows are read off the objects
+        response = self.client.get(url + '?o=0')
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['columns'], [
+            {'name': 'title', 'label': 'Title', 'sortable': True},
+            {'name': 'author', 'label': 'author', 'sortable': True}])
+        self.assertEqual(data['rows'][0],
+                         {'pk': data['rows'][0]['pk'], 'title': 'Dune', 'author': 'John'})
+        self.assertEqual((data['count'], data['next']), (4, None))
+
+        # plain field columns are fetched with values()
+        prev_value = BookCrudViewset.list_display
+        BookCrudViewset.list_display = ('title', 'author__name', 'genre')
+        with self.assertNumQueries(2):
+            response = self.client.get(url + '?o=-0')
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([list(row.values())[1:] for row in data['rows']], [
+            ['Odes', 'Peter', 'Poetry'], ['Notes', 'Peter', ''],
+            ['Emma', 'John', 'Fiction'], ['Dune', 'John', 'Fiction']])
+
+        # with offset pagination
+        prev_pagination = BookCrudViewset.pagination
+        prev_paginate_by = BookCrudViewset.paginate_by
+        BookCrudViewset.paginate_by = 3
+        response = self.client.get(url + '?o=1.0')
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([row['title'] for row in data['rows']], ['Dune', 'Emma', 'Notes'])
+        self.assertEqual((data['count'], data['previous']), (4, None))
+        response = self.client.get(url + data['next'])
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([row['title'] for row in data['rows']], ['Odes'])
+        self.assertIsNone(data['next'])
+        response = self.client.get(url + data['previous'])
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([row['title'] for row in data['rows']], ['Dune', 'Emma', 'Notes'])
+
+        # with keyset pagination
+        BookCrudViewset.pagination = 'keyset'
+        response = self.client.get(url + '?o=1.0')
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([row['title'] for row in data['rows']], ['Dune', 'Emma', 'Notes'])
+        self.assertIsNone(data['count'])
+        response = self.client.get(url + data['next'])
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([row['title'] for row in data['rows']], ['Odes'])
+        self.assertIsNone(data['next'])
+        BookCrudViewset.pagination = prev_pagination
+        BookCrudViewset.paginate_by = prev_paginate_by
+        BookCrudViewset.list_display = prev_value
+
+    def test_conditional_get(self):
+        john, peter = self._create_library()
+        dune = Book.objects.get(title="Dune")
+        url = reverse("books:list")
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('ETag'))
+
+        prev_value = BookCrudViewset.conditional_get
+        BookCrudViewset.conditional_get = True
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        # unchanged list is not rendered
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # etag is per url
+        response = self.client.get(url + '?o=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # actions through the viewset change the etag
+        self.client.post(url, data={'action': 0, 'item': dune.pk})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # changes elsewhere are detected with last_modified_field
+        BookCrudViewset.last_modified_field = 'updated'
+        detail_url = reverse("books:detail", kwargs={'pk': dune.pk})
+        response = self.client.get(detail_url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        dune.updated = dune.updated + datetime.timedelta(seconds=1)
+        Book.objects.filter(pk=dune.pk).update(updated=dune.updated)
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # the list queryset is built once for the validators and the list
+        from popupcrud.views import ListView
+        builds = []
+        build_queryset = ListView._build_queryset
+        def _build_queryset(view):
+            builds.append(view)
+            return build_queryset(view)
+        ListView._build_queryset = _build_queryset
+        try:
+            response = self.client.get(url)
+        finally:
+            ListView._build_queryset = build_queryset
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertEqual(len(builds), 1)
+        BookCrudViewset.last_modified_field = None
+        BookCrudViewset.conditional_get = prev_value
+
+    def test_row_cache(self):
+        for index in range(0, 3):
+            Author.objects.create(name="John %d" % index, age=index)
+        calls = []
+        def half_age(self, author):
+            calls.append(author.pk)
+            return int(author.age/2)
+        prev_value = AuthorCrudViewset.half_age
+        prev_timeout = AuthorCrudViewset.row_cache_timeout
+        AuthorCrudViewset.half_age = half_age
+        AuthorCrudViewset.row_cache_timeout = None
+        url = reverse("authors")
+        response = self.client.get(url)
+        self.assertEqual(len(calls), 3)
+        rows = re.search(r'<tbody>.*</tbody>', response.content.decode('utf-8'), re.DOTALL)
+        # cached rows are not rendered again
+        response = self.client.get(url)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(
+            re.search(r'<tbody>.*</tbody>', response.content.decode('utf-8'), re.DOTALL).group(0),
+            rows.group(0))
+        # and are still iterated over as cells by the template
+        row = response.context['results'][0]
+        self.assertEqual(row[1:3], ['0', '0'])
+
+        # saving an object, even outside the views, invalidates the rows
+        john = Author.objects.get(name="John 1")
+        john.name = "John One"
+        john.save()
+        response = self.client.get(url)
+        self.assertEqual(len(calls), 6)
+        self.assertContains(response, "John One")
+        AuthorCrudViewset.half_age = prev_value
+        AuthorCrudViewset.row_cache_timeout = prev_timeout
+
+    def test_model_changes_tracked(self):
+        from django.db.models.signals import post_delete, post_save
+        from popupcrud.cache import KEY_PREFIX
+        uid = '%s:track:%s' % (KEY_PREFIX, POPUPCRUD['cache'])
+        post_save.disconnect(sender=Author, dispatch_uid=uid)
+        post_delete.disconnect(sender=Author, dispatch_uid=uid)
+        john = Author.objects.create(name="John", age=25)
+        version = model_version(get_cache(), Author)
+        john.save()
+        self.assertEqual(model_version(get_cache(), Author), version)
+        # tracked once the ViewSet class is created, without any of its views
+        class AuthorViewset(PopupCrudViewSet):    # pylint: disable=W0612
+            model = Author
+        john.save()
+        self.assertNotEqual(model_version(get_cache(), Author), version)
+
+    def test_page_batch_hooks(self):
+        from popupcrud.views import RowUrls
+        john, peter = self._create_library()
+        calls = []
+        def get_row_urls(self, objects):
+            calls.append(('urls', len(objects)))
+            return dict((obj.pk, RowUrls('/books/%d/' % obj.pk, '/books/%d/edit/' % obj.pk, None))
+                        for obj in objects)
+        def get_item_actions_for_page(self, objects):
+            calls.append(('actions', len(objects)))
+            return dict((obj.pk, self.item_actions if obj.author_id == john.pk else [])
+                        for obj in objects)
+        BookCrudViewset.get_row_urls = get_row_urls
+        BookCrudViewset.get_item_actions_for_page = get_item_actions_for_page
+        try:
+            response = self.client.get(reverse("books:list"))
+        finally:
+            del BookCrudViewset.get_row_urls
+            del BookCrudViewset.get_item_actions_for_page
+        # called once for the page
+        self.assertEqual(sorted(calls), [('actions', 4), ('urls', 4)])
+        dune = Book.objects.get(title="Dune")
+        odes = Book.objects.get(title="Odes")
+        self.assertContains(response, 'href="/books/%d/"' % dune.pk)
+        self.assertContains(response, 'href="/books/%d/edit/"' % dune.pk)
+        self.assertNotContains(response, 'name="delete_object"')
+        self.assertContains(response, "data-obj='%d'" % dune.pk, count=2)
+        self.assertNotContains(response, "data-obj='%d'" % odes.pk)
+
+    def test_object_url_templates(self):
+        from popupcrud import views
+        john, peter = self._create_library()
+        getters = dict((name, BookCrudViewset.__dict__[name]) for name in (
+            'get_detail_url', 'get_edit_url', 'get_delete_url'))
+        reversed_names = []
+        def reverse_(name, *args, **kwargs):
+            reversed_names.append(name)
+            return reverse(name, *args, **kwargs)
+        views.reverse = reverse_
+        for name in getters:
+            delattr(BookCrudViewset, name)
+        try:
+            # detail links are opt-in
+            response = self.client.get(reverse("books:list"))
+            self.assertEqual(sorted(reversed_names), ['books:delete', 'books:update'])
+            self.assertNotContains(response, 'name="object_detail"')
+
+            BookCrudViewset.get_detail_url = \
+                lambda self, obj: self.get_object_url('detail', obj)
+            response = self.client.get(reverse("books:list"))
+            # reversed once per view, rather than for every row
+            self.assertEqual(sorted(reversed_names), ['books:delete', 'books:detail', 'books:update'])
+            for book in Book.objects.all():
+                for name in ('detail', 'update', 'delete'):
+                    self.assertContains(response, 'href="%s"' % reverse(
+                        "books:%s" % name, kwargs={'pk': book.pk}))
+            self.client.get(reverse("books:list"))
+            self.assertEqual(len(reversed_names), 3)
+            # values that the URL pattern does not match are not formatted
+            viewset = response.context['view']._viewset
+            with self.assertRaises(NoReverseMatch):
+                viewset.get_object_url('update', Book(pk='not-a-word'))
+            # outside of the ViewSet's views
+            book = Book.objects.first()
+            self.assertIsNone(BookCrudViewset().get_object_url('update', book))
+            self.assertEqual(BookCrudViewset().get_edit_url(book), '#')
+        finally:
+            views.reverse = reverse
+            for name, getter in getters.items():
+                setattr(BookCrudViewset, name, getter)
+
+    def test_list_headers_cached(self):
+        from popupcrud.cache import LRUCache
+        from popupcrud.config import HEADER_CACHE_SIZE, ViewSetConfig
+        from popupcrud.templatetags import popupcrud_list
+        self._create_library()
+        calls = []
+        build_headers = popupcrud_list.list_display_headers
+        def list_display_headers(view, queryset):
+            calls.append(dict(view.params))
+            return build_headers(view, queryset)
+        popupcrud_list.list_display_headers = list_display_headers
+        config = ViewSetConfig.for_viewset(BookCrudViewset)
+        config.headers = LRUCache(2)
+        try:
+            url = reverse("books:list")
+            response = self.client.get(url)
+            self.client.get(url)
+            self.assertEqual(calls, [{}])
+            # each ordering has its own headers
+            sorted_response = self.client.get(url + '?o=-0')
+            self.assertEqual(len(calls), 2)
+            self.assertContains(sorted_response, 'sorted descending')
+            self.assertNotContains(response, 'sorted descending')
+            self.client.get(url + '?o=-0')
+            self.assertEqual(len(calls), 2)
+            # the rest of the query string does not make new headers, but is
+            # carried by their sort links
+            response = self.client.get(url + '?o=-0&genre=fiction')
+            self.assertEqual(len(calls), 2)
+            self.assertContains(response, 'href="?genre=fiction&amp;o=0"')
+            # sort links are the URLs get_query_string() returns for them
+            view = response.context['view']
+            view.params = {'genre': 'fiction', 'o': '-0', 'q': 'a b', 'author': '1'}
+            sort_url = popupcrud_list._sort_url_builder(view)
+            for order in ('0', '-0.1', ''):
+                self.assertEqual(sort_url(order), view.get_query_string({'o': order}))
+            # least recently used headers are evicted
+            self.client.get(url + '?o=0')
+            self.assertEqual(len(calls), 3)
+            self.client.get(url)
+            self.assertEqual(len(calls), 4)
+            self.assertEqual(len(config.headers), 2)
+        finally:
+            popupcrud_list.list_display_headers = build_headers
+            config.headers = LRUCache(HEADER_CACHE_SIZE)
+
+    def test_list_action_column(self):
+        self._create_library()
+        getters = (AuthorCrudViewset.get_edit_url, AuthorCrudViewset.get_delete_url)
+        try:
+            response = self.client.get(reverse("authors"))
+            self.assertContains(response, 'col-action')
+            # no item actions for the objects of the page, no action column
+            AuthorCrudViewset.get_edit_url = lambda self, obj: None
+            AuthorCrudViewset.get_delete_url = lambda self, obj: None
+            response = self.client.get(reverse("authors"))
+            self.assertNotContains(response, 'col-action')
+        finally:
+            AuthorCrudViewset.get_edit_url, AuthorCrudViewset.get_delete_url = getters
+
+    def test_expression_columns(self):
+        from django.db.models import Count, F, OuterRef, Subquery
+        from django.db.models.functions import Length
+        john, peter = self._create_library()
+        Book.objects.create(title="Ubik", author=peter)
+        prev_values = (AuthorCrudViewset.list_display, BookCrudViewset.list_display)
+        AuthorCrudViewset.list_display = ('name', ('book_count', Count('book')), F('age') * 2)
+        BookCrudViewset.list_display = (
+            'title', Length('title'), ('author_age', Subquery(
+                Author.objects.filter(pk=OuterRef('author')).values('age')[:1])))
+        try:
+            # computed in the list query, sortable
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse("authors") + '?o=-1')
+            self.assertContains(response, 'Book count')
+            content = response.content.decode('utf-8')
+            rows = re.findall(r'<tr data-pk="\d+"><td>.*?</td><td>(\d+)</td><td>(\d+)</td>',
+                              content, re.DOTALL)
+            self.assertEqual(rows, [('3', '70'), ('2', '50')])
+            # and in the row returned to update the list in place
+            response = self.client.post(
+                reverse("edit-author", kwargs={'pk': peter.pk}), data={'name': 'Peter', 'age': 36},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest', HTTP_X_POPUPCRUD_ROW='1')
+            self.assertIn('<td>3</td><td>72</td>', json.loads(response.content.decode('utf-8'))['row'])
+            data = json.loads(self.client.get(reverse("books:json") + '?o=-2.0').content.decode('utf-8'))
+            self.assertEqual(data['columns'][1]['label'], 'Popupcrud expr 1')
+            self.assertEqual([(row['title'], row['popupcrud_expr_1'], row['author_age'])
+                              for row in data['rows']], [
+                ('Notes', 5, 36), ('Odes', 4, 36), ('Ubik', 4, 36), ('Dune', 4, 25), ('Emma', 4, 25)])
+        finally:
+            AuthorCrudViewset.list_display, BookCrudViewset.list_display = prev_values
+
+    def test_list_aggregates(self):
+        from django.db.models import Avg, Count, Sum
+        for index in range(0, 12):
+            Author.objects.create(name="Author %02d" % index, age=20 + index)
+        url = reverse("authors")
+        prev_values = (AuthorCrudViewset.list_aggregates, AuthorCrudViewset.count_strategy,
+                       AuthorCrudViewset.search_fields)
+        AuthorCrudViewset.list_aggregates = {'age': Sum, 'name': Count('pk')}
+        AuthorCrudViewset.search_fields = ('name',)
+        try:
+            # count, page & aggregates
+            with self.assertNumQueries(3):
+                response = self.client.get(url + '?q=Author+0')
+            footer = re.search(r'<tfoot>.*</tfoot>', response.content.decode('utf-8'), re.DOTALL).group(0)
+            # over all the rows that match, not just the page
+            self.assertEqual(re.findall(r'<td>(.*?)</td>', footer), ['11', '275', '', '', ''])
+
+            AuthorCrudViewset.list_aggregates = {'age': Avg}
+            AuthorCrudViewset.count_strategy = 'cached'
+            self.client.get(url)
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            footer = re.search(r'<tfoot>.*</tfoot>', response.content.decode('utf-8'), re.DOTALL).group(0)
+            self.assertIn('<td>25.5</td>', footer)
+            # values are localized
+            with self.settings(USE_L10N=True, LANGUAGE_CODE='de'):
+                response = self.client.get(url)
+            self.assertContains(response, '<td>25,5</td>')
+
+            # cached per aggregate column & function
+            AuthorCrudViewset.list_aggregates = {'age': Sum}
+            self.client.get(url)
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertContains(response, '<td>306</td>')
+        finally:
+            AuthorCrudViewset.list_aggregates, AuthorCrudViewset.count_strategy, \
+                AuthorCrudViewset.search_fields = prev_values
+        response = self.client.get(url)
+        self.assertNotContains(response, '<tfoot>')
+
+        # aggregate functions only apply to field & expression columns
+        from django.core.exceptions import ImproperlyConfigured
+        plan = ColumnPlan.for_viewset(AuthorCrudViewset)
+        with self.assertRaisesRegex(ImproperlyConfigured, "'half_age', which is a viewset column"):
+            plan.get_aggregates({'half_age': Sum})
+        with self.assertRaisesRegex(ImproperlyConfigured, "'title', which is not a list_display"):
+            plan.get_aggregates({'title': Sum})
+        self.assertEqual(list(plan.get_aggregates({'half_age': Sum('age')})), ['half_age'])
+
+    def test_autocomplete(self):
+        for index in range(0, 25):
+            Author.objects.create(name="Author %02d" % index, age=index)
+        url = reverse("autocomplete-authors")
+        prev_value = AuthorCrudViewset.search_fields
+        AuthorCrudViewset.search_fields = ('name',)
+        data = json.loads(self.client.get(url).content.decode('utf-8'))
+        self.assertEqual(len(data['results']), 20)
+        self.assertEqual(data['results'][0]['text'], 'Author 00')
+        self.assertTrue(data['pagination']['more'])
+        data = json.loads(self.client.get(url + '?page=2').content.decode('utf-8'))
+        self.assertEqual(len(data['results']), 5)
+        self.assertFalse(data['pagination']['more'])
+        data = json.loads(self.client.get(url + '?term=2').content.decode('utf-8'))
+        self.assertEqual([r['text'] for r in data['results']], [
+            'Author 02', 'Author 12', 'Author 20', 'Author 21', 'Author 22',
+            'Author 23', 'Author 24'])
+        AuthorCrudViewset.search_fields = prev_value
+
+    def test_autocomplete_to_field(self):
+        john, peter = self._create_library()
+        url = reverse("uuidbooks:autocomplete")
+        field = forms.ModelChoiceField(Book.objects.all(), to_field_name='uuid')
+        widget = RelatedFieldPopupFormWidget.for_field(field, None, autocomplete_url=url)
+        self.assertEqual(widget.widget.attrs['data-autocomplete-url'],
+                         url + '?_to_field=uuid')
+        # options are identified by the field's to_field_name values
+        data = json.loads(self.client.get(url + '?_to_field=uuid').content.decode('utf-8'))
+        self.assertEqual(data['results'][0], {
+            'id': str(Book.objects.get(title="Dune").uuid), 'text': 'Dune'})
+        self.assertEqual(field.clean(data['results'][0]['id']).title, "Dune")
+        data = json.loads(self.client.get(url).content.decode('utf-8'))
+        self.assertEqual(data['results'][0]['id'], Book.objects.get(title="Dune").pk)
+        # only unique fields are returned
+        response = self.client.get(url + '?_to_field=title')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(url + '?_to_field=author__name')
+        self.assertEqual(response.status_code, 404)
+
+    def test_related_object_autocomplete(self):
+        john = Author.objects.create(name="John", age=25)
+        Author.objects.create(name="Peter", age=35)
+        dune = Book.objects.create(title="Dune", author=john)
+        prev_values = (BookCrudViewset.form_class, BookCrudViewset.fields,
+                       BookCrudViewset.related_object_autocomplete)
+        BookCrudViewset.form_class = None
+        BookCrudViewset.fields = ('title', 'author')
+        BookCrudViewset.related_object_autocomplete = {
+            'author': reverse("autocomplete-authors")}
+        response = self.client.get(reverse("books:update", kwargs={'pk': dune.pk}))
+        self.assertContains(response, 'data-autocomplete-url="%s"' % reverse("autocomplete-authors"))
+        # only the selected author is rendered
+        self.assertContains(response, '<option value="%s" selected>John</option>' % john.pk)
+        self.assertNotContains(response, 'Peter')
+        # along with the link to create a new one
+        self.assertContains(response, 'class="add-another"')
+        BookCrudViewset.form_class, BookCrudViewset.fields, \
+            BookCrudViewset.related_object_autocomplete = prev_values
+
+    def test_related_choices_fetched_once(self):
+        john = Author.objects.create(name="John", age=25)
+        Author.objects.create(name="Peter", age=35)
+        dune = Book.objects.create(title="Dune", author=john)
+        # the authors, without a COUNT
+        response = self.assertPopupNumQueries(1, reverse("books:create"))
+        self.assertContains(response, 'Peter')
+        # the book & the authors
+        response = self.assertPopupNumQueries(2, reverse("books:update", kwargs={'pk': dune.pk}))
+        self.assertContains(response, '<option value="%s" selected>John</option>' % john.pk)
+        # same with the widget created for related_object_popups
+        prev_values = (BookCrudViewset.form_class, BookCrudViewset.fields)
+        BookCrudViewset.form_class = None
+        BookCrudViewset.fields = ('title', 'author')
+        self.assertPopupNumQueries(1, reverse("books:create"))
+        self.assertPopupNumQueries(2, reverse("books:update", kwargs={'pk': dune.pk}))
+        BookCrudViewset.form_class, BookCrudViewset.fields = prev_values
+
+    def test_instrumentation(self):
+        from popupcrud.views import POPUPCRUD
+        john, peter = self._create_library()
+        # off by default
+        response = self.client.get(reverse("books:list"))
+        self.assertNotIn('Server-Timing', response)
+
+        received = []
+        def receiver(sender, **kwargs):
+            received.append((sender, kwargs['timings']))
+        instrumentation.view_timed.connect(receiver)
+        POPUPCRUD['instrumentation'] = True
+        POPUPCRUD['instrumentation_sink'] = 'test.tests.RecordingSink'
+        del RecordingSink.records[:]
+        try:
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse("books:list"))
+            timings = response['Server-Timing']
+            for phase in ('total', 'count', 'queryset', 'headers', 'rows', 'render'):
+                self.assertIn(phase + ';dur=', timings)
+            self.assertEqual(len(received), 1)
+            sender, timings = received[0]
+            self.assertIs(sender, BookCrudViewset)
+            self.assertEqual(timings.view_code, 'list')
+            self.assertEqual(timings.phases['total'].queries, 2)
+            self.assertEqual(timings.phases['count'].queries, 1)
+            self.assertEqual(timings.phases['queryset'].queries, 1)
+            self.assertEqual(timings.phases['render'].queries, 0)
+            self.assertEqual(RecordingSink.records, [timings])
+
+            # form views, including the ones answered without a template
+            response = self.client.get(reverse("books:create"))
+            self.assertIn('form;dur=', response['Server-Timing'])
+            self.assertEqual(received[-1][1].phases['form'].queries, 0)
+            response = self.client.post(reverse("new-author"), data={
+                'name': 'Anthony', 'age': 30, 'sex': 'M'},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertIn('total;dur=', response['Server-Timing'])
+            self.assertIs(received[-1][0], AuthorCrudViewset)
+        finally:
+            POPUPCRUD['instrumentation'] = False
+            POPUPCRUD['instrumentation_sink'] = None
+            instrumentation.view_timed.disconnect(receiver)
+
+    def test_bulk_actions(self):
+        john, peter = self._create_library()
+        prev_value = BookCrudViewset.bulk_actions
+        BookCrudViewset.bulk_actions = [
+            ('Out of print', 'glyphicon glyphicon-book', 'out_of_print'),
+            ('Delete', 'glyphicon glyphicon-trash', 'bulk_delete'),
+        ]
+        url = reverse("books:list")
+        response = self.client.get(url)
+        dune = Book.objects.get(title='Dune')
+        self.assertContains(response, '<input type="checkbox" name="items" value="%d">' % dune.pk)
+        self.assertContains(response, 'name="bulk_action"', count=2)
+
+        # selected rows, with one update query
+        pks = list(Book.objects.filter(author=peter).values_list('pk', flat=True))
+        with self.assertNumQueries(3):  # the update within a savepoint
+            response = self.client.post(url, data={'bulk_action': 0, 'items': pks})
+        result = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(result, {'result': True, 'message': '2 books marked out of print'})
+        self.assertEqual(Book.objects.filter(in_print=False).count(), 3)
+
+        # all the rows, as filtered by the query string
+        BookCrudViewset.list_filter = ('genre',)
+        response = self.client.post(url + '?genre=fiction', data={
+            'bulk_action': 1, 'select_all': '1'})
+        BookCrudViewset.list_filter = ()
+        result = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(result, {'result': True, 'message': '2 Books deleted'})
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)),
+                         ['Notes', 'Odes'])
+
+        # rows outside the ViewSet's queryset are not acted upon
+        prev_get_queryset = BookCrudViewset.get_queryset
+        BookCrudViewset.get_queryset = lambda self, qs: qs.filter(author=john)
+        response = self.client.post(url, data={'bulk_action': 1, 'items': pks})
+        self.assertEqual(Book.objects.count(), 2)
+        BookCrudViewset.get_queryset = prev_get_queryset
+
+        # invalid requests
+        for data in ({'bulk_action': 5, 'items': pks},
+                     {'bulk_action': 0, 'items': ['abc']}):
+            response = self.client.post(url, data=data)
+            result = json.loads(response.content.decode('utf-8'))
+            self.assertFalse(result['result'])
+        BookCrudViewset.bulk_actions = prev_value
+
+    def test_background_item_action(self):
+        john = Author.objects.create(name="John", age=25)
+        book = Book.objects.create(title="Dune", author=john)
+        prev_value = BookCrudViewset.item_actions
+        BookCrudViewset.item_actions = prev_value + [
+            ('Reprint', 'glyphicon glyphicon-print', 'reprint')]
+        version = model_version(get_cache(), Book)
+        response = self.client.post(reverse("books:list"), data={
+            'action': 2, 'item': book.pk})
+        result = json.loads(response.content.decode('utf-8'))
+        self.assertTrue(result['result'])
+        self.assertEqual(result['status_url'],
+                         reverse("books:job-status", kwargs={'job_id': result['job']}))
+        for _ in range(0, 100):
+            status = json.loads(self.client.get(result['status_url']).content.decode('utf-8'))
+            if status['state'] in ('done', 'failed'):
+                break
+            time.sleep(0.05)
+        self.assertEqual(status, {'state': 'done', 'result': True,
+                                  'message': 'Dune reprinted'})
+        # the cached values are invalidated once the job completes
+        self.assertNotEqual(model_version(get_cache(), Book), version)
+
+        response = self.client.get(reverse("books:job-status", kwargs={'job_id': 'abc'}))
+        self.assertEqual(response.status_code, 404)
+        # status is only returned to the user who started the action
+        self.client.force_login(User.objects.create_user('peter'))
+        response = self.client.get(result['status_url'])
+        self.assertEqual(response.status_code, 404)
+        BookCrudViewset.item_actions = prev_value
+
+        # status view is registered only for viewsets with background actions
+        self.assertTrue(BookCrudViewset.has_background_actions())
+        self.assertFalse(AuthorCrudViewset.has_background_actions())
+        names = [pattern.name for pattern in AuthorCrudViewset.urls()[0]]
+        self.assertNotIn('job-status', names)
+
+    def test_viewset_config(self):
+        # config is built once per viewset class and reused
+        config = AuthorCrudViewset().config
+        self.assertIs(config, AuthorCrudViewset().config)
+        self.assertEqual(config.modal_sizes['create_update'], 'normal')
+
+        # and is rebuilt when one of its source attributes is reassigned
+        prev_value = AuthorCrudViewset.legacy_crud
+        AuthorCrudViewset.legacy_crud = {'create': True}
+        self.assertIsNot(AuthorCrudViewset().config, config)
+        self.assertFalse(AuthorCrudViewset().popups['create'])
+        self.assertTrue(AuthorCrudViewset().popups['update'])
+        AuthorCrudViewset.legacy_crud = prev_value
+        self.assertTrue(AuthorCrudViewset().popups['create'])
+
+        # get_formset_class() is called once per viewset instance
+        calls = []
+        class FormsetViewSet(AuthorCrudViewset):
+            def get_formset_class(self):
+                calls.append(self)
+                return None
+        viewset = FormsetViewSet()
+        self.assertIsNone(viewset.formset_class)
+        self.assertIsNone(viewset.formset_class)
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(FormsetViewSet().formset_class)
+        self.assertEqual(len(calls), 2)
+
+        # permissions are looked up per viewset instance
+        viewset = AuthorCrudViewset()
+        viewset.list_permission_required = ('test.view_author',)
+        self.assertEqual(viewset.get_permission_required('list'), ('test.view_author',))
+        self.assertNotEqual(AuthorCrudViewset().get_permission_required('list'),
+                            ('test.view_author',))
+
+    def test_media_cached(self):
+        from .views import AuthorForm
+        forms_created = []
+        class CountingAuthorForm(AuthorForm):
+            def __init__(self, *args, **kwargs):
+                forms_created.append(self)
+                super(CountingAuthorForm, self).__init__(*args, **kwargs)
+
+        prev_value = AuthorCrudViewset.form_class
+        AuthorCrudViewset.form_class = CountingAuthorForm
+        url = reverse("authors")
+        media = self.client.get(url).context['view'].media
+        view = self.client.get(url).context['view']
+        # form is created once, for its media, and not for every request
+        self.assertIs(view.media, media)
+        self.assertEqual(len(forms_created), 1)
+        self.assertEqual(view.get_template_names()[-1], "popupcrud/list.html")
+
+        # not cached in DEBUG mode
+        with self.settings(DEBUG=True):
+            self.assertIsNot(view.media, media)
+        self.assertEqual(len(forms_created), 2)
+        AuthorCrudViewset.form_class = prev_value
+
+        # formsets that are chosen per request get their own media
+        from django.forms.models import inlineformset_factory
+        book_formset = inlineformset_factory(Author, Book, fields=('title',))
+        class FormsetViewSet(AuthorCrudViewset):
+            with_formset = False
+            def get_formset_class(self):
+                return book_formset if self.with_formset else None
+        view = self.client.get(url).context['view']
+        view._viewset = FormsetViewSet()
+        self.assertNotIn('jquery.formset.js', str(view.media))
+        view._viewset = FormsetViewSet()
+        view._viewset.with_formset = True
+        self.assertIn('jquery.formset.js', str(view.media))
+
+    def test_derived_viewset_urls(self):
+        class DerivedBookCrudViewset(BookCrudViewset):
+            pass
+        self.assertIsNot(DerivedBookCrudViewset.urls(namespace='derived-books'),
+                         BookCrudViewset.urls())
+        self.assertEqual(DerivedBookCrudViewset.urls()[2], 'derived-books')
@@ -7,6 +7,11 @@ urlpatterns = [
     url(r'^authors/(?P<pk>\d+)/$', views.AuthorCrudViewset.detail(), name='author-detail'),
     url(r'^authors/(?P<pk>\d+)/edit/$', views.AuthorCrudViewset.update(), name='edit-author'),
     url(r'^authors/(?P<pk>\d+)/delete/$', views.AuthorCrudViewset.delete(), name='delete-author'),
-    url(r'^books/', views.BookCrudViewset.urls(namespace='books')),
-    url(r'^uuidbooks/', views.BookUUIDCrudViewSet.urls(namespace='uuidbooks')),
+    url(r'^authors/export/$', views.AuthorCrudViewset.export(), name='export-authors'),
+    url(r'^authors/autocomplete/$', views.AuthorCrudViewset.autocomplete(),
+        name='autocomplete-authors'),
+    url(r'^books/', views.BookCrudViewset.urls(
+        namespace='books', views=('create', 'update', 'delete', 'detail', 'export', 'json'))),
+    url(r'^uuidbooks/', views.BookUUIDCrudViewSet.urls(
+        namespace='uuidbooks', views=('create', 'update', 'delete', 'detail', 'autocomplete'))),
 ]
@@ -65,10 +65,9 @@ class BookForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super(BookForm, self).__init__(*args, **kwargs)
         author = self.fields['author']
-        author.widget = RelatedFieldPopupFormWidget(
-            widget=Select2Widget(choices=author.choices) if _select2 else \
-                    forms.Select(choices=author.choices),
-            new_url=reverse_lazy("new-author"))
+        author.widget = RelatedFieldPopupFormWidget.for_field(
+            author, new_url=reverse_lazy("new-author"),
+            widget_class=Select2Widget if _select2 else forms.Select)
 
 
 class BookCrudViewset(PopupCrudViewSet):
@@ -104,6 +103,14 @@ class BookCrudViewset(PopupCrudViewSet):
     def down_vote(self, request, book):
         return True, "Down vote successful"
 
+    def reprint(self, request, book):
+        return True, "%s reprinted" % book.title
+    reprint.background = True
+
+    def out_of_print(self, request, queryset):
+        count = queryset.update(in_print=False)
+        return True, "%d books marked out of print" % count
+
 
 class BookUUIDCrudViewSet(PopupCrudViewSet):
     '''CRUD views using slug field as url kwarg instead of the default pk'''